@@ -1,3 +1,30 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import WebhookSubscription, OutboxMessage, AccessLog
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'url', 'events', 'is_active', 'created_at')
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event', 'subscription', 'status', 'attempts', 'next_attempt_at', 'last_error')
+    list_filter = ('status', 'event', 'subscription')
+
+
+@admin.register(AccessLog)
+class AccessLogAdmin(admin.ModelAdmin):
+    list_display = ('accessed_at', 'username', 'client_id', 'view', 'ip_address')
+    list_filter = ('view',)
+    search_fields = ('username',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
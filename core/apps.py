@@ -1,6 +1,33 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+
+
+def start_threads(**kwargs):
+    """Start the background threads settings ask for, once per process."""
+    from . import webhooks
+    from .dashboard import start_refresher
+    request_started.disconnect(dispatch_uid='core-start-threads')
+    if settings.DASHBOARD_SNAPSHOT_THREAD:
+        start_refresher()
+    if settings.WEBHOOK_DISPATCHER_THREAD:
+        webhooks.start_dispatcher()
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import changelog, clinic, conditional, revenue, webhooks
+        from .permissions import compile_rules
+        compile_rules()
+        conditional.connect_signals()
+        revenue.connect_signals()
+        clinic.connect_signals()
+        webhooks.connect_signals()
+        changelog.connect_signals()
+        if settings.DASHBOARD_SNAPSHOT_THREAD or settings.WEBHOOK_DISPATCHER_THREAD:
+            # Started by the first request a process serves, so that
+            # management commands (migrate, test, shell) never run them
+            request_started.connect(start_threads, dispatch_uid='core-start-threads')
@@ -0,0 +1,155 @@
+"""
+Soft deletion and archival of client records.
+
+delete_client() marks a client and its enrollments, prescriptions, metrics
+and encounters deleted with one UPDATE per table, where client.delete()
+has the ORM collector load every related row to cascade the DELETE.
+delete_record() does the same for one of those records on its own. The
+default managers of those models leave deleted rows out (all_objects still
+sees them), so the rest of the application treats them as gone, and the
+indexes it relies on only cover live rows. delete_program() cannot keep
+its enrollments in place, since they would point at a missing programme,
+so it moves them straight into the archive.
+
+archive() moves rows deleted more than ARCHIVE_AFTER_DAYS ago into
+ArchivedRecord, a batch at a time: each batch is copied with one
+bulk_create() and removed with a plain DELETE ... WHERE id IN (...),
+without the collector or per-row signals. Clients with payments stay
+soft-deleted in place, since their revenue history points at them.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import changelog
+from .clinic import forget_days
+from .conditional import bump_table_version
+from .models import Client, Enrollment, Prescription, Metric, Encounter, EncounterSeries, Payment, ArchivedRecord
+
+# Deleted with their client, children first
+CLIENT_RECORDS = (Encounter, Metric, Prescription, Enrollment)
+
+
+def delete_client(client):
+    """Soft-delete client and its records in one transaction. Returns the number of rows marked."""
+    now = timezone.now()
+    marked = 0
+    with transaction.atomic():
+        # Holding the client blocks records being added to it meanwhile
+        list(Client.objects.select_for_update().filter(pk=client.pk).values_list('pk'))
+        for model in CLIENT_RECORDS:
+            rows = model.objects.filter(client=client)
+            if model is Encounter:
+                found = list(rows.values_list('pk', 'provider_id', 'scheduled_for'))
+                forget_days({(provider_id, timezone.localtime(start).date()) for _, provider_id, start in found})
+                ids = [pk for pk, _, _ in found]
+            else:
+                ids = list(rows.values_list('pk', flat=True))
+            if ids:
+                marked += rows.update(deleted_at=now)
+                changelog.record_deleted(model, ids)
+                bump_table_version(model._meta.label)
+        # No more bookings from its recurring series
+        if EncounterSeries.objects.filter(client=client, next_occurrence__isnull=False).update(next_occurrence=None):
+            bump_table_version(EncounterSeries._meta.label)
+        marked += Client.objects.filter(pk=client.pk).update(deleted_at=now)
+        changelog.record_deleted(Client, [client.pk])
+        bump_table_version(Client._meta.label)
+    client.deleted_at = now
+    return marked
+
+
+def delete_record(instance):
+    """Soft-delete one enrollment, prescription, metric or encounter, as delete_client() does."""
+    model = type(instance)
+    now = timezone.now()
+    with transaction.atomic():
+        if model is Encounter:
+            forget_days({(instance.provider_id, timezone.localtime(instance.scheduled_for).date())})
+        model.objects.filter(pk=instance.pk).update(deleted_at=now)
+        changelog.record_deleted(model, [instance.pk])
+        bump_table_version(model._meta.label)
+    instance.deleted_at = now
+
+
+def delete_program(program):
+    """
+    Delete program, first archiving its enrollments, deleted or not, so the
+    clients' enrollment history outlives it. Raises ProtectedError, with
+    nothing archived, for a programme with payments.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(Enrollment.all_objects.filter(program=program).values())
+        live = [row['id'] for row in rows if row['deleted_at'] is None]
+        for row in rows:
+            row['deleted_at'] = row['deleted_at'] or now
+        if rows:
+            _move(Enrollment, rows)
+        if live:
+            changelog.record_deleted(Enrollment, live)
+            bump_table_version(Enrollment._meta.label)
+        return changelog.delete(program)
+
+
+def _move(model, rows, deleted_at=None):
+    """Copy rows (values() dicts of model) into the archive, then delete them."""
+    table = model._meta.model_name
+    ArchivedRecord.objects.bulk_create(
+        ArchivedRecord(
+            table=table,
+            object_id=row['id'],
+            client_id=row['id'] if model is Client else row['client_id'],
+            data=row,
+            deleted_at=row['deleted_at'] if deleted_at is None else deleted_at[row['client_id']],
+        )
+        for row in rows
+    )
+    queryset = model._base_manager.filter(pk__in=[row['id'] for row in rows])
+    # Straight to SQL: the rows are gone from the application already
+    return queryset._raw_delete(queryset.db)
+
+
+def archive(before=None, batch_size=1000):
+    """
+    Move soft-deleted rows older than before (default ARCHIVE_AFTER_DAYS ago)
+    into the archive, each batch of batch_size in its own transaction.
+    Returns {table: rows moved}.
+    """
+    before = before or timezone.now() - datetime.timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    moved = {}
+    for model in CLIENT_RECORDS:
+        old = model.all_objects.filter(deleted_at__lt=before).order_by('pk')
+        moved[model._meta.model_name] = 0
+        while True:
+            with transaction.atomic():
+                rows = list(old.values()[:batch_size])
+                if rows:
+                    moved[model._meta.model_name] += _move(model, rows)
+            if len(rows) < batch_size:
+                break
+
+    clients = Client.all_objects.filter(deleted_at__lt=before).exclude(
+        Exists(Payment.objects.filter(client=OuterRef('pk')))
+    )
+    for model in CLIENT_RECORDS:
+        clients = clients.exclude(Exists(model.all_objects.filter(client=OuterRef('pk'))))
+    clients = clients.order_by('pk')
+    moved['encounterseries'] = moved['client'] = 0
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(clients.filter(pk__gt=last).values()[:batch_size])
+            if rows:
+                deleted_at = {row['id']: row['deleted_at'] for row in rows}
+                series = list(EncounterSeries.objects.filter(client_id__in=deleted_at).values())
+                if series:
+                    moved['encounterseries'] += _move(EncounterSeries, series, deleted_at)
+                moved['client'] += _move(Client, rows)
+                last = rows[-1]['id']
+        if len(rows) < batch_size:
+            break
+    return moved
@@ -0,0 +1,166 @@
+"""
+Access auditing for clinical records.
+
+Views decorated with @audited() note every successful read of a client's
+record as an AccessLog. The entries go onto an in-process queue instead of
+the database, and a writer thread stores them with one bulk_create() per
+AUDIT_BATCH_SIZE entries or AUDIT_FLUSH_MS, whichever comes first, so an
+audited read costs no extra query. The queue holds at most
+AUDIT_QUEUE_SIZE entries: when the writer falls that far behind, the
+request that finds it full writes the backlog itself rather than drop
+events. A worker that exits normally writes what it still holds from an
+atexit hook; one that is killed loses at most the unwritten buffer.
+
+With AUDIT_ASYNC = False entries are written as they are recorded.
+"""
+import atexit
+import contextlib
+import functools
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import AccessLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLog:
+    """A bounded buffer of AccessLog entries and the thread writing it out."""
+
+    def __init__(self, batch_size=None, flush_interval=None, maxsize=None, autostart=True):
+        self.autostart = autostart
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = (flush_interval or settings.AUDIT_FLUSH_MS) / 1000
+        self.queue = queue.Queue(maxsize or settings.AUDIT_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def record(self, entry):
+        if not settings.AUDIT_ASYNC:
+            self.write([entry])
+            return
+        if self.autostart:
+            self.start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.write(self.drain() + [entry])
+
+    def start(self):
+        """Start the writer thread, once per process (so after a fork too)."""
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.stopped.clear()
+                    self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+                    self.thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the writer, letting it finish its batch, and write whatever is left."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.flush()
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = self.take()
+            if batch:
+                self.write(batch)
+                close_old_connections()
+
+    def take(self):
+        """Wait for an entry, then collect up to batch_size within flush_interval of it."""
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def drain(self):
+        entries = []
+        while True:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                return entries
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        self.write(self.drain())
+
+    def write(self, entries):
+        if not entries:
+            return
+        try:
+            AccessLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Could not write %d audit entries', len(entries))
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """The process-wide AuditLog, flushed at exit."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = AuditLog()
+                atexit.register(_log.stop)
+    return _log
+
+
+@contextlib.contextmanager
+def using(log):
+    """Send entries recorded in the block to log instead of the process-wide one."""
+    global _log
+    previous, _log = get_log(), log
+    try:
+        yield log
+    finally:
+        _log = previous
+
+
+def audited(client_kwarg='client_id', resolve=None):
+    """
+    Record an AccessLog for each 2xx/304 response of the decorated view,
+    whose client_kwarg argument is the client's id. Views that find the
+    client some other way (by name, say) pass resolve, a function of the
+    response returning the id instead. Put it above @cache_page, so that
+    answers served from the cache are recorded too.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if 200 <= response.status_code < 300 or response.status_code == 304:
+                get_log().record(AccessLog(
+                    user_id=request.user.pk,
+                    username=request.user.get_username(),
+                    client_id=resolve(response) if resolve else kwargs[client_kwarg],
+                    view=request.resolver_match.url_name if request.resolver_match else view.__name__,
+                    ip_address=request.META.get('REMOTE_ADDR') or None,
+                    accessed_at=timezone.now(),
+                ))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,263 @@
+"""
+API benchmark harness (manage.py bench_api).
+
+Every route in core.urls has a Case below describing one representative
+request. run_scale() seeds the database with seed_scale, replays each case
+through the test client and records its median latency, query count and
+peak Python memory; compare() checks those figures against a saved
+baseline. All writes, the seeded data included, are rolled back.
+"""
+import contextlib
+import datetime
+import io
+import logging
+import statistics
+import time
+import tracemalloc
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import audit, urls
+from .lookup import recent_lookups
+from .models import User, HealthProgram, Client, Enrollment, Prescription, Metric, Encounter
+
+SEED = 7
+PASSWORD = 'testpass123'
+# Slack added to the relative tolerance, so that tiny figures do not fail on noise
+LATENCY_FLOOR_MS = 2.0
+MEMORY_FLOOR_KB = 64
+
+
+class Case(NamedTuple):
+    method: str
+    kwargs: dict = {}
+    # Query string for GET, JSON body otherwise
+    data: dict = None
+    # The query count the route must take at every scale, where it is fixed
+    queries: int = None
+
+
+def _future(ctx, days):
+    return (datetime.datetime.combine(ctx['today'], datetime.time(9)) + datetime.timedelta(days=days)).isoformat()
+
+
+# URL name (or route, for unnamed routes) -> ctx -> Case
+CASES = {
+    'api-token': lambda ctx: Case('post', data={'username': ctx['doctor'].username, 'password': PASSWORD}),
+    'api-register': lambda ctx: Case('post', data={
+        'username': 'bench-user', 'password': PASSWORD, 'employer_id': 'BENCH-1',
+        'work_email': 'bench@staff.example.com', 'is_doctor': True,
+    }),
+    'user-profile': lambda ctx: Case('get'),
+    'client-list': lambda ctx: Case('get'),
+    'client-detail': lambda ctx: Case('get', {'pk': ctx['client'].pk}),
+    'delete-client': lambda ctx: Case('delete', {'pk': ctx['client'].pk}),
+    'client-search': lambda ctx: Case('get', data={'q': ctx['client'].last_name}),
+    'client-lookup': lambda ctx: Case('get', data={'q': ctx['client'].first_name[:3]}),
+    'register_client': lambda ctx: Case('post', data={
+        'first_name': 'Bench', 'last_name': 'Client', 'date_of_birth': '1990-01-01', 'gender': 'F',
+    }),
+    # Shadowed by client-detail, which has the same route
+    'client_profile': lambda ctx: Case('get', {'client_id': ctx['client'].pk}),
+    'client-active-medications': lambda ctx: Case('get', {'client_id': ctx['client'].pk}),
+    'client_comprehensive_info': lambda ctx: Case('get', {'client_id': ctx['client'].pk}),
+    'client_comprehensive_info_by_name': lambda ctx: Case(
+        'get', {'first_name': ctx['named']['first_name'], 'last_name': ctx['named']['last_name']}
+    ),
+    'program-list': lambda ctx: Case('get'),
+    'create_program': lambda ctx: Case('post', data={'name': 'Bench Programme', 'description': 'Benchmark'}),
+    'program-detail': lambda ctx: Case('get', {'pk': ctx['program'].pk}),
+    'delete-program': lambda ctx: Case('delete', {'pk': ctx['program'].pk}),
+    'enroll_client': lambda ctx: Case('post', data={'client_id': ctx['client'].pk, 'program_id': ctx['other_program'].pk}),
+    'enrollment-list': lambda ctx: Case('get'),
+    'enrollment-detail': lambda ctx: Case('get', {'pk': ctx['enrollment'].pk}),
+    'delete-enrollment': lambda ctx: Case('delete', {'pk': ctx['enrollment'].pk}),
+    'create_prescription': lambda ctx: Case('post', data={
+        'client_id': ctx['client'].pk, 'medication_name': 'Paracetamol', 'dosage': '1g',
+        'frequency': 'Four times daily', 'start_date': ctx['today'].isoformat(), 'acknowledge_interactions': True,
+    }),
+    'prescription-list': lambda ctx: Case('get'),
+    'active-prescriptions': lambda ctx: Case('get'),
+    'prescription-detail': lambda ctx: Case('get', {'pk': ctx['prescription'].pk}),
+    'update-prescription': lambda ctx: Case('put', {'pk': ctx['prescription'].pk}, {'dosage': '2 tablets'}),
+    'record_metric': lambda ctx: Case('post', data={
+        'client_id': ctx['client'].pk, 'name': 'Weight', 'value': 70.5, 'unit': 'kg',
+    }),
+    'metric-list': lambda ctx: Case('get'),
+    'metric-detail': lambda ctx: Case('get', {'pk': ctx['metric'].pk}),
+    'delete-metric': lambda ctx: Case('delete', {'pk': ctx['metric'].pk}),
+    'record_payment': lambda ctx: Case('post', data={
+        'client_id': ctx['client'].pk, 'program_id': ctx['program'].pk, 'amount': '1500.00',
+    }),
+    'create_encounter': lambda ctx: Case('post', data={
+        'client_id': ctx['client'].pk, 'scheduled_for': _future(ctx, 400), 'duration': 30,
+    }),
+    'create-encounter-series': lambda ctx: Case('post', data={
+        'client_id': ctx['client'].pk, 'scheduled_for': _future(ctx, 401), 'frequency': 'Weekly', 'count': 6,
+    }),
+    'list_encounters': lambda ctx: Case('get'),
+    'todays-clinic': lambda ctx: Case('get', data={'provider': ctx['encounter'].provider_id}),
+    'get_encounter': lambda ctx: Case('get', {'pk': ctx['encounter'].pk}),
+    'delete_encounter': lambda ctx: Case('delete', {'pk': ctx['encounter'].pk}),
+    'provider-availability': lambda ctx: Case('get', {'provider_id': ctx['doctor'].pk}),
+    'generate-report': lambda ctx: Case('get', data={
+        'type': 'client_attendance', 'output': 'json',
+        'start_date': (ctx['today'] - datetime.timedelta(days=90)).isoformat(), 'end_date': ctx['today'].isoformat(),
+    }),
+    'change-password': lambda ctx: Case('post', data={
+        'current_password': PASSWORD, 'new_password': 'benchpass456', 'confirm_password': 'benchpass456',
+    }),
+    'program-metrics': lambda ctx: Case('get', queries=5),
+    'resource-utilization': lambda ctx: Case('get'),
+    'dashboard-snapshot': lambda ctx: Case('get'),
+    'staff-list': lambda ctx: Case('get'),
+    'change-feed': lambda ctx: Case('get', data={'since': 0, 'limit': 500}),
+    'access-log': lambda ctx: Case('get', data={'client': ctx['client'].pk}),
+    'error-list': lambda ctx: Case('get'),
+    'webhook/': lambda ctx: Case('post', data={'event': 'benchmark'}),
+}
+
+
+def route_key(pattern):
+    return pattern.name or str(pattern.pattern)
+
+
+def uncovered():
+    """Keys of the routes in core.urls that have no Case."""
+    return [route_key(pattern) for pattern in urls.urlpatterns if route_key(pattern) not in CASES]
+
+
+def seed(clients):
+    """Seed a database of `clients` clients and return the objects the cases refer to."""
+    call_command('seed_scale', clients=clients, seed=SEED, workers=1, password=PASSWORD, stdout=io.StringIO())
+    doctor = User.objects.filter(username__startswith=f'seed{SEED}-doctor-').order_by('pk').first()
+    # So the administrator-only routes are measured too
+    doctor.is_superuser = True
+    doctor.save(update_fields=['is_superuser'])
+    enrollment = Enrollment.objects.select_related('client', 'program').order_by('pk').first()
+    client = enrollment.client
+    return {
+        'today': datetime.date.today(),
+        'doctor': doctor,
+        'token': Token.objects.get_or_create(user=doctor)[0].key,
+        'client': client,
+        'program': enrollment.program,
+        'other_program': HealthProgram.objects.exclude(enrollments__client=client).order_by('pk').first(),
+        'enrollment': enrollment,
+        'prescription': Prescription.objects.filter(client=client).order_by('pk').first()
+                        or Prescription.objects.order_by('pk').first(),
+        'metric': Metric.objects.order_by('pk').first(),
+        'encounter': Encounter.objects.order_by('pk').first(),
+        # Seeded names repeat; looking a client up by name needs one that does not
+        'named': Client.objects.values('first_name', 'last_name').annotate(count=Count('pk'))
+                 .filter(count=1).order_by('last_name', 'first_name').first(),
+    }
+
+
+def send(api, pattern, case):
+    """One request, rolled back along with anything it wrote. Returns (seconds, response)."""
+    url = reverse(pattern.name, kwargs=case.kwargs) if pattern.name else f'/api/{pattern.pattern}'
+    cache.clear()
+    recent_lookups.clear()
+    with transaction.atomic(), contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        response = getattr(api, case.method)(url, case.data, format=None if case.method == 'get' else 'json')
+        elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    return elapsed, response
+
+
+def measure(api, pattern, case, repeat):
+    """
+    Median latency over repeat runs (after one warm-up), then the query
+    count and peak traced memory of one more run; tracing is kept out of the
+    timed runs since it slows them down several times.
+    """
+    send(api, pattern, case)
+    timings = [send(api, pattern, case)[0] for _ in range(repeat)]
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            _, response = send(api, pattern, case)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'ms': round(statistics.median(timings) * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_scale(clients, repeat=5, only=None):
+    """{route key: figures} for every case against a database seeded with clients clients."""
+    # 500s show up in the results; their tracebacks would drown the report
+    loggers = [logging.getLogger(name) for name in ('django.request', 'core.errors')]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL)
+    try:
+        results = _run_cases(clients, repeat, only)
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+    cache.clear()
+    recent_lookups.clear()
+    return results
+
+
+def _run_cases(clients, repeat, only):
+    results = {}
+    # Audit entries are queued as usual but never written: their rows are rolled back
+    with transaction.atomic(), audit.using(audit.AuditLog(autostart=False)):
+        ctx = seed(clients)
+        # A failing view is recorded as a 500 rather than stopping the run
+        api = APIClient(raise_request_exception=False, SERVER_NAME='localhost')
+        api.credentials(HTTP_AUTHORIZATION=f'Token {ctx["token"]}')
+        for pattern in urls.urlpatterns:
+            key = route_key(pattern)
+            if only and key not in only:
+                continue
+            case = CASES[key](ctx)
+            results[key] = measure(api, pattern, case, repeat)
+            if case.queries is not None:
+                results[key]['pinned_queries'] = case.queries
+        transaction.set_rollback(True)
+    return results
+
+
+def compare(baseline, results, tolerance):
+    """
+    Regressions of results ({scale: {route key: figures}}) against baseline,
+    as messages. A changed status or any extra query is a regression;
+    latency and memory may grow by tolerance (0.5 = 50%) plus a small floor.
+    Scales and routes missing from the baseline are only checked against
+    their pinned query count.
+    """
+    regressions = []
+    for scale, cases in results.items():
+        for key, figures in cases.items():
+            where = f'{key} @ {scale} clients'
+            pinned = figures.get('pinned_queries')
+            if pinned is not None and figures['queries'] != pinned:
+                regressions.append(f'{where}: {figures["queries"]} queries, pinned at {pinned}')
+            before = baseline.get(scale, {}).get(key)
+            if before is None:
+                continue
+            if figures['status'] != before['status']:
+                regressions.append(f'{where}: status {before["status"]} -> {figures["status"]}')
+            if figures['queries'] > before['queries']:
+                regressions.append(f'{where}: {before["queries"]} -> {figures["queries"]} queries')
+            for metric, unit, floor in (('ms', 'ms', LATENCY_FLOOR_MS), ('peak_kb', 'KB', MEMORY_FLOOR_KB)):
+                if figures[metric] > before[metric] * (1 + tolerance) + floor:
+                    regressions.append(f'{where}: {before[metric]}{unit} -> {figures[metric]}{unit}')
+    return regressions
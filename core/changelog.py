@@ -0,0 +1,162 @@
+"""
+Change data capture for the clinical tables.
+
+Every insert, update and delete of a TRACKED model appends a
+ChangeLogEntry holding the row as it now is (post_save / post_delete, or
+record() after bulk_create()). Consumers page through the log by id from
+/changes/ and apply the entries in order to keep a copy in sync.
+
+Deleting a row that cascades to many tracked rows (a program's
+enrollments) should go through delete(), which logs the whole cascade with
+one insert instead of one per row.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits, so a slow transaction can commit an entry below ids a reader has
+already passed. read() therefore stops at entries younger than
+CHANGELOG_SETTLE_SECONDS, which must exceed the longest write transaction.
+
+compact() keeps the log from growing without bound: past
+CHANGELOG_RETENTION_DAYS only the newest entry of each row is kept, and
+deletes are dropped. Reading from cursor 0 still rebuilds every current
+row; a consumer that falls further behind than the retention period may
+miss deletes and should resync from 0.
+"""
+import contextvars
+import datetime
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from django.db.models import Exists, Max, Min, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Client, Enrollment, Prescription, Metric, Encounter, ChangeLogEntry
+from .webhooks import payload
+
+TRACKED = {model._meta.model_name: model for model in (Client, Enrollment, Prescription, Metric, Encounter)}
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+COLUMNS = ('pk', 'table', 'object_id', 'action', 'data', 'changed_at')
+
+# Set while delete() logs a cascade itself
+_collecting = contextvars.ContextVar('changelog_collecting', default=False)
+
+
+def record(action, instances):
+    """Append an entry for each of instances (all of one model) in the caller's transaction."""
+    ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(
+            table=instance._meta.model_name,
+            object_id=instance.pk,
+            action=action,
+            data=None if action == 'delete' else payload(instance),
+        )
+        for instance in instances
+    )
+
+
+def record_deleted(model, ids):
+    """Append a delete entry for each id of model, e.g. after a queryset.update() soft delete."""
+    ChangeLogEntry.objects.bulk_create(
+        ChangeLogEntry(table=model._meta.model_name, object_id=pk, action='delete') for pk in ids
+    )
+
+
+def _on_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record('insert' if created else 'update', [instance])
+
+
+def _on_delete(sender, instance, **kwargs):
+    if not _collecting.get():
+        record('delete', [instance])
+
+
+def delete(instance):
+    """
+    instance.delete(), logging every tracked row it removes, cascade
+    included, with a single insert. Returns what delete() returns.
+    """
+    collector = Collector(using=router.db_for_write(type(instance), instance=instance))
+    collector.collect([instance])
+    # delete() clears the instances' pks, so take them first
+    deleted = [
+        (model._meta.model_name, obj.pk)
+        for model, objs in collector.data.items() if TRACKED.get(model._meta.model_name) is model
+        for obj in objs
+    ]
+    token = _collecting.set(True)
+    try:
+        with transaction.atomic(using=collector.using):
+            result = collector.delete()
+            ChangeLogEntry.objects.bulk_create(
+                ChangeLogEntry(table=table, object_id=pk, action='delete') for table, pk in deleted
+            )
+    finally:
+        _collecting.reset(token)
+    return result
+
+
+def connect_signals():
+    for name, model in TRACKED.items():
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'changelog-save-{name}')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'changelog-delete-{name}')
+
+
+def read(since=0, limit=DEFAULT_LIMIT, tables=None):
+    """
+    Up to limit entries after the cursor since, oldest first, as tuples of
+    COLUMNS, and whether more are ready. Stops before the first entry that
+    has not settled yet, whatever follows it.
+    """
+    entries = ChangeLogEntry.objects.filter(pk__gt=since)
+    if tables:
+        entries = entries.filter(table__in=tables)
+    rows = list(entries.order_by('pk').values_list(*COLUMNS)[:limit + 1])
+    settled = timezone.now() - datetime.timedelta(seconds=settings.CHANGELOG_SETTLE_SECONDS)
+    for index, row in enumerate(rows):
+        if row[-1] > settled:
+            return rows[:index], False
+    return rows[:limit], len(rows) > limit
+
+
+def compact(before=None, batch_size=10000):
+    """
+    Delete entries older than before (default CHANGELOG_RETENTION_DAYS ago)
+    that a later entry for the same row supersedes, then old deletes. Works
+    through the log in id ranges of batch_size, each in its own
+    transaction. Returns the number of entries removed.
+    """
+    before = before or timezone.now() - datetime.timedelta(days=settings.CHANGELOG_RETENTION_DAYS)
+    old = ChangeLogEntry.objects.filter(changed_at__lt=before)
+    bounds = old.aggregate(start=Min('pk'), end=Max('pk'))
+    if bounds['start'] is None:
+        return 0
+    later = ChangeLogEntry.objects.filter(table=OuterRef('table'), object_id=OuterRef('object_id'), pk__gt=OuterRef('pk'))
+    removed = 0
+    for low in range(bounds['start'], bounds['end'] + 1, batch_size):
+        with transaction.atomic():
+            batch = old.filter(pk__gte=low, pk__lt=low + batch_size)
+            removed += batch.filter(Exists(later)).delete()[0]
+            removed += batch.filter(action='delete').delete()[0]
+    return removed
+
+
+def backfill(batch_size=10000):
+    """
+    Log an insert for every tracked row that has no entry yet, e.g. rows
+    loaded with bulk_create() before the log existed, so that reading from
+    cursor 0 yields every row. Returns the number of entries added.
+    """
+    added = 0
+    for name, model in TRACKED.items():
+        logged = ChangeLogEntry.objects.filter(table=name, object_id=OuterRef('pk'))
+        rows = model.objects.filter(~Exists(logged)).order_by('pk')
+        last = 0
+        while batch := list(rows.filter(pk__gt=last)[:batch_size]):
+            with transaction.atomic():
+                record('insert', batch)
+            added += len(batch)
+            last = batch[-1].pk
+    return added
@@ -0,0 +1,75 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import Encounter
+from .serializers import EncounterSerializer
+
+
+def clinic_day_key(provider_id, day):
+    return f'clinic-day:{provider_id}:{day.isoformat()}'
+
+
+def day_bounds(day):
+    """The aware [start, end) datetimes of the local calendar day."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+def clinic_day(provider_id, day):
+    """
+    The provider's encounters on one local day, by start time, encoded.
+
+    The calendar asks for the same few provider-days over and over, so each
+    is cached until one of its encounters changes (or CLINIC_DAY_CACHE_TIMEOUT
+    runs out, as a backstop for writes that send no signals). A miss is one
+    range scan of encounter_schedule_idx.
+    """
+    key = clinic_day_key(provider_id, day)
+    rows = cache.get(key)
+    if rows is None:
+        start, end = day_bounds(day)
+        encounters = Encounter.objects.filter(provider_id=provider_id, scheduled_for__gte=start, scheduled_for__lt=end)
+        rows = EncounterSerializer().encode(encounters.order_by('scheduled_for', 'pk'))
+        cache.set(key, rows, settings.CLINIC_DAY_CACHE_TIMEOUT)
+    return rows
+
+
+def _bucket(encounter):
+    if encounter.provider_id is None or not isinstance(encounter.scheduled_for, datetime.datetime):
+        return None
+    return encounter.provider_id, timezone.localtime(encounter.scheduled_for).date()
+
+
+def _remember_bucket(sender, instance, **kwargs):
+    # The day a loaded encounter was listed on, so moving it to another
+    # provider or day also clears the one it left
+    instance._clinic_day = _bucket(instance) if instance.pk else None
+
+
+def forget_days(buckets):
+    """Drop the cached (provider_id, day) buckets once the transaction commits."""
+    keys = [clinic_day_key(*bucket) for bucket in buckets if bucket is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _on_save(sender, instance, **kwargs):
+    new_bucket = _bucket(instance)
+    forget_days({getattr(instance, '_clinic_day', None), new_bucket})
+    instance._clinic_day = new_bucket
+
+
+def _on_delete(sender, instance, **kwargs):
+    forget_days({getattr(instance, '_clinic_day', None), _bucket(instance)})
+
+
+def connect_signals():
+    """Drop cached clinic days when encounters on them are written through the ORM."""
+    post_init.connect(_remember_bucket, sender=Encounter, dispatch_uid='clinic-day-init')
+    post_save.connect(_on_save, sender=Encounter, dispatch_uid='clinic-day-save')
+    post_delete.connect(_on_delete, sender=Encounter, dispatch_uid='clinic-day-delete')
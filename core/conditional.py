@@ -0,0 +1,84 @@
+import hashlib
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+VERSION_KEY = 'table-version:{}'
+# Queues and logs no view takes an ETag from: a signal per row would only
+# slow down their bulk deletes
+UNVERSIONED_MODELS = frozenset(['core.OutboxMessage', 'core.ChangeLogEntry', 'core.AccessLog'])
+
+
+def bump_table_version(label):
+    """
+    Record a change to the table behind the model label (e.g. 'core.Metric').
+    The bump happens once the surrounding transaction commits, so a reader can
+    never pair the new version with data that is not yet visible. Call this
+    directly after queryset.update() or bulk_create(), which send no signals.
+    """
+    def bump():
+        key = VERSION_KEY.format(label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    transaction.on_commit(bump)
+
+
+def get_table_versions(labels):
+    """
+    Return {label: version} for labels in one cache round trip.
+    Versions start from the current time in nanoseconds, so an ETag issued
+    before the cache was cleared is never reissued for different data.
+
+    The versions live in the default cache, which must be shared (CACHE_URL
+    in settings) when running more than one worker process.
+    """
+    keys = {VERSION_KEY.format(label): label for label in labels}
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        for key in keys:
+            if key not in found:
+                cache.add(key, time.time_ns(), None)
+        found = cache.get_many(keys)
+    return {label: found.get(key) for key, label in keys.items()}
+
+
+def _on_change(sender, **kwargs):
+    bump_table_version(sender._meta.label)
+
+
+def connect_signals(app_label='core'):
+    """Bump the table version whenever a model of app_label is saved or deleted."""
+    for model in apps.get_app_config(app_label).get_models():
+        label = model._meta.label
+        if label in UNVERSIONED_MODELS:
+            continue
+        post_save.connect(_on_change, sender=model, dispatch_uid=f'table-version-save-{label}')
+        post_delete.connect(_on_change, sender=model, dispatch_uid=f'table-version-delete-{label}')
+
+
+def table_etag(*labels, dated=False):
+    """
+    Conditional GET for views whose output only depends on the given tables
+    (and, if dated, on today's date, e.g. through a default date range).
+
+    The ETag is derived from the tables' version numbers, the requesting user
+    and the full path, so a matching If-None-Match returns 304 without running
+    the view. No Last-Modified is sent: it could not tell users apart.
+    Apply it below @api_view so authentication has already run.
+    """
+    def etag_func(request, *args, **kwargs):
+        versions = get_table_versions(labels)
+        parts = [request.get_full_path(), str(request.user.pk)]
+        if dated:
+            parts.append(timezone.localdate().isoformat())
+        parts.extend(str(versions[label]) for label in labels)
+        return hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+    return condition(etag_func=etag_func)
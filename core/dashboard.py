@@ -0,0 +1,172 @@
+import datetime
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import User, HealthProgram, Client, Enrollment, Prescription, Metric, Encounter, MonthlyRevenue, live_q
+from .renderers import ORJSONRenderer
+from .revenue import month_of
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'dashboard-snapshot'
+# Held by the request recomputing a stale snapshot
+REFRESHING_KEY = 'dashboard-snapshot-refreshing'
+
+
+def refresh_interval():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_INTERVAL', 60)
+
+
+def compute_kpis():
+    """Every dashboard figure, with one aggregate query per table."""
+    now = timezone.now()
+    today = timezone.localdate()
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    tomorrow = midnight + datetime.timedelta(days=1)
+
+    live_enrollments = live_q(HealthProgram, 'enrollments')
+    programs = list(
+        HealthProgram.objects.annotate(
+            total_enrollments=Count('enrollments', filter=live_enrollments),
+            active_enrollments=Count('enrollments', filter=live_enrollments & Q(enrollments__is_active=True)),
+        ).order_by('-active_enrollments', 'name').values('id', 'name', 'total_enrollments', 'active_enrollments')
+    )
+    return {
+        'clients': Client.objects.aggregate(
+            total=Count('pk'),
+            new_last_30_days=Count('pk', filter=Q(created_at__gte=now - datetime.timedelta(days=30))),
+        ),
+        'programs': {
+            'total': len(programs),
+            'active': sum(1 for program in programs if program['active_enrollments']),
+            'breakdown': programs,
+        },
+        'enrollments': Enrollment.objects.aggregate(
+            total=Count('pk'),
+            active=Count('pk', filter=Q(is_active=True)),
+        ),
+        'prescriptions': Prescription.objects.aggregate(
+            total=Count('pk'),
+            active=Count('pk', filter=Prescription.valid_q(today, today)),
+        ),
+        # Each figure looks at most 30 days back, so the lower bound costs
+        # nothing and lets a partitioned table skip its older months
+        'encounters': Encounter.objects.filter(
+            scheduled_for__gte=min(midnight, now - datetime.timedelta(days=30))
+        ).aggregate(
+            today=Count('pk', filter=Q(scheduled_for__gte=midnight, scheduled_for__lt=tomorrow)),
+            completed_today=Count('pk', filter=Q(
+                scheduled_for__gte=midnight, scheduled_for__lt=tomorrow, status='Completed'
+            )),
+            upcoming_7_days=Count('pk', filter=Q(
+                scheduled_for__gte=now, scheduled_for__lt=now + datetime.timedelta(days=7), status='Scheduled'
+            )),
+            no_shows_last_30_days=Count('pk', filter=Q(
+                scheduled_for__gte=now - datetime.timedelta(days=30), status='No Show'
+            )),
+        ),
+        'metrics': Metric.objects.filter(recorded_at__gte=now - datetime.timedelta(days=7)).aggregate(
+            recorded_last_7_days=Count('pk'),
+        ),
+        'staff': User.objects.aggregate(
+            doctors=Count('pk', filter=Q(is_doctor=True, is_active=True)),
+            nurses=Count('pk', filter=Q(is_nurse=True, is_active=True)),
+        ),
+        'revenue': {
+            'this_month': MonthlyRevenue.objects.filter(month=month_of(now)).aggregate(total=Sum('total'))['total'] or 0,
+        },
+    }
+
+
+def refresh_snapshot():
+    """
+    Recompute the dashboard and publish it as one cache entry.
+
+    The document is rendered to JSON here, once, so serving it is a single
+    cache read. Readers keep getting the previous snapshot while this runs:
+    the new one replaces it in a single cache.set() once it is complete.
+    """
+    generated_at = timezone.now()
+    document = {
+        'generated_at': generated_at,
+        'refresh_interval': refresh_interval(),
+        **compute_kpis(),
+    }
+    body = ORJSONRenderer().render(document)
+    snapshot = {
+        'generated_at': generated_at,
+        'etag': '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest(),
+        'body': body,
+    }
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def get_snapshot():
+    """
+    The current snapshot. Without a refresher running, a request finding it
+    older than the refresh interval recomputes it inline; the others meanwhile
+    keep getting the previous one. Only when there is none at all does every
+    request wait for it.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return refresh_snapshot()
+    age = (timezone.now() - snapshot['generated_at']).total_seconds()
+    if age >= refresh_interval() and cache.add(REFRESHING_KEY, True, refresh_interval()):
+        try:
+            snapshot = refresh_snapshot()
+        finally:
+            cache.delete(REFRESHING_KEY)
+    return snapshot
+
+
+class SnapshotRefresher(threading.Thread):
+    """
+    Daemon thread refreshing the snapshot every interval seconds.
+
+    Run one per deployment: from a worker process with
+    DASHBOARD_SNAPSHOT_THREAD = True, or with
+    `manage.py refresh_dashboard_snapshot --loop`. The snapshot lives in the
+    default cache, which must be shared between processes for either to
+    serve more than one worker.
+    """
+
+    def __init__(self, interval=None):
+        super().__init__(name='dashboard-snapshot', daemon=True)
+        self.interval = interval or refresh_interval()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                refresh_snapshot()
+            except Exception:
+                logger.exception('Dashboard snapshot refresh failed')
+            finally:
+                close_old_connections()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresher():
+    """Start the process-wide refresher thread, once."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = SnapshotRefresher()
+            _refresher.start()
+    return _refresher
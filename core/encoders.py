@@ -0,0 +1,76 @@
+from typing import NamedTuple
+
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+
+def full_name(prefix=''):
+    """Database-side "first last" name for a Client, optionally via a relation."""
+    return Concat(f'{prefix}first_name', Value(' '), f'{prefix}last_name')
+
+
+class Nested(NamedTuple):
+    """A nested layout encoded as None when the lookup (a relation's key) is null."""
+    lookup: str
+    fields: dict
+
+
+class RowEncoder:
+    """
+    Pre-built row serializer working on values_list() tuples.
+
+    The output layout is declared once as a dict mapping each key to an ORM
+    lookup or expression, a nested dict (or a Nested one, for a relation that
+    may be null), or a (lookup, function) pair whose function is applied to
+    the value. It is compiled into a single function
+    that builds each row with one dict display, so encoding a queryset never
+    instantiates model objects or follows relations in Python.
+
+        encoder = RowEncoder({
+            'id': 'id',
+            'client': {'id': 'client_id', 'name': full_name('client__')},
+            'gender': ('client__gender', GENDER_DISPLAY.get),
+        })
+        encoder.encode(Metric.objects.all())
+    """
+
+    def __init__(self, fields):
+        self.columns = []
+        self._functions = {}
+        source = self._compile(fields)
+        self.build_row = eval(f'lambda r: {source}', self._functions)
+
+    def _compile(self, fields):
+        items = []
+        for key, spec in fields.items():
+            if isinstance(spec, dict):
+                value = self._compile(spec)
+            elif isinstance(spec, Nested):
+                self.columns.append(spec.lookup)
+                value = f'(None if r[{len(self.columns) - 1}] is None else {self._compile(spec.fields)})'
+            else:
+                function = None
+                if isinstance(spec, tuple):
+                    spec, function = spec
+                value = f'r[{len(self.columns)}]'
+                self.columns.append(spec)
+                if function is not None:
+                    name = f'f{len(self._functions)}'
+                    self._functions[name] = function
+                    value = f'{name}({value})'
+            items.append(f'{key!r}: {value}')
+        return '{' + ', '.join(items) + '}'
+
+    def rows(self, queryset):
+        """Return the raw value tuples for queryset."""
+        return queryset.values_list(*self.columns)
+
+    def encode(self, queryset):
+        """Encode every row of queryset into a list of dicts."""
+        build_row = self.build_row
+        return [build_row(row) for row in self.rows(queryset)]
+
+    def encode_one(self, queryset):
+        """Encode the first row of queryset, or return None if it is empty."""
+        row = self.rows(queryset).first()
+        return None if row is None else self.build_row(row)
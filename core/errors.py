@@ -0,0 +1,154 @@
+"""
+Aggregation of unhandled API errors.
+
+exception_handler (REST_FRAMEWORK['EXCEPTION_HANDLER']) leaves the
+exceptions DRF knows how to answer (validation errors, 404s, permission
+denials) to DRF's own handler. Any other exception is reduced to a
+fingerprint, a hash of its type and the innermost ERROR_FINGERPRINT_FRAMES
+frames of its traceback, and counted against it in this process's
+ErrorAggregator. The first occurrence of a fingerprint is logged with its
+traceback; after that one summary line per fingerprint is logged at most
+every ERROR_LOG_INTERVAL seconds, giving the count since the last line. A
+storm of identical failures therefore costs a dictionary update per
+request, not a formatted traceback and a log line each.
+
+The client gets a 500 naming the fingerprint as error_id, which is what
+/errors/ lists for administrators: the most frequent errors with their
+counts and when they were first and last seen. Each worker process keeps
+its own counts, of its most recent ERROR_MAX_FINGERPRINTS fingerprints.
+"""
+import collections
+import hashlib
+import logging
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler, set_rollback
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(exc, frames=None):
+    """A short hash of exc's type and the innermost frames of its traceback."""
+    frames = frames or settings.ERROR_FINGERPRINT_FRAMES
+    stack = [
+        f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{lineno}'
+        for frame, lineno in traceback.walk_tb(exc.__traceback__)
+    ]
+    key = '|'.join([f'{type(exc).__module__}.{type(exc).__qualname__}', *stack[-frames:]])
+    return hashlib.sha1(key.encode()).hexdigest()[:16], stack[-1] if stack else ''
+
+
+class ErrorStats:
+    """Counts of one fingerprint."""
+
+    __slots__ = ('fingerprint', 'type', 'message', 'location', 'path', 'count',
+                 'first_seen', 'last_seen', 'logged_at', 'logged_count')
+
+    def __init__(self, fingerprint, exc, location, path, now):
+        self.fingerprint = fingerprint
+        self.type = type(exc).__name__
+        self.message = str(exc)[:500]
+        self.location = location
+        self.path = path
+        self.count = 0
+        self.first_seen = self.last_seen = now
+        self.logged_at = None
+        self.logged_count = 0
+
+    def as_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'type': self.type,
+            'message': self.message,
+            'location': self.location,
+            'path': self.path,
+            'count': self.count,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+        }
+
+
+class ErrorAggregator:
+    """Per-fingerprint counts and log rate limiting; see the module docstring."""
+
+    def __init__(self, interval=None, max_fingerprints=None):
+        self.interval = interval if interval is not None else settings.ERROR_LOG_INTERVAL
+        self.max_fingerprints = max_fingerprints or settings.ERROR_MAX_FINGERPRINTS
+        # Least recently seen first
+        self.errors = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, exc, path=''):
+        """Count exc and log it if it is new or its interval has passed. Returns its ErrorStats."""
+        key, location = fingerprint(exc)
+        now, tick = timezone.now(), time.monotonic()
+        with self.lock:
+            stats = self.errors.get(key)
+            if stats is None:
+                stats = self.errors[key] = ErrorStats(key, exc, location, path, now)
+                if len(self.errors) > self.max_fingerprints:
+                    self.errors.popitem(last=False)
+            else:
+                self.errors.move_to_end(key)
+            stats.count += 1
+            stats.last_seen = now
+            first = stats.logged_at is None
+            due = first or tick - stats.logged_at >= self.interval
+            if due:
+                repeats = stats.count - stats.logged_count
+                stats.logged_at, stats.logged_count = tick, stats.count
+        if first:
+            logger.error('%s: %s', stats.type, stats.message, exc_info=exc,
+                         extra={'fingerprint': key, 'path': path})
+        elif due:
+            logger.error('%s: %s (%d times in the last %ds)', stats.type, stats.message, repeats,
+                         self.interval, extra={'fingerprint': key, 'path': path, 'count': stats.count})
+        return stats
+
+    def top(self, limit=20):
+        """The limit most frequent errors, as dicts."""
+        with self.lock:
+            errors = sorted(self.errors.values(), key=lambda stats: stats.count, reverse=True)[:limit]
+            return [stats.as_dict() for stats in errors]
+
+    def clear(self):
+        with self.lock:
+            self.errors.clear()
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    """The process-wide ErrorAggregator."""
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                _aggregator = ErrorAggregator()
+    return _aggregator
+
+
+def exception_handler(exc, context):
+    response = drf_exception_handler(exc, context)
+    if response is not None:
+        return response
+    request = context.get('request')
+    stats = get_aggregator().record(exc, request.path if request is not None else '')
+    set_rollback()
+    response = Response(
+        {'error': 'Internal server error', 'error_id': stats.fingerprint},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+    # Already counted (and logged, if due) above; keeps django.request from
+    # logging every 500 again
+    response._has_been_logged = True
+    return response
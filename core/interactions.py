@@ -0,0 +1,142 @@
+import csv
+import datetime
+import functools
+import logging
+import os
+import re
+import threading
+from typing import NamedTuple
+
+from django.conf import settings
+
+from .models import Client, Prescription
+
+logger = logging.getLogger(__name__)
+
+# A strength such as "5mg", "2.5", "500/125" or "0.1%", which ends the name
+STRENGTH = re.compile(r'\d[\d.,/]*[a-zµ%]*(?:/[\d.]*[a-z]*)?')
+
+SEVERITIES = ('minor', 'moderate', 'major')
+# Interactions that stop a prescription being written unless acknowledged
+BLOCKING_SEVERITIES = frozenset(['major'])
+
+
+class Interaction(NamedTuple):
+    medication: str
+    other: str
+    severity: str
+    description: str
+
+
+@functools.lru_cache(maxsize=4096)
+def normalise(name):
+    """
+    The lookup key for a medication name: case-folded, single-spaced, and
+    without the strength and form after the name, so "Warfarin 5mg tablets"
+    and "warfarin" match. The first word is always kept, so names that start
+    with a number ("5-FU", "6-mercaptopurine") keep their key.
+    """
+    words = name.casefold().split()
+    for index, word in enumerate(words[1:], 1):
+        if STRENGTH.fullmatch(word):
+            del words[index:]
+            break
+    return ' '.join(words)
+
+
+class InteractionTable:
+    """
+    Pairwise interaction lookup: normalised medication name -> {other
+    normalised name: (severity, description)}. Each pair is stored under
+    both names, so checking a medication against a regimen is one dict
+    lookup per drug already taken.
+    """
+
+    def __init__(self, rows=()):
+        self.pairs = {}
+        for drug_a, drug_b, severity, description in rows:
+            if severity not in SEVERITIES:
+                raise ValueError(f'Unknown severity {severity!r} for {drug_a} and {drug_b}')
+            a, b = normalise(drug_a), normalise(drug_b)
+            self.pairs.setdefault(a, {})[b] = (severity, description)
+            self.pairs.setdefault(b, {})[a] = (severity, description)
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a drug_a,drug_b,severity,description CSV file with a header row."""
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            return cls(row for row in reader if row)
+
+    def __len__(self):
+        return sum(len(partners) for partners in self.pairs.values()) // 2
+
+    def check(self, medication, regimen):
+        """The interactions of medication with the medication names in regimen."""
+        partners = self.pairs.get(normalise(medication))
+        if not partners:
+            return []
+        found = []
+        for other in regimen:
+            interaction = partners.get(normalise(other))
+            if interaction is not None:
+                found.append(Interaction(medication, other, *interaction))
+        return found
+
+    def check_regimen(self, regimen):
+        """Every interacting pair within regimen."""
+        regimen = list(regimen)
+        found = []
+        for index, medication in enumerate(regimen):
+            found.extend(self.check(medication, regimen[index + 1:]))
+        return found
+
+
+_table = None
+_loaded_version = None
+_lock = threading.Lock()
+
+
+def get_table():
+    """
+    The interaction table for DRUG_INTERACTIONS_FILE, reloaded when the file
+    changes. A stat() per call keeps edits live without a restart; if a new
+    version fails to load, the previous table stays in use.
+    """
+    global _table, _loaded_version
+    path = settings.DRUG_INTERACTIONS_FILE
+    stat = os.stat(path)
+    version = (str(path), stat.st_mtime_ns, stat.st_size)
+    if version != _loaded_version:
+        with _lock:
+            if version != _loaded_version:
+                try:
+                    _table = InteractionTable.from_file(path)
+                except (OSError, ValueError, csv.Error):
+                    if _table is None:
+                        raise
+                    logger.exception('Could not reload drug interactions from %s; keeping the previous table', path)
+                _loaded_version = version
+    return _table
+
+
+def lock_client(client_id):
+    """Serialise interaction checks and prescription writes for one client until the transaction ends."""
+    Client.objects.select_for_update().only('pk').get(pk=client_id)
+
+
+def check_prescription(client_id, medication_name, start_date, end_date=None, exclude=None):
+    """
+    Interactions of medication_name with the client's other prescriptions
+    in force at any time between start_date and end_date (open-ended if
+    None). exclude is the pk of the prescription being edited.
+    """
+    regimen = Prescription.objects.filter(client_id=client_id).valid_between(start_date, end_date or datetime.date.max)
+    if exclude is not None:
+        regimen = regimen.exclude(pk=exclude)
+    return get_table().check(medication_name, regimen.values_list('medication_name', flat=True))
+
+
+def blocking(interactions):
+    return [interaction for interaction in interactions if interaction.severity in BLOCKING_SEVERITIES]
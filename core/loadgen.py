@@ -0,0 +1,332 @@
+"""
+HTTP load generator for a running API (manage.py load_test).
+
+Virtual clinicians sign in with the staff accounts made by seed_scale and
+work through a weighted mix of what the frontend does most: client
+typeahead searches, opening a client's chart, recording a measurement,
+booking an encounter, polling the dashboard and signing in again. Only the
+standard library is used and nothing here touches Django or the database,
+so the generator can run from any machine that can reach the server.
+
+run_users() keeps a fixed number of clinicians busy (closed loop, with
+think time); run_rate() starts actions at a fixed rate whatever the
+response times (open loop), which is what find_saturation() steps up to
+find the highest rate the server sustains.
+"""
+import datetime
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+
+from .synthetic import FIRST_NAMES, METRICS, ENCOUNTER_TYPES, staff_username
+
+# Relative frequency of each action, after the frontend's call patterns
+DEFAULT_MIX = {
+    'search': 30,
+    'open_chart': 25,
+    'poll_dashboard': 20,
+    'record_metric': 15,
+    'create_encounter': 8,
+    'login': 2,
+}
+# A booking clash is the server doing its job, not an error
+EXPECTED_STATUS = {
+    'login': (200,),
+    'search': (200,),
+    'open_chart': (200,),
+    'poll_dashboard': (200, 304),
+    'record_metric': (201,),
+    'create_encounter': (201, 409),
+}
+
+
+def parse_mix(text):
+    """'search=40,login=5' -> DEFAULT_MIX with those weights replaced."""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, text.split(',')):
+        name, _, weight = item.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f'unknown action {name.strip()!r}')
+        mix[name.strip()] = int(weight)
+    if not any(mix.values()):
+        raise ValueError('at least one action needs a positive weight')
+    return mix
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class Stats:
+    """Latencies and outcomes per action, shared by the clinicians' threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.missed = 0
+
+    def record(self, name, seconds, status, ok):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status or 'failed'] += 1
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, elapsed):
+        """
+        {action: figures} plus an 'all' row: requests, throughput, error
+        rate, latency percentiles in milliseconds and status counts.
+        """
+        with self.lock:
+            rows = {name: self._figures(latencies, self.errors[name], self.statuses[name], elapsed)
+                    for name, latencies in sorted(self.latencies.items())}
+            everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+            statuses = sum(self.statuses.values(), Counter())
+            rows['all'] = self._figures(everything, sum(self.errors.values()), statuses, elapsed)
+            rows['all']['missed'] = self.missed
+        return rows
+
+    @staticmethod
+    def _figures(latencies, errors, statuses, elapsed):
+        ordered = sorted(latencies)
+        return {
+            'requests': len(ordered),
+            'rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            'error_rate': round(errors / len(ordered), 4) if ordered else 0.0,
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+            'p90_ms': round(percentile(ordered, 0.90) * 1000, 1),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+            'max_ms': round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        }
+
+
+class Clinician:
+    """
+    One member of staff on one keep-alive connection. Each action makes a
+    single request; client ids come from the clinician's own searches.
+    """
+
+    def __init__(self, base_url, username, password, stats, rng, timeout=30):
+        parts = urllib.parse.urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+        self.username = username
+        self.password = password
+        self.stats = stats
+        self.rng = rng
+        self.token = None
+        self.client_ids = []
+
+    def request(self, name, method, path, params=None, body=None):
+        """Make one request and record it under name. Returns (status, decoded JSON or None)."""
+        url = self.prefix + path + (f'?{urllib.parse.urlencode(params)}' if params else '')
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, url, body=data, headers=headers)
+            response = self.connection.getresponse()
+            status, payload = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnects on the next request
+            self.connection.close()
+            status, payload = None, b''
+        ok = status in EXPECTED_STATUS[name]
+        self.stats.record(name, time.perf_counter() - started, status, ok)
+        try:
+            return status, json.loads(payload) if ok and payload else None
+        except ValueError:
+            return status, None
+
+    def run(self, action):
+        if not self.client_ids and action in ('open_chart', 'record_metric', 'create_encounter'):
+            action = 'search'
+        getattr(self, action)()
+
+    def close(self):
+        self.connection.close()
+
+    def login(self):
+        self.token = None
+        _, data = self.request('login', 'POST', '/auth/token/', body={'username': self.username, 'password': self.password})
+        if data:
+            self.token = data['token']
+        return self.token is not None
+
+    def search(self):
+        # The typeahead fires once the user has typed two or three letters
+        name = self.rng.choice(FIRST_NAMES)
+        _, rows = self.request('search', 'GET', '/clients/lookup/', params={'q': name[:self.rng.randint(2, 3)]})
+        if rows:
+            self.client_ids = [row[0] for row in rows]
+
+    def open_chart(self):
+        self.request('open_chart', 'GET', f'/clients/{self.rng.choice(self.client_ids)}/comprehensive/')
+
+    def poll_dashboard(self):
+        self.request('poll_dashboard', 'GET', '/dashboard/snapshot/')
+
+    def record_metric(self):
+        name, unit, typical, spread = self.rng.choice(METRICS)
+        self.request('record_metric', 'POST', '/metrics/record/', body={
+            'client_id': self.rng.choice(self.client_ids),
+            'name': name,
+            'value': round(self.rng.gauss(typical, spread / 2), 1),
+            'unit': unit,
+        })
+
+    def create_encounter(self):
+        # A quarter-hour slot in clinic hours over the next eight weeks
+        day = datetime.date.today() + datetime.timedelta(days=self.rng.randint(1, 56))
+        start = datetime.datetime.combine(day, datetime.time(8)) + datetime.timedelta(minutes=15 * self.rng.randrange(36))
+        self.request('create_encounter', 'POST', '/encounters/create/', body={
+            'client_id': self.rng.choice(self.client_ids),
+            'encounter_type': self.rng.choice(ENCOUNTER_TYPES),
+            'scheduled_for': start.isoformat(),
+            'duration': 15,
+        })
+
+
+def sign_in(base_url, count, seed, staff, password, stats, rng_seed=0):
+    """count clinicians, the n-th using seed_scale's staff account n % staff, all logged in."""
+    clinicians = [
+        Clinician(base_url, staff_username(seed, n % staff), password, stats, random.Random(f'{rng_seed}:{n}'))
+        for n in range(count)
+    ]
+    for clinician in clinicians:
+        clinician.login()
+    return clinicians
+
+
+def run_users(clinicians, duration, mix, think=1.0, ramp=0.0):
+    """
+    Closed loop: each clinician repeatedly picks an action from mix, makes
+    it and pauses for an exponentially distributed think time of mean
+    `think` seconds, for duration seconds. Start times are spread over ramp
+    seconds. Returns the Stats summary.
+    """
+    stats = Stats()
+    names, weights = list(mix), list(mix.values())
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def work(clinician, delay):
+        clinician.stats = stats
+        time.sleep(delay)
+        while time.perf_counter() < deadline:
+            clinician.run(clinician.rng.choices(names, weights)[0])
+            if think:
+                time.sleep(min(clinician.rng.expovariate(1 / think), max(0.0, deadline - time.perf_counter())))
+
+    threads = [
+        threading.Thread(target=work, args=(clinician, ramp * n / len(clinicians)), daemon=True)
+        for n, clinician in enumerate(clinicians)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(time.perf_counter() - started)
+
+
+def run_rate(clinicians, rps, duration, mix, rng=None):
+    """
+    Open loop: start actions from mix at rps per second for duration
+    seconds, whoever is free among clinicians taking the next one. Actions
+    still queued when the time is up are dropped and counted as missed, so
+    a server that cannot keep up shows it in the throughput rather than by
+    slowing the generator down. Returns the Stats summary.
+    """
+    stats = Stats()
+    rng = rng or random.Random(0)
+    names, weights = list(mix), list(mix.values())
+    actions = queue.Queue()
+
+    def work(clinician):
+        clinician.stats = stats
+        while True:
+            action = actions.get()
+            if action is None:
+                return
+            clinician.run(action)
+
+    threads = [threading.Thread(target=work, args=(clinician,), daemon=True) for clinician in clinicians]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    issued = 0
+    while True:
+        due = started + issued / rps
+        if due >= started + duration:
+            break
+        time.sleep(max(0.0, due - time.perf_counter()))
+        actions.put(rng.choices(names, weights)[0])
+        issued += 1
+    while True:
+        try:
+            actions.get_nowait()
+        except queue.Empty:
+            break
+        stats.missed += 1
+    for _ in threads:
+        actions.put(None)
+    for thread in threads:
+        thread.join()
+    # Throughput over the window the actions were due in
+    return stats.summary(duration)
+
+
+def sustainable(summary, rps, duration, max_error_rate, max_p95_ms):
+    """
+    Whether a run_rate() summary kept up with rps (next to nothing left
+    queued at the end) within the error and latency limits.
+    """
+    overall = summary['all']
+    return (
+        overall['missed'] <= max(1, 0.01 * rps * duration)
+        and overall['error_rate'] <= max_error_rate
+        and overall['p95_ms'] <= max_p95_ms
+    )
+
+
+def find_saturation(probe, start, limit, precision=0.1):
+    """
+    The highest rate for which probe(rps) is true: the rate is doubled from
+    start until a probe fails (or limit is reached), then the gap between
+    the best passing and the lowest failing rate is halved until it is
+    within precision of the latter. Returns 0 if nothing passes.
+    """
+    low, high, rate = 0.0, None, float(start)
+    while high is None:
+        if probe(rate):
+            low = rate
+            if rate >= limit:
+                return low
+            rate = min(rate * 2, limit)
+        else:
+            high = rate
+    while high - low > max(precision * high, 1.0):
+        rate = round((low + high) / 2, 1)
+        if probe(rate):
+            low = rate
+        else:
+            high = rate
+    return low
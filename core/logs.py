@@ -0,0 +1,172 @@
+"""
+Structured logging off the request path.
+
+LOGGING (settings) attaches a single QueueHandler to the root logger. A
+request thread that logs only turns the record into its final message,
+stamps it with the current request id and puts it on an in-process queue;
+a QueueListener thread formats it as one JSON object per line
+(JSONFormatter) and writes it to the real handlers (console, LOG_FILE), so
+disk and terminal I/O never add to request latency. When the queue holds
+LOG_QUEUE_SIZE records the listener has fallen behind, and further records
+are counted in QueueHandler.dropped and discarded rather than block the
+request.
+
+RequestIdMiddleware sets the request id for everything logged while a
+request is handled. SampleFilter keeps one in LOG_DEBUG_SAMPLE debug
+records, so chatty debug logging can stay switched on under load.
+
+Nothing here touches Django settings or models: it is imported while
+settings are configured.
+"""
+import atexit
+import contextvars
+import datetime
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+import orjson
+
+# Id of the request being handled, '-' outside of one
+request_id = contextvars.ContextVar('request_id', default='-')
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id, as record.request_id."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Let through one in every `every` records at or below level, and all records above it."""
+
+    def __init__(self, every=1, level=logging.DEBUG):
+        super().__init__()
+        self.every = max(int(every), 1)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > self.level or self.every == 1:
+            return True
+        return next(self.counter) % self.every == 0
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, request_id,
+    the `extra` fields and, for exceptions, the formatted traceback.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """A QueueListener that also answers flush markers (threading.Event) put on its queue."""
+
+    def handle(self, record):
+        if isinstance(record, threading.Event):
+            record.set()
+        else:
+            super().handle(record)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a QueueListener writing them to the handlers named in
+    handlers, which LOGGING must configure first (dictConfig goes through
+    them in alphabetical order). The listener is started by the first record
+    each process emits, so forked workers get their own, and stopped,
+    draining the queue, at exit.
+    """
+
+    def __init__(self, handlers=(), maxsize=10000):
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        # Named handlers are only weakly referenced by the logging module
+        lookup = getattr(logging, 'getHandlerByName', None) or logging._handlers.get
+        self.handlers = []
+        for name in handlers:
+            if lookup(name) is None:
+                raise ValueError(f'Unknown handler {name!r}')
+            self.handlers.append(lookup(name))
+        self.listener = None
+        self.pid = None
+        self.listener_lock = threading.Lock()
+        self.dropped = 0
+
+    def start(self):
+        if self.pid != os.getpid():
+            with self.listener_lock:
+                if self.pid != os.getpid():
+                    if self.pid is not None:
+                        # Forked: whatever the parent had queued is its own to write
+                        self.queue = queue.SimpleQueue()
+                    self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+                    self.listener.start()
+                    self.pid = os.getpid()
+                    atexit.register(self.stop)
+
+    def stop(self):
+        """Write out what is queued and stop the listener."""
+        with self.listener_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = self.pid = None
+
+    def prepare(self, record):
+        """
+        Merge the arguments into the message now, while they hold the values
+        they were logged with; formatting, tracebacks included, is left to
+        the listener.
+        """
+        # A shallow copy that skips LogRecord.__init__, the dearest part of emit()
+        prepared = logging.LogRecord.__new__(logging.LogRecord)
+        prepared.__dict__.update(vars(record))
+        prepared.msg = prepared.message = record.getMessage()
+        prepared.args = None
+        return prepared
+
+    def enqueue(self, record):
+        # SimpleQueue is unbounded (and much cheaper to put to than Queue)
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+    def emit(self, record):
+        self.start()
+        super().emit(record)
+
+    def flush(self):
+        """Wait until the listener has written everything queued so far."""
+        if self.listener is not None and self.pid == os.getpid():
+            written = threading.Event()
+            self.queue.put_nowait(written)
+            written.wait()
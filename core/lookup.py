@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from .conditional import get_table_versions
+from .models import Client
+from .permissions import can_view_all, visibility_tables
+
+LOOKUP_DEFAULT_LIMIT = 20
+LOOKUP_MAX_LIMIT = 50
+
+
+class LRUCache:
+    """
+    Thread-safe mapping keeping the maxsize most recently used entries.
+    It lives in process memory, so hits cost no round trip at all, but every
+    worker process keeps its own copy.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+recent_lookups = LRUCache(getattr(settings, 'CLIENT_LOOKUP_CACHE_SIZE', 256))
+
+
+def prefix_q(field, prefix):
+    """
+    Match rows whose upper-cased field starts with prefix.
+
+    A LIKE 'PREFIX%' test rather than a >= / < range: under a linguistic
+    collation names starting with the prefix need not sort between it and
+    its successor. On PostgreSQL the text_pattern_ops indexes of migration
+    0016 turn it into an index range scan.
+    """
+    return Q(**{f'{field}__startswith': prefix.upper()})
+
+
+def lookup_clients(user, query='', limit=LOOKUP_DEFAULT_LIMIT):
+    """
+    Return up to limit (id, display_name, date_of_birth) tuples for the
+    clients visible to user whose first or last name starts with each word of
+    query, ordered by last name.
+
+    Results are kept in recent_lookups keyed by the versions of the tables
+    they were read from, so any write to those tables retires them.
+    """
+    terms = tuple(query.split())
+    scope = 'all' if can_view_all(user) else user.pk
+    tables = sorted(visibility_tables(Client, user))
+    versions = get_table_versions(tables)
+    key = (scope, terms, limit, tuple(versions[label] for label in tables))
+    results = recent_lookups.get(key)
+    if results is None:
+        clients = Client.objects.visible_to(user).annotate(
+            first_name_upper=Upper('first_name'),
+            last_name_upper=Upper('last_name'),
+        )
+        for term in terms:
+            clients = clients.filter(prefix_q('last_name_upper', term) | prefix_q('first_name_upper', term))
+        rows = clients.order_by('last_name_upper', 'first_name_upper', 'id').values_list(
+            'id', 'first_name', 'last_name', 'date_of_birth'
+        )[:limit]
+        results = [
+            (client_id, f"{first_name} {last_name}", date_of_birth)
+            for client_id, first_name, last_name, date_of_birth in rows
+        ]
+        recent_lookups.set(key, results)
+    return results
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves clients and client records that were deleted more than the archive period ago '
+        'out of their tables and into the archive, in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive rows deleted this many days ago (default: ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = None
+        if options['days'] is not None:
+            before = timezone.now() - datetime.timedelta(days=options['days'])
+        moved = archive.archive(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Archived ' + ', '.join(f'{count:,} {table}' for table, count in moved.items())
+        ))
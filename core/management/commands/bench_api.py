@@ -0,0 +1,79 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every API endpoint at several data scales, recording median latency, query count '
+        'and peak memory, and fails if any of them regressed past the saved baseline. '
+        'Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000', help='Comma-separated client counts to seed (default 100,1000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per endpoint (default 5)')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'api_baseline.json'))
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed growth in latency and memory, as a fraction (default 0.5); queries may not grow')
+        parser.add_argument('--only', nargs='*', help='Route names to run (default all)')
+
+    def handle(self, *args, **options):
+        missing = benchmark.uncovered()
+        if missing:
+            raise CommandError(f'No benchmark case for: {", ".join(missing)}')
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales must be comma-separated integers')
+        unknown = set(options['only'] or ()) - set(benchmark.CASES)
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+
+        # Figures are kept per database vendor: {vendor: {scale: {route: figures}}}
+        try:
+            with open(options['baseline']) as f:
+                baselines = json.load(f)
+        except FileNotFoundError:
+            baselines = {}
+        baseline = baselines.get(connection.vendor)
+        if baseline is None and not options['save']:
+            raise CommandError(f'No {connection.vendor} baseline in {options["baseline"]}; record one with --save')
+
+        test_database = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = {}
+            for scale in scales:
+                self.stdout.write(f'Benchmarking at {scale:,} clients...')
+                results[str(scale)] = benchmark.run_scale(scale, options['repeat'], options['only'])
+                self.report(results[str(scale)])
+        finally:
+            connection.creation.destroy_test_db(test_database, verbosity=0)
+
+        if options['save']:
+            for scale, figures in results.items():
+                baselines.setdefault(connection.vendor, {}).setdefault(scale, {}).update(figures)
+            with open(options['baseline'], 'w') as f:
+                json.dump(baselines, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'{connection.vendor} baseline written to {options["baseline"]}'))
+            return
+
+        regressions = benchmark.compare(baseline, results, options['tolerance'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def report(self, results):
+        width = max(len(key) for key in results)
+        self.stdout.write(f'  {"endpoint":<{width}}  status  queries       ms   peak KB')
+        for key, figures in results.items():
+            self.stdout.write(
+                f'  {key:<{width}}  {figures["status"]:>6}  {figures["queries"]:>7}  '
+                f'{figures["ms"]:>7.2f}  {figures["peak_kb"]:>8.1f}'
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.interactions import InteractionTable, get_table
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks drug interaction checks against a regimen of --drugs medications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drugs', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        table = get_table()
+        iterations = options['iterations']
+        # The reference drugs, padded with names that interact with nothing,
+        # written the way prescribers do
+        names = sorted(table.pairs) + [f'placebo{i}' for i in range(options['drugs'])]
+        regimen = [f'{name.title()} 10mg tablets' for name in names[:options['drugs']]]
+        new_drug = 'Warfarin 5mg'
+
+        self.stdout.write(f'{len(table)} interacting pairs, regimen of {len(regimen)} drugs')
+        for label, function in (
+            ('new drug vs regimen', lambda: table.check(new_drug, regimen)),
+            ('whole regimen', lambda: table.check_regimen(regimen)),
+            ('table lookup (stat)', get_table),
+        ):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = function()
+            elapsed = time.perf_counter() - start
+            found = len(result) if not isinstance(result, InteractionTable) else '-'
+            self.stdout.write(f'{label:<22} {elapsed / iterations * 1e6:>8.2f}us  interactions: {found}')
@@ -0,0 +1,74 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.logs import JSONFormatter, QueueHandler, RequestIdFilter, SampleFilter, request_id
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the logging cost added to each request, synchronous file handler vs the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--records', type=int, default=5, help='Records logged per request')
+        parser.add_argument('--wait-us', type=int, default=500,
+                            help='Time each request spends waiting on I/O (untimed), when the listener can run')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            self.stdout.write(f'{"handler":<22} {"median":>9} {"p99":>9} {"drain":>9} {"written":>9} {"dropped":>8}')
+            for label, level in (
+                ('file', logging.INFO),
+                ('file json', logging.INFO),
+                ('queue json', logging.INFO),
+                ('queue json debug 1%', logging.DEBUG),
+            ):
+                path = os.path.join(directory, label.replace(' ', '-') + '.log')
+                self.run(label, level, path, options['requests'], options['records'], options['wait_us'] / 1e6)
+
+    def run(self, label, level, path, requests, records, wait):
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
+                                  if label == 'file' else JSONFormatter())
+        if label.startswith('queue'):
+            file_handler.set_name(f'bench-{label}')
+            handler = QueueHandler([file_handler.name], maxsize=10000)
+            handler.addFilter(RequestIdFilter())
+            handler.addFilter(SampleFilter(100))
+        else:
+            handler = file_handler
+        logger = logging.getLogger(f'bench.logging.{label}')
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+
+        timings = []
+        try:
+            for i in range(requests):
+                token = request_id.set(f'bench-{i}')
+                start = time.perf_counter()
+                for j in range(records):
+                    logger.log(level, 'Handled %s step %d', 'client-detail', j, extra={'client_id': i, 'status': 200})
+                timings.append(time.perf_counter() - start)
+                request_id.reset(token)
+                time.sleep(wait)
+            # What the listener still has to write once the requests are done
+            start = time.perf_counter()
+            handler.flush()
+            drain = time.perf_counter() - start
+        finally:
+            if isinstance(handler, QueueHandler):
+                handler.stop()
+            file_handler.close()
+
+        with open(path) as f:
+            written = sum(1 for _ in f)
+        timings.sort()
+        self.stdout.write(
+            f'{label:<22} {statistics.median(timings) * 1e6:>7.1f}us {timings[int(len(timings) * 0.99)] * 1e6:>7.1f}us '
+            f'{drain * 1000:>7.0f}ms {written:>9,} {getattr(handler, "dropped", 0):>8,}'
+        )
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import User, Client, Metric
+from core.renderers import ORJSONRenderer
+from core.serializers import MetricSerializer
+
+
+def model_rows(queryset):
+    """The hand-built dicts metric_list used to produce, without the N+1."""
+    return [{
+        'id': metric.id,
+        'client': f"{metric.client.first_name} {metric.client.last_name}",
+        'name': metric.name,
+        'value': metric.value,
+        'unit': metric.unit,
+        'recorded_by': metric.recorded_by.username if metric.recorded_by else None,
+        'recorded_at': metric.recorded_at
+    } for metric in queryset.select_related('client', 'recorded_by')]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks list encoding and JSON rendering on a throwaway metric table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        # Everything is created inside a transaction that is rolled back
+        with transaction.atomic():
+            self.seed(rows)
+            queryset = Metric.objects.all()
+            encoders = [('models', model_rows), ('rows', MetricSerializer().encode)]
+            renderers = [('json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+
+            self.stdout.write(f'{"encoder":<8} {"renderer":<8} {"encode":>9} {"render":>9} {"rows/s":>11} {"bytes":>11}')
+            for encoder_name, encode in encoders:
+                for renderer_name, renderer in renderers:
+                    encode_time, data = self.best(repeat, lambda: encode(queryset))
+                    render_time, body = self.best(repeat, lambda: renderer.render(data))
+                    total = encode_time + render_time
+                    self.stdout.write(
+                        f'{encoder_name:<8} {renderer_name:<8} {encode_time * 1000:>7.0f}ms '
+                        f'{render_time * 1000:>7.0f}ms {rows / total:>11,.0f} {len(body):>11,}'
+                    )
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        user = User.objects.create(username='bench-render', employer_id='bench-render', work_email='bench-render@example.com')
+        client = Client.objects.create(first_name='Bench', last_name='Render', date_of_birth='1980-01-01', gender='O')
+        Metric.objects.bulk_create(
+            (Metric(client=client, recorded_by=user, name='Weight', value=60 + i % 40, unit='kg') for i in range(rows)),
+            batch_size=5000,
+        )
+
+    @staticmethod
+    def best(repeat, function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
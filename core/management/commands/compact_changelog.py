@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacts the change log, keeping only the latest entry of each row and dropping deletes '
+        'older than the retention period. --backfill first logs rows that have no entry yet.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention period in days (default: CHANGELOG_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--backfill', action='store_true',
+                            help='Log an insert for every row missing from the log, e.g. after seed_scale')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            added = changelog.backfill(options['batch_size'])
+            self.stdout.write(f'Logged {added:,} existing rows')
+        before = None
+        if options['days'] is not None:
+            before = timezone.now() - datetime.timedelta(days=options['days'])
+        removed = changelog.compact(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed:,} change log entries'))
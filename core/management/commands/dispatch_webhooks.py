@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.webhooks import Dispatcher, DispatcherThread
+
+
+class Command(BaseCommand):
+    help = 'Delivers pending webhook events from the outbox, once or continuously with --loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep delivering until interrupted')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds to wait for new events when idle (default: WEBHOOK_POLL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            dispatcher = Dispatcher()
+            try:
+                delivered = total = dispatcher.run_once()
+                while delivered:
+                    delivered = dispatcher.run_once()
+                    total += delivered
+            finally:
+                dispatcher.close()
+            self.stdout.write(self.style.SUCCESS(f'Delivered {total} webhook events'))
+            return
+
+        self.stdout.write('Delivering webhook events until interrupted')
+        dispatcher = DispatcherThread(options['interval'])
+        dispatcher.start()
+        try:
+            while dispatcher.is_alive():
+                dispatcher.join(1)
+        except KeyboardInterrupt:
+            dispatcher.stop()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.recurrence import extend
+
+
+class Command(BaseCommand):
+    help = 'Books the occurrences of recurring encounters that have come within the series horizon'
+
+    def handle(self, *args, **options):
+        created = extend()
+        self.stdout.write(self.style.SUCCESS(f'Booked {len(created)} recurring encounters'))
@@ -0,0 +1,104 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadgen
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives a running server with virtual clinicians replaying a weighted mix of typeahead searches, '
+        'chart opens, measurements, bookings, dashboard polls and logins, and reports throughput, latency '
+        'percentiles and error rates. --saturate searches for the highest sustainable request rate instead. '
+        'Sign-ins use the staff accounts created by seed_scale; start the server with RATE_LIMIT_LOGIN, '
+        'RATE_LIMIT_USER and RATE_LIMIT_CLIENT_PROFILE raised, or the rate limits will be what gets measured.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/api', help='API root of the server under test')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent clinicians (default 10)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run (default 60)')
+        parser.add_argument('--ramp', type=float, default=10, help='Seconds over which clinicians start (default 10)')
+        parser.add_argument('--think', type=float, default=1.0, help='Mean pause between actions, seconds (default 1)')
+        parser.add_argument('--mix', default='', help='Weights to change, e.g. search=40,login=0 (default %s)' % ','.join(
+            f'{name}={weight}' for name, weight in loadgen.DEFAULT_MIX.items()))
+        parser.add_argument('--seed', type=int, default=42, help='The --seed the data was generated with (default 42)')
+        parser.add_argument('--staff', type=int, default=10, help='Staff accounts seed_scale created (default 10)')
+        parser.add_argument('--password', default='testpass123')
+        parser.add_argument('--saturate', action='store_true', help='Search for the highest sustainable request rate')
+        parser.add_argument('--start-rps', type=float, default=5)
+        parser.add_argument('--max-rps', type=float, default=2000)
+        parser.add_argument('--step-duration', type=float, default=20, help='Seconds per rate tried (default 20)')
+        parser.add_argument('--max-p95', type=float, default=1000, help='Sustainable p95 latency, ms (default 1000)')
+        parser.add_argument('--max-error-rate', type=float, default=0.01, help='Sustainable error rate (default 0.01)')
+        parser.add_argument('--json', help='Also write the report to this file')
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadgen.parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(f'--mix: {e}')
+        if options['users'] < 1 or options['staff'] < 1:
+            raise CommandError('--users and --staff must be at least 1')
+
+        sign_in = loadgen.Stats()
+        clinicians = loadgen.sign_in(options['url'], options['users'], options['seed'], options['staff'],
+                                     options['password'], sign_in)
+        try:
+            signed_out = [clinician.username for clinician in clinicians if clinician.token is None]
+            if signed_out:
+                statuses = sign_in.summary(1)['all']['statuses']
+                raise CommandError(
+                    f'{len(signed_out)} of {len(clinicians)} clinicians could not sign in (statuses {statuses}); '
+                    f'check --url, --seed, --staff and --password, and RATE_LIMIT_LOGIN on the server'
+                )
+            if options['saturate']:
+                report = self.saturate(clinicians, mix, options)
+            else:
+                self.stdout.write(f'Running {len(clinicians)} clinicians against {options["url"]} for {options["duration"]:g}s...')
+                report = loadgen.run_users(clinicians, options['duration'], mix, options['think'], options['ramp'])
+                self.report(report)
+        finally:
+            for clinician in clinicians:
+                clinician.close()
+
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+
+    def saturate(self, clinicians, mix, options):
+        steps = []
+
+        def probe(rps):
+            summary = loadgen.run_rate(clinicians, rps, options['step_duration'], mix)
+            ok = loadgen.sustainable(summary, rps, options['step_duration'], options['max_error_rate'], options['max_p95'])
+            overall = summary['all']
+            self.stdout.write(
+                f'  {rps:>8.1f} rps: {overall["rps"]:>8.1f} achieved, p95 {overall["p95_ms"]:>7.1f}ms, '
+                f'errors {overall["error_rate"]:.2%}, missed {overall["missed"]}  '
+                + (self.style.SUCCESS('ok') if ok else self.style.ERROR('saturated'))
+            )
+            steps.append({'target_rps': rps, 'sustainable': ok, 'results': summary})
+            return ok
+
+        self.stdout.write(f'Searching for the saturation point with {len(clinicians)} concurrent clinicians...')
+        best = loadgen.find_saturation(probe, options['start_rps'], options['max_rps'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Highest sustainable rate: {best:g} rps '
+            f'(p95 <= {options["max_p95"]:g}ms, errors <= {options["max_error_rate"]:.1%})'
+        ))
+        return {'sustainable_rps': best, 'steps': steps}
+
+    def report(self, summary):
+        width = max(len(name) for name in summary)
+        self.stdout.write(
+            f'  {"action":<{width}}  requests      rps  errors     p50     p90     p95     p99      max  statuses'
+        )
+        for name, figures in summary.items():
+            statuses = ' '.join(f'{status}:{count}' for status, count in figures['statuses'].items())
+            self.stdout.write(
+                f'  {name:<{width}}  {figures["requests"]:>8}  {figures["rps"]:>7.1f}  {figures["error_rate"]:>6.1%}  '
+                f'{figures["p50_ms"]:>6.1f}  {figures["p90_ms"]:>6.1f}  {figures["p95_ms"]:>6.1f}  '
+                f'{figures["p99_ms"]:>6.1f}  {figures["max_ms"]:>7.1f}  {statuses}'
+            )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintains the monthly partitions of the metric and encounter tables on PostgreSQL: creates '
+        'partitions ahead of time and, with --retain-months, detaches and drops old ones. --convert turns '
+        'the plain tables into partitioned ones first (locks them while their rows are copied). '
+        'Does nothing on other databases.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Partition tables that are not partitioned yet')
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='Months of partitions to keep ready (default: PARTITION_MONTHS_AHEAD)')
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help='Remove partitions ending more than this many months ago (default: keep all)')
+        parser.add_argument('--detach-only', action='store_true',
+                            help='Detach old partitions but keep them as standalone tables')
+        parser.add_argument('--tables', nargs='*', choices=[model._meta.model_name for model in partitioning.PARTITIONED],
+                            help='Tables to maintain (default all)')
+
+    def handle(self, *args, **options):
+        if not partitioning.supported():
+            self.stdout.write(f'Table partitioning needs PostgreSQL, not {connection.vendor}; nothing to do')
+            return
+        if options['retain_months'] is not None and options['retain_months'] < 1:
+            raise CommandError('--retain-months must be at least 1')
+        for model in partitioning.PARTITIONED:
+            name = model._meta.model_name
+            if options['tables'] and name not in options['tables']:
+                continue
+            if options['convert']:
+                copied = partitioning.convert(model, options['months_ahead'])
+                if copied is not None:
+                    self.stdout.write(f'{name}: partitioned, {copied:,} rows copied')
+            if not partitioning.is_partitioned(model):
+                self.stdout.write(f'{name}: not partitioned (use --convert)')
+                continue
+            created = partitioning.create_partitions(model, options['months_ahead'])
+            self.stdout.write(f'{name}: {len(created)} partitions created' + (f' ({", ".join(created)})' if created else ''))
+            if options['retain_months'] is not None:
+                removed = partitioning.drop_partitions(model, options['retain_months'], options['detach_only'])
+                verb = 'detached' if options['detach_only'] else 'dropped'
+                self.stdout.write(f'{name}: {len(removed)} partitions {verb}' + (f' ({", ".join(removed)})' if removed else ''))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.revenue import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly revenue rollup from the payments table'
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollup()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} monthly revenue rows'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.dashboard import SnapshotRefresher, refresh_interval, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the dashboard snapshot, once or every --interval seconds with --loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing until interrupted')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Seconds between refreshes (default: DASHBOARD_SNAPSHOT_INTERVAL)')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            snapshot = refresh_snapshot()
+            self.stdout.write(self.style.SUCCESS(f"Snapshot generated at {snapshot['generated_at']:%Y-%m-%d %H:%M:%S}"))
+            return
+
+        interval = options['interval'] or refresh_interval()
+        self.stdout.write(f'Refreshing the dashboard snapshot every {interval}s')
+        refresher = SnapshotRefresher(interval)
+        refresher.start()
+        try:
+            while refresher.is_alive():
+                refresher.join(1)
+        except KeyboardInterrupt:
+            refresher.stop()
@@ -0,0 +1,121 @@
+import gzip
+import re
+import uuid
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .logs import request_id
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml')
+# Request ids accepted from upstream (a proxy or the calling service)
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,64}')
+
+
+def parse_accept_encoding(header):
+    """
+    Return {coding: q} for the codings listed in an Accept-Encoding header,
+    q=0 (refused) included. A malformed q counts as 0.
+    """
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def choose_coding(accepted, codings):
+    """
+    The coding of codings (in our order of preference) the client weighs
+    highest, '*' standing for any it does not list, or None if it refuses
+    them all.
+    """
+    def quality(coding):
+        return accepted.get(coding, accepted.get('*', 0.0))
+    best = max(codings, key=quality, default=None)
+    return best if best is not None and quality(best) > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip, whichever the client weighs
+    highest (brotli on a tie) and we support, once the body reaches settings.COMPRESSION_MIN_SIZE bytes.
+    Smaller bodies are sent as-is since the CPU and header overhead outweighs
+    the saving. Streaming responses and already-compressed content types
+    (PDF reports, images) are left alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4)
+        self.codings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+            or len(response.content) < self.min_size
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_coding(parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', '')), self.codings)
+        if coding == 'br':
+            content = brotli.compress(response.content, quality=self.brotli_quality)
+        elif coding == 'gzip':
+            content = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        else:
+            return response
+
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = coding
+        # The representation changed, so a strong ETag must become weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+
+class RequestIdMiddleware:
+    """
+    Tag each request with an id, taken from the X-Request-ID header when a
+    proxy or caller sent a well-formed one and generated otherwise. It is
+    request.id, is stamped on every record logged while the request is
+    handled (core.logs) and is sent back in the X-Request-ID header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.META.get('HTTP_X_REQUEST_ID', '')
+        request.id = incoming if REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex
+        token = request_id.set(request.id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response.headers['X-Request-ID'] = request.id
+        return response
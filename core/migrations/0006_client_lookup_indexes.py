@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:18
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_prescription_duration_prescription_prescribed_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Upper('last_name'), django.db.models.functions.text.Upper('first_name'), include=('id', 'first_name', 'last_name', 'date_of_birth'), name='client_lookup_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Upper('first_name'), include=('id', 'first_name', 'last_name', 'date_of_birth'), name='client_lookup_first_name_idx'),
+        ),
+    ]
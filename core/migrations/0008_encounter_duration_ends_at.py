@@ -0,0 +1,40 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_ends_at(apps, schema_editor):
+    Encounter = apps.get_model('core', 'Encounter')
+    # Existing encounters all get the default 30 minute duration
+    Encounter.objects.update(ends_at=F('scheduled_for') + datetime.timedelta(minutes=30))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_payment_monthlyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='encounter',
+            name='duration',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Length in minutes'),
+        ),
+        migrations.AddField(
+            model_name='encounter',
+            name='ends_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='encounter',
+            name='ends_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(fields=['provider', 'scheduled_for', 'ends_at'], name='encounter_schedule_idx'),
+        ),
+    ]
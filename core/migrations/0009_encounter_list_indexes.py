@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_encounter_duration_ends_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(fields=['scheduled_for', 'id'], name='encounter_scheduled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(fields=['status', 'scheduled_for', 'id'], name='encounter_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(fields=['encounter_type', 'scheduled_for', 'id'], name='encounter_type_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_encounter_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncounterSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encounter_type', models.CharField(choices=[('Consultation', 'Consultation'), ('Follow-up', 'Follow-up'), ('Emergency', 'Emergency'), ('Routine', 'Routine')], default='Consultation', max_length=32)),
+                ('starts_at', models.DateTimeField()),
+                ('duration', models.PositiveSmallIntegerField(default=30, help_text='Length in minutes')),
+                ('frequency', models.CharField(choices=[('Daily', 'Daily'), ('Weekly', 'Weekly')], default='Weekly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('until', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('generated', models.PositiveIntegerField(default=0, editable=False)),
+                ('next_occurrence', models.DateTimeField(db_index=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='encounter_series', to='core.client')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='encounter_series', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='encounter',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='encounters', to='core.encounterseries'),
+        ),
+    ]
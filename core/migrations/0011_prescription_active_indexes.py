@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_encounterseries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('end_date__isnull', True)), fields=['client', 'start_date'], name='prescription_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('end_date__isnull', False)), fields=['client', 'end_date', 'start_date'], name='prescription_ending_idx'),
+        ),
+    ]
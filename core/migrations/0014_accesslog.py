@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_changelogentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('view', models.CharField(max_length=100)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('accessed_at', models.DateTimeField()),
+                ('client', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client')),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client', 'accessed_at', 'id'], name='accesslog_client_idx'), models.Index(fields=['user', 'accessed_at', 'id'], name='accesslog_user_idx')],
+            },
+        ),
+    ]
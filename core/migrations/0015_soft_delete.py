@@ -0,0 +1,146 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:08
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.text
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_accesslog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('deleted_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='client',
+            name='client_lookup_last_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='client',
+            name='client_lookup_first_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='encounter',
+            name='encounter_schedule_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='encounter',
+            name='encounter_scheduled_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='encounter',
+            name='encounter_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='encounter',
+            name='encounter_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='prescription',
+            name='prescription_open_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='prescription',
+            name='prescription_ending_idx',
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='encounter',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='prescription',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Upper('last_name'), django.db.models.functions.text.Upper('first_name'), condition=models.Q(('deleted_at__isnull', True)), include=('id', 'first_name', 'last_name', 'date_of_birth'), name='client_lookup_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Upper('first_name'), condition=models.Q(('deleted_at__isnull', True)), include=('id', 'first_name', 'last_name', 'date_of_birth'), name='client_lookup_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='client_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['provider', 'scheduled_for', 'ends_at'], name='encounter_schedule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['scheduled_for', 'id'], name='encounter_scheduled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status', 'scheduled_for', 'id'], name='encounter_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['encounter_type', 'scheduled_for', 'id'], name='encounter_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='encounter',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='encounter_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='enrollment_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metric',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='metric_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('end_date__isnull', True)), fields=['client', 'start_date'], name='prescription_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('end_date__isnull', False)), fields=['client', 'end_date', 'start_date'], name='prescription_ending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='prescription_deleted_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedrecord',
+            name='client',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.client'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['table', 'object_id'], name='archive_object_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Prefix lookups (core.lookup.prefix_q) are LIKE 'PREFIX%' tests on the
+# upper-cased names. Under a linguistic collation PostgreSQL can only answer
+# those from a btree index built with text_pattern_ops, which other databases
+# do not have, so these indexes are PostgreSQL only and not in Client.Meta.
+PATTERN_INDEXES = {
+    'client_lookup_last_name_pattern_idx': 'last_name',
+    'client_lookup_first_name_pattern_idx': 'first_name',
+}
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PATTERN_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON core_client (UPPER({column}) text_pattern_ops) '
+            f'INCLUDE (id, first_name, last_name, date_of_birth) WHERE deleted_at IS NULL'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
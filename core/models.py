@@ -1,6 +1,16 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from .permissions import PermissionQuerySet
+
+class UserManager(BaseUserManager.from_queryset(PermissionQuerySet)):
+    """Django's user manager, with visible_to() like every other model's."""
+
 
 class User(AbstractUser):
     is_doctor = models.BooleanField(default=False)
@@ -8,6 +18,8 @@ class User(AbstractUser):
     employer_id = models.CharField(max_length=100, unique=True, blank=False)
     work_email = models.EmailField(unique=True, blank=False)
 
+    objects = UserManager()
+
     def __str__(self):
         return self.username
 
@@ -23,12 +35,40 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+class LiveManager(models.Manager):
+    """
+    Leaves out soft-deleted rows (deleted_at set; see core.archive). The
+    models using it keep every row reachable through all_objects.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+def live_q(model, path):
+    """
+    Q leaving out what path (a relation lookup from model, such as
+    'enrollments' or 'enrollments__enrolled_by') reaches through soft-deleted
+    rows. LiveManager only filters queries on the soft-deleted model itself,
+    not joins into it from another model, so filters and aggregates across
+    relations need this.
+    """
+    conditions, prefix = {}, ''
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if not field.is_relation:
+            break
+        model, prefix = field.related_model, f'{prefix}{name}__'
+        if any(f.name == 'deleted_at' for f in model._meta.concrete_fields):
+            conditions[f'{prefix}deleted_at__isnull'] = True
+    return Q(**conditions)
+
 class HealthProgram(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='programs_created')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PermissionQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -47,6 +87,30 @@ class Client(models.Model):
     phone_number = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(PermissionQuerySet)()
+    all_objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        # Indexes serving the application only cover live rows (deleted_at
+        # IS NULL, as every query through objects has); the deleted ones are
+        # indexed apart for core.archive
+        indexes = [
+            # Prefix lookups on either name (core.lookup), in name order; on
+            # PostgreSQL the LIKE test itself is served by the text_pattern_ops
+            # twins of these made in migration 0016. The included columns let
+            # PostgreSQL answer them with an index-only scan.
+            models.Index(
+                Upper('last_name'), Upper('first_name'), name='client_lookup_last_name_idx',
+                include=['id', 'first_name', 'last_name', 'date_of_birth'], condition=Q(deleted_at__isnull=True),
+            ),
+            models.Index(
+                Upper('first_name'), name='client_lookup_first_name_idx',
+                include=['id', 'first_name', 'last_name', 'date_of_birth'], condition=Q(deleted_at__isnull=True),
+            ),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='client_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -57,13 +121,34 @@ class Enrollment(models.Model):
     enrolled_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='enrollments_created')
     enrollment_date = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(PermissionQuerySet)()
+    all_objects = PermissionQuerySet.as_manager()
 
     class Meta:
-        unique_together = ('client', 'program')
+        constraints = [
+            # A deleted enrollment does not stop the client enrolling again
+            models.UniqueConstraint(
+                fields=['client', 'program'], condition=Q(deleted_at__isnull=True), name='unique_live_enrollment',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='enrollment_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client} in {self.program}"
 
+class PrescriptionQuerySet(PermissionQuerySet):
+    def valid_between(self, start, end):
+        return self.filter(Prescription.valid_q(start, end))
+
+    def active(self, on=None):
+        """Prescriptions in force on the date on (default today)."""
+        on = on or timezone.localdate()
+        return self.valid_between(on, on)
+
 class Prescription(models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='prescriptions')
     prescribed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='prescriptions_written')
@@ -76,6 +161,35 @@ class Prescription(models.Model):
     notes = models.TextField(blank=True)
     prescribed_date = models.DateField(auto_now_add=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(PrescriptionQuerySet)()
+    all_objects = PrescriptionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Active medication lists, per client: "end_date IS NULL OR
+            # end_date >= day" is answered from the two halves of the OR
+            models.Index(
+                fields=['client', 'start_date'], condition=Q(end_date__isnull=True, deleted_at__isnull=True),
+                name='prescription_open_idx',
+            ),
+            models.Index(
+                fields=['client', 'end_date', 'start_date'], condition=Q(end_date__isnull=False, deleted_at__isnull=True),
+                name='prescription_ending_idx',
+            ),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='prescription_deleted_idx'),
+        ]
+
+    @staticmethod
+    def valid_q(start, end, prefix=''):
+        """
+        Q for prescriptions in force at some point between the dates start and
+        end (inclusive). prefix is the relation path to Prescription.
+        """
+        return Q(**{f'{prefix}start_date__lte': end}) & (
+            Q(**{f'{prefix}end_date__isnull': True}) | Q(**{f'{prefix}end_date__gte': start})
+        )
 
     def __str__(self):
         return f"{self.medication_name} for {self.client}"
@@ -87,6 +201,15 @@ class Metric(models.Model):
     value = models.FloatField()
     unit = models.CharField(max_length=20)
     recorded_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(PermissionQuerySet)()
+    all_objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='metric_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name}: {self.value}{self.unit} for {self.client}"
@@ -105,14 +228,252 @@ ENCOUNTER_STATUS_CHOICES = [
     ('No Show', 'No Show'),
 ]
 
+RECURRENCE_FREQUENCY_CHOICES = [
+    ('Daily', 'Daily'),
+    ('Weekly', 'Weekly'),
+]
+
+class EncounterSeries(models.Model):
+    """
+    A recurring booking: an encounter every `interval` days or weeks from
+    starts_at, until a date, for `count` occurrences or indefinitely.
+    Occurrences are stored as Encounter rows up to a rolling horizon only;
+    core.recurrence materialises later ones as they come within reach.
+    """
+    client = models.ForeignKey('Client', on_delete=models.CASCADE, related_name='encounter_series')
+    provider = models.ForeignKey('User', on_delete=models.CASCADE, related_name='encounter_series')
+    encounter_type = models.CharField(max_length=32, choices=ENCOUNTER_TYPE_CHOICES, default='Consultation')
+    starts_at = models.DateTimeField()
+    duration = models.PositiveSmallIntegerField(default=30, help_text='Length in minutes')
+    frequency = models.CharField(max_length=10, choices=RECURRENCE_FREQUENCY_CHOICES, default='Weekly')
+    interval = models.PositiveSmallIntegerField(default=1)
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    # Occurrences materialised so far (booked or skipped), and the start of
+    # the next one; null once the series has run out
+    generated = models.PositiveIntegerField(default=0, editable=False)
+    next_occurrence = models.DateTimeField(null=True, editable=False, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = PermissionQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.frequency} {self.encounter_type} for {self.client} with {self.provider}"
+
 class Encounter(models.Model):
     client = models.ForeignKey('Client', on_delete=models.CASCADE, related_name='encounters')
     provider = models.ForeignKey('User', on_delete=models.CASCADE, related_name='encounters')
     encounter_type = models.CharField(max_length=32, choices=ENCOUNTER_TYPE_CHOICES, default='Consultation')
     scheduled_for = models.DateTimeField()
+    duration = models.PositiveSmallIntegerField(default=30, help_text='Length in minutes')
+    # scheduled_for + duration, kept by save() so overlaps are plain comparisons
+    ends_at = models.DateTimeField(editable=False)
     status = models.CharField(max_length=20, choices=ENCOUNTER_STATUS_CHOICES, default='Scheduled')
     notes = models.TextField(blank=True)
+    series = models.ForeignKey(EncounterSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='encounters')
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(PermissionQuerySet)()
+    all_objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Provider schedule: overlap checks and availability sweeps (core.scheduling)
+            models.Index(
+                fields=['provider', 'scheduled_for', 'ends_at'], condition=Q(deleted_at__isnull=True),
+                name='encounter_schedule_idx',
+            ),
+            # Encounter list: keyset pages in (scheduled_for, id) order, alone or by status/type
+            models.Index(fields=['scheduled_for', 'id'], condition=Q(deleted_at__isnull=True), name='encounter_scheduled_idx'),
+            models.Index(
+                fields=['status', 'scheduled_for', 'id'], condition=Q(deleted_at__isnull=True), name='encounter_status_idx',
+            ),
+            models.Index(
+                fields=['encounter_type', 'scheduled_for', 'id'], condition=Q(deleted_at__isnull=True),
+                name='encounter_type_idx',
+            ),
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='encounter_deleted_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if isinstance(self.scheduled_for, str):
+            self.scheduled_for = parse_datetime(self.scheduled_for)
+        self.ends_at = self.scheduled_for + timedelta(minutes=self.duration)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.encounter_type} for {self.client} with {self.provider} on {self.scheduled_for}"
+
+class Payment(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='payments')
+    # Protected so a program's revenue history cannot disappear with it
+    program = models.ForeignKey(HealthProgram, on_delete=models.PROTECT, related_name='payments')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='payments_recorded')
+    paid_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = PermissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['program', 'paid_at'], name='payment_program_paid_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} from {self.client} for {self.program}"
+
+class MonthlyRevenue(models.Model):
+    """
+    Revenue rollup: one row per program and calendar month (local time),
+    kept up to date by core.revenue as payments are saved and deleted.
+    """
+    program = models.ForeignKey(HealthProgram, on_delete=models.CASCADE, related_name='monthly_revenue')
+    month = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['program', 'month'], name='unique_program_month_revenue'),
+        ]
+
+    def __str__(self):
+        return f"{self.program} {self.month:%Y-%m}: {self.total}"
+
+WEBHOOK_EVENT_CHOICES = [
+    ('prescription.created', 'Prescription created'),
+    ('prescription.updated', 'Prescription updated'),
+    ('encounter.created', 'Encounter created'),
+    ('encounter.updated', 'Encounter updated'),
+]
+
+OUTBOX_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('delivered', 'Delivered'),
+    ('failed', 'Failed'),
+]
+
+class WebhookSubscription(models.Model):
+    """
+    A downstream system (lab, pharmacy, ...) notified of clinical events by
+    a POST to url, signed with secret. An empty events list subscribes to
+    every event.
+    """
+    name = models.CharField(max_length=100)
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=100, blank=True)
+    events = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    # Held by the dispatcher delivering to it, so each queue has one sender
+    leased_until = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def wants(self, event):
+        return not self.events or event in self.events
+
+    def __str__(self):
+        return f"{self.name} ({self.url})"
+
+class OutboxMessage(models.Model):
+    """
+    One event waiting to be delivered to one subscription. Written in the
+    same transaction as the change it reports; core.webhooks delivers each
+    subscription's messages in id order, retrying with backoff.
+    """
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='messages')
+    event = models.CharField(max_length=50, choices=WEBHOOK_EVENT_CHOICES)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=OUTBOX_STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Only read on the oldest pending message of a subscription
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher's queues: each subscription's pending messages in order
+            models.Index(fields=['subscription', 'id'], condition=Q(status='pending'), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} #{self.pk} for {self.subscription.name} ({self.status})"
+
+CHANGE_ACTION_CHOICES = [
+    ('insert', 'Insert'),
+    ('update', 'Update'),
+    ('delete', 'Delete'),
+]
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only change log of the clinical tables, read incrementally
+    through /changes/ with the id as cursor. Written and compacted by
+    core.changelog.
+    """
+    table = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=CHANGE_ACTION_CHOICES)
+    # The row after the change; null for deletes
+    data = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Feeds filtered by ?tables=, in cursor order
+            models.Index(fields=['table', 'id'], name='changelog_table_idx'),
+            # Compaction: later entries for the same row
+            models.Index(fields=['table', 'object_id', 'id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.table} {self.object_id}"
+
+
+class AccessLog(models.Model):
+    """
+    Who read which client's record, and when. Written in batches by
+    core.audit; user and client are kept as plain ids so the trail outlives
+    the rows it refers to.
+    """
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    username = models.CharField(max_length=150)
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    view = models.CharField(max_length=100)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    accessed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'accessed_at', 'id'], name='accesslog_client_idx'),
+            models.Index(fields=['user', 'accessed_at', 'id'], name='accesslog_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} viewed client {self.client_id} at {self.accessed_at}"
+
+
+class ArchivedRecord(models.Model):
+    """
+    A soft-deleted row moved out of its table by core.archive: the table
+    and id it had, the client it belonged to (itself, for a client) and its
+    columns as they were.
+    """
+    table = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['table', 'object_id'], name='archive_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.table} {self.object_id}"
@@ -0,0 +1,59 @@
+import base64
+import binascii
+import heapq
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat() if hasattr(value, "isoformat") else value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """Return the (key value, pk) a cursor points after, or raise ParseError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return field.to_python(value), int(pk)
+    except (ValueError, ValidationError, UnicodeDecodeError, binascii.Error):
+        raise ParseError({'error': 'Invalid cursor'})
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ParseError({'error': 'limit must be an integer'})
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ParseError({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'})
+    return limit
+
+
+def keyset_page(queryset, encoder, key, cursor=None, limit=DEFAULT_PAGE_SIZE, extra=()):
+    """
+    One page of queryset ordered by (key, pk), encoded with a RowEncoder.
+
+    The cursor holds the key and pk of the last row served, so the next page
+    starts with an index seek on (key, pk) whatever its depth, where OFFSET
+    would read and discard every earlier row. extra are rows from outside
+    the database to merge in: tuples of the encoder's columns followed by
+    key and pk, sorted on those. Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    if cursor:
+        value, pk = decode_cursor(cursor, queryset.model._meta.get_field(key))
+        queryset = queryset.filter(Q(**{f'{key}__gt': value}) | Q(**{key: value, 'pk__gt': pk}))
+        extra = [row for row in extra if row[-2:] > (value, pk)]
+    # The key columns go after the encoder's, where build_row never looks
+    rows = list(queryset.order_by(key, 'pk').values_list(*encoder.columns, key, 'pk')[:limit + 1])
+    if extra:
+        rows = list(heapq.merge(rows, extra[:limit + 1], key=lambda row: row[-2:]))[:limit + 1]
+    next_cursor = encode_cursor(*rows[limit - 1][-2:]) if len(rows) > limit else None
+    build_row = encoder.build_row
+    return [build_row(row) for row in rows[:limit]], next_cursor
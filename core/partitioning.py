@@ -0,0 +1,205 @@
+"""
+Monthly range partitioning of the metric and encounter tables (PostgreSQL).
+
+Partitioning is opt-in: `manage.py partition_tables --convert` rebuilds a
+table as a partitioned one, PARTITION BY RANGE on its time column, with a
+partition per local calendar month and a DEFAULT partition catching
+anything outside them. Afterwards the same command, run regularly, adds
+partitions PARTITION_MONTHS_AHEAD months ahead (moving rows that have
+landed in the default partition into them) and, with --retain-months,
+detaches and drops partitions wholly older than that.
+
+A partitioned table's primary key has to include the partition column, so
+it becomes (id, <column>); ids still come from one sequence and stay
+unique. Nothing references these tables with a foreign key, which
+PostgreSQL would not allow. Queries only skip partitions when they bound
+the partition column, as the dashboard, calendar, schedule and report
+queries do; lookups by id alone probe every partition's index.
+
+On any other database every function here is a no-op, so SQLite test runs
+use plain tables.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .conditional import bump_table_version
+from .models import Metric, Encounter
+from .revenue import month_bounds, month_of
+
+# Model -> the column it is partitioned by
+PARTITIONED = {Metric: 'recorded_at', Encounter: 'scheduled_for'}
+
+
+def supported():
+    return connection.vendor == 'postgresql'
+
+
+def add_months(month, count):
+    """The first day of the month count months after month (a first-of-month date)."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(model, month):
+    return f'{model._meta.db_table}_p{month:%Y_%m}'
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(model):
+    if not supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [_quote(model._meta.db_table)]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(model):
+    """{month: partition name} of model's monthly partitions."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)', [_quote(table)]
+        )
+        names = [name for name, in cursor.fetchall()]
+    prefix = f'{table}_p'
+    return {
+        datetime.date(int(name[len(prefix):][:4]), int(name[len(prefix):][5:7]), 1): name
+        for name in names if name.startswith(prefix)
+    }
+
+
+def _create_partition(cursor, model, month):
+    """
+    Add model's partition for month. Rows of that month waiting in the
+    default partition are moved into the new table before it is attached,
+    which PostgreSQL would otherwise refuse.
+    """
+    table, column = model._meta.db_table, PARTITIONED[model]
+    name = partition_name(model, month)
+    start, end = month_bounds(month)
+    cursor.execute(
+        f'CREATE TABLE {_quote(name)} (LIKE {_quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    default = _quote(f'{table}_default')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {default} WHERE {_quote(column)} >= %s AND {_quote(column)} < %s RETURNING *) '
+        f'INSERT INTO {_quote(name)} SELECT * FROM moved', [start, end]
+    )
+    cursor.execute(
+        f'ALTER TABLE {_quote(table)} ATTACH PARTITION {_quote(name)} FOR VALUES FROM (%s) TO (%s)', [start, end]
+    )
+
+
+def create_partitions(model, months_ahead=None):
+    """
+    Add the missing monthly partitions of model from this month to
+    months_ahead (default PARTITION_MONTHS_AHEAD) months ahead. Returns the
+    names created.
+    """
+    if not is_partitioned(model):
+        return []
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = partitions(model)
+    this_month = month_of(timezone.now())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = add_months(this_month, offset)
+            if month not in existing:
+                _create_partition(cursor, model, month)
+                created.append(partition_name(model, month))
+    return created
+
+
+def drop_partitions(model, retain_months, detach_only=False):
+    """
+    Detach the partitions of model that end more than retain_months months
+    before the current one, and drop them unless detach_only (leaving them
+    as plain tables to dump or archive). Returns the names removed.
+    """
+    if not is_partitioned(model):
+        return []
+    cutoff = add_months(month_of(timezone.now()), -retain_months)
+    removed = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month, name in sorted(partitions(model).items()):
+            if add_months(month, 1) > cutoff:
+                continue
+            cursor.execute(f'ALTER TABLE {_quote(model._meta.db_table)} DETACH PARTITION {_quote(name)}')
+            if not detach_only:
+                cursor.execute(f'DROP TABLE {_quote(name)}')
+            removed.append(name)
+        if removed:
+            # No signals are sent for the rows that went with them
+            bump_table_version(model._meta.label)
+    return removed
+
+
+def convert(model, months_ahead=None):
+    """
+    Rebuild model's table as a partitioned table, in one transaction that
+    holds an exclusive lock on it throughout: the rows are copied into
+    monthly partitions from the earliest month present to months_ahead
+    months from now, then the indexes and foreign keys are recreated from
+    the model. Returns the number of rows copied, or None if the table is
+    already partitioned or the database is not PostgreSQL.
+    """
+    if not supported() or is_partitioned(model):
+        return None
+    months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    table, column = model._meta.db_table, PARTITIONED[model]
+    old = f'{table}_unpartitioned'
+    with transaction.atomic(), connection.schema_editor(atomic=False) as editor, connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {_quote(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min({_quote(column)}), max(id) FROM {_quote(table)}')
+        earliest, last_id = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE {_quote(table)} RENAME TO {_quote(old)}')
+        # Identity columns cannot be moved to a partitioned table before
+        # PostgreSQL 17; a sequence owned by the column does the same job.
+        # A serial column (tables created before Django 4.1) keeps its own.
+        cursor.execute(f'ALTER TABLE {_quote(old)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [_quote(old)])
+        sequence = cursor.fetchone()[0]
+        if sequence is None:
+            sequence = _quote(f'{table}_id_seq')
+            cursor.execute(f'CREATE SEQUENCE {sequence}')
+            cursor.execute('SELECT setval(%s, %s, false)', [sequence, (last_id or 0) + 1])
+        cursor.execute(
+            f'CREATE TABLE {_quote(table)} (LIKE {_quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({_quote(column)})'
+        )
+        cursor.execute(f'ALTER TABLE {_quote(table)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)', [sequence])
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {_quote(table)}.id')
+        cursor.execute(f'ALTER TABLE {_quote(table)} ADD PRIMARY KEY (id, {_quote(column)})')
+        cursor.execute(f'CREATE TABLE {_quote(table + "_default")} PARTITION OF {_quote(table)} DEFAULT')
+
+        this_month = month_of(timezone.now())
+        month = min(month_of(earliest), this_month) if earliest else this_month
+        while month <= add_months(this_month, months_ahead):
+            start, end = month_bounds(month)
+            cursor.execute(
+                f'CREATE TABLE {_quote(partition_name(model, month))} PARTITION OF {_quote(table)} '
+                f'FOR VALUES FROM (%s) TO (%s)', [start, end]
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {_quote(table)} SELECT * FROM {_quote(old)}')
+        copied = cursor.rowcount
+        cursor.execute(f'DROP TABLE {_quote(old)}')
+        # Indexes are built once the rows are in, on every partition at once
+        for statement in editor._model_indexes_sql(model):
+            editor.execute(statement)
+        for field in model._meta.local_fields:
+            if field.remote_field and field.db_constraint:
+                editor.execute(editor._create_fk_sql(model, field, '_fk_%(to_table)s_%(to_column)s'))
+    bump_table_version(model._meta.label)
+    return copied
@@ -0,0 +1,196 @@
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from django.db.models import Q
+
+# Row-level ownership registry.
+# Maps each model to the relation path(s) leading to the User that owns a row.
+# Medical staff see every row; any other user only sees rows reachable from
+# themselves through one of these paths. Models that are not listed here are
+# not restricted.
+OWNERSHIP_PATHS = {
+    'core.Client': (
+        'enrollments__enrolled_by',
+        'prescriptions__prescribed_by',
+        'metrics__recorded_by',
+        'encounters__provider',
+        'payments__recorded_by',
+    ),
+    'core.HealthProgram': ('created_by', 'enrollments__enrolled_by'),
+    'core.Enrollment': ('enrolled_by',),
+    'core.Prescription': ('prescribed_by',),
+    'core.Metric': ('recorded_by',),
+    'core.Encounter': ('provider',),
+    'core.EncounterSeries': ('provider',),
+    'core.Payment': ('recorded_by',),
+}
+
+ROLE_DOCTOR = 'doctor'
+ROLE_NURSE = 'nurse'
+ROLE_ADMIN = 'admin'
+ROLE_USER = 'user'
+STAFF_ROLES = frozenset([ROLE_DOCTOR, ROLE_NURSE, ROLE_ADMIN])
+
+_compiled_rules = {}
+
+
+class OwnershipRule:
+    """
+    An ownership rule compiled from the paths declared in OWNERSHIP_PATHS.
+    Paths are validated against the model metadata once; paths that cross a
+    to-many relation are turned into a pk subquery so the filtered queryset
+    never needs distinct().
+    """
+
+    def __init__(self, model, paths):
+        from .models import live_q
+        self.model = model
+        self.lookups = []
+        for path in paths:
+            # Ownership through a soft-deleted row does not count
+            self.lookups.append((path, self._is_multi_valued(model, path), live_q(model, path)))
+        self.tables = self._tables(model, paths)
+
+    @staticmethod
+    def _tables(model, paths):
+        """Labels of the models whose rows decide what the rule lets through."""
+        tables = {model._meta.label}
+        for path in paths:
+            opts = model._meta
+            for name in path.split('__')[:-1]:
+                opts = opts.get_field(name).related_model._meta
+                tables.add(opts.label)
+        return frozenset(tables)
+
+    @staticmethod
+    def _is_multi_valued(model, path):
+        multi_valued = False
+        opts = model._meta
+        for name in path.split('__'):
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f"Ownership path '{path}' on {model._meta.label} "
+                    f"references unknown field '{name}'"
+                )
+            if not field.is_relation:
+                raise ImproperlyConfigured(
+                    f"Ownership path '{path}' on {model._meta.label} "
+                    f"must follow relations, '{name}' is not one"
+                )
+            multi_valued = multi_valued or field.many_to_many or field.one_to_many
+            opts = field.related_model._meta
+        if opts.label != settings.AUTH_USER_MODEL:
+            raise ImproperlyConfigured(
+                f"Ownership path '{path}' on {model._meta.label} "
+                f"must end at {settings.AUTH_USER_MODEL}"
+            )
+        return multi_valued
+
+    def q(self, user):
+        """Build the Q object restricting this model to rows owned by user."""
+        conditions = []
+        for lookup, multi_valued, live in self.lookups:
+            if multi_valued:
+                owned = self.model._base_manager.filter(live, **{lookup: user.pk}).values('pk')
+                conditions.append(Q(pk__in=owned))
+            else:
+                conditions.append(live & Q(**{lookup: user.pk}))
+        return reduce(or_, conditions)
+
+
+def get_rule(model):
+    """
+    Return the compiled OwnershipRule for model, or None if the model is not
+    registered. Rules are compiled on first use and kept for the process.
+    """
+    label = model._meta.label
+    if label not in _compiled_rules:
+        paths = OWNERSHIP_PATHS.get(label)
+        _compiled_rules[label] = OwnershipRule(model, paths) if paths else None
+    return _compiled_rules[label]
+
+
+def compile_rules():
+    """Compile every registered rule, failing fast on a misconfigured path."""
+    for label in OWNERSHIP_PATHS:
+        get_rule(apps.get_model(label))
+
+
+def get_user_role(user):
+    """
+    Return the user's role, memoised on the user instance.
+    request.user lives for a single request, so this is a per-request cache
+    and repeated permission checks never go back to the database.
+    """
+    role = getattr(user, '_cached_role', None)
+    if role is None:
+        if not user.is_authenticated:
+            role = ROLE_USER
+        elif getattr(user, 'is_doctor', False):
+            role = ROLE_DOCTOR
+        elif getattr(user, 'is_nurse', False):
+            role = ROLE_NURSE
+        elif user.is_superuser:
+            role = ROLE_ADMIN
+        else:
+            role = ROLE_USER
+        user._cached_role = role
+    return role
+
+
+def can_view_all(user):
+    """Doctors, nurses and superusers are not restricted by ownership."""
+    return get_user_role(user) in STAFF_ROLES
+
+
+def visibility_tables(model, user):
+    """
+    Labels of the tables that decide which model rows user can see, i.e. the
+    tables a cached, permission-filtered result for user depends on.
+    """
+    rule = None if can_view_all(user) else get_rule(model)
+    return rule.tables if rule is not None else frozenset([model._meta.label])
+
+
+def ownership_q(model, user):
+    """
+    Return the Q object restricting model to rows visible to user, or None if
+    the user may see everything. The result is memoised on the user instance.
+    """
+    if can_view_all(user):
+        return None
+    cache = getattr(user, '_ownership_q_cache', None)
+    if cache is None:
+        cache = user._ownership_q_cache = {}
+    label = model._meta.label
+    if label not in cache:
+        rule = get_rule(model)
+        if rule is None:
+            cache[label] = None
+        elif not user.is_authenticated:
+            cache[label] = Q(pk__in=[])
+        else:
+            cache[label] = rule.q(user)
+    return cache[label]
+
+
+class PermissionQuerySetMixin:
+    """
+    Adds visible_to(user) to a queryset, applying the model's ownership rule.
+    """
+
+    def visible_to(self, user):
+        condition = ownership_q(self.model, user)
+        if condition is None:
+            return self
+        return self.filter(condition)
+
+
+class PermissionQuerySet(PermissionQuerySetMixin, models.QuerySet):
+    pass
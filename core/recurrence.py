@@ -0,0 +1,245 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .changelog import record
+from .clinic import forget_days
+from .conditional import bump_table_version
+from .models import Encounter, EncounterSeries
+from .scheduling import ScheduleConflict, bookings, lock_provider
+from .webhooks import publish
+
+# Longest gap between occurrences, in days or weeks
+MAX_INTERVAL = 52
+# Encounter columns an occurrence has of its own rather than from its series
+OCCURRENCE_COLUMNS = ('id', 'scheduled_for', 'ends_at', 'status', 'series', 'created_at')
+
+
+def horizon():
+    """Occurrences starting before this are kept materialised."""
+    return timezone.now() + datetime.timedelta(days=settings.SERIES_HORIZON_DAYS)
+
+
+def validate_rule(frequency, interval, until, count, starts_at):
+    """Check a recurrence rule, raising ValueError if it cannot be expanded."""
+    if frequency not in dict(EncounterSeries._meta.get_field('frequency').choices):
+        raise ValueError(f'unknown frequency {frequency!r}')
+    if not 1 <= interval <= MAX_INTERVAL:
+        raise ValueError(f'interval must be between 1 and {MAX_INTERVAL}')
+    if count is not None and count < 1:
+        raise ValueError('count must be at least 1')
+    if until is not None and until < timezone.localdate(starts_at):
+        raise ValueError('until must not be before the first occurrence')
+
+
+def occurrence(series, index):
+    """
+    Start of the index-th occurrence, or None past the end of the series.
+    Steps are taken in local wall-clock time, so a weekly 9:00 booking stays
+    at 9:00 across daylight saving changes.
+    """
+    if series.count is not None and index >= series.count:
+        return None
+    days = index * series.interval * (7 if series.frequency == 'Weekly' else 1)
+    first = timezone.localtime(series.starts_at)
+    start = timezone.make_aware(first.replace(tzinfo=None) + datetime.timedelta(days=days))
+    if series.until is not None and start.date() > series.until:
+        return None
+    return start
+
+
+def overlapping(starts, length, busy):
+    """
+    {start: [encounter ids]} for the starts (sorted) of length overlapping
+    busy, (scheduled_for, ends_at, pk) tuples sorted by scheduled_for.
+    Both lists are swept once; no booking is longer than
+    MAX_ENCOUNTER_MINUTES, so those starting that long before an occurrence
+    are passed for good.
+    """
+    longest = datetime.timedelta(minutes=settings.MAX_ENCOUNTER_MINUTES)
+    conflicts = {}
+    first = 0
+    for start in starts:
+        end = start + length
+        while first < len(busy) and busy[first][0] <= start - longest:
+            first += 1
+        index = first
+        while index < len(busy) and busy[index][0] < end:
+            if busy[index][1] > start:
+                conflicts.setdefault(start, []).append(busy[index][2])
+            index += 1
+    return conflicts
+
+
+def materialize(series, end, skip_conflicts=True):
+    """
+    Store the occurrences of series starting before end as encounters.
+
+    The provider's bookings over the whole stretch are read with one range
+    query and the new rows are written with one bulk_create(). Occurrences
+    clashing with an existing booking are skipped, or raise ScheduleConflict
+    when skip_conflicts is False. Call inside a transaction holding the
+    provider lock. Returns the encounters created.
+    """
+    starts = []
+    index = series.generated
+    start = occurrence(series, index)
+    while start is not None and start < end:
+        starts.append(start)
+        index += 1
+        start = occurrence(series, index)
+
+    created = []
+    if starts:
+        length = datetime.timedelta(minutes=series.duration)
+        busy = list(
+            bookings(series.provider_id, starts[0], starts[-1] + length)
+            .values_list('scheduled_for', 'ends_at', 'pk')
+        )
+        conflicts = overlapping(starts, length, busy)
+        if conflicts and not skip_conflicts:
+            raise ScheduleConflict(sorted({pk for pks in conflicts.values() for pk in pks}))
+        created = Encounter.objects.bulk_create(
+            # bulk_create() bypasses save(), so ends_at is set here
+            Encounter(
+                client_id=series.client_id,
+                provider_id=series.provider_id,
+                encounter_type=series.encounter_type,
+                scheduled_for=moment,
+                duration=series.duration,
+                ends_at=moment + length,
+                notes=series.notes,
+                series=series,
+            )
+            for moment in starts
+            if moment not in conflicts
+        )
+        # bulk_create() sends no signals
+        bump_table_version(Encounter._meta.label)
+        publish('encounter.created', created)
+        record('insert', created)
+        forget_days({(series.provider_id, timezone.localdate(moment)) for moment in starts})
+
+    series.generated = index
+    series.next_occurrence = start
+    series.save(update_fields=['generated', 'next_occurrence'])
+    return created
+
+
+@transaction.atomic
+def create_series(series):
+    """
+    Save series and book its occurrences up to the horizon, raising
+    ScheduleConflict (and saving nothing) if any of them is taken.
+    """
+    lock_provider(series.provider_id)
+    series.save()
+    return materialize(series, horizon(), skip_conflicts=False)
+
+
+def extend(end=None, **filters):
+    """
+    Materialise every series with occurrences due before end (default the
+    horizon), e.g. extend(provider_id=3). Each series is extended in
+    its own transaction under the provider lock; occurrences that have been
+    booked over in the meantime are skipped. Returns the encounters created.
+    """
+    end = end or horizon()
+    created = []
+    for pk, provider_id in EncounterSeries.objects.filter(next_occurrence__lt=end, **filters).values_list('pk', 'provider_id'):
+        with transaction.atomic():
+            lock_provider(provider_id)
+            series = EncounterSeries.objects.select_for_update().get(pk=pk)
+            created += materialize(series, end)
+    return created
+
+
+def unstored(series, start, end):
+    """
+    Starts of the occurrences of series not stored yet, from the one before
+    start (or the first unstored one, if start is None) up to end.
+    """
+    index = series.generated
+    if start is not None:
+        # Occurrences are step days apart: start from the one before start
+        step = series.interval * (7 if series.frequency == 'Weekly' else 1)
+        index = max(index, (timezone.localdate(start) - timezone.localdate(series.starts_at)).days // step - 1)
+    moment = occurrence(series, index)
+    while moment is not None and moment < end:
+        yield moment
+        index += 1
+        moment = occurrence(series, index)
+
+
+def pending(provider_id, start, end):
+    """
+    (start, end) of the provider's recurring occurrences overlapping
+    [start, end) that are not stored yet, by start. Nothing is written, so
+    reads such as availability can look any distance ahead.
+    """
+    spans = []
+    for series in EncounterSeries.objects.filter(provider_id=provider_id, next_occurrence__lt=end):
+        length = datetime.timedelta(minutes=series.duration)
+        spans.extend((moment, moment + length) for moment in unstored(series, start, end) if moment + length > start)
+    return sorted(spans)
+
+
+def pending_rows(columns, start, end, user, **filters):
+    """
+    The occurrences starting in [start, end) (start may be None) of the
+    series user can see, narrowed by filters, that are not stored yet, for
+    listings of windows reaching past the horizon, up to
+    SERIES_LOOKAHEAD_DAYS ahead. Each is a values_list() tuple of the
+    Encounter columns given (a RowEncoder's), followed by its start and, as
+    its pk, minus its series' id: the (key, pk) keyset_page sorts on.
+
+    Nothing is written: `manage.py extend_encounter_series` books them as
+    the horizon reaches them, skipping those clashing with a booking, which
+    are left out here too. Within the horizon this costs nothing. Raises
+    ValueError rather than expand more than SERIES_READ_LIMIT series in one
+    request.
+    """
+    if end <= horizon():
+        return []
+    end = min(end, timezone.now() + datetime.timedelta(days=settings.SERIES_LOOKAHEAD_DAYS))
+    # The series' own columns are read alongside it, under stand-in names
+    shared = {
+        f'column_{index}': F(column) if isinstance(column, str) else column
+        for index, column in enumerate(columns) if column not in OCCURRENCE_COLUMNS
+    }
+    due = list(
+        EncounterSeries.objects.visible_to(user).filter(next_occurrence__lt=end, **filters)
+        .annotate(**shared).order_by('next_occurrence')[:settings.SERIES_READ_LIMIT + 1]
+    )
+    if len(due) > settings.SERIES_READ_LIMIT:
+        raise ValueError(
+            f'more than {settings.SERIES_READ_LIMIT} recurring series reach past '
+            f'{timezone.localdate(horizon())}; filter by provider or end the window sooner'
+        )
+
+    status = Encounter._meta.get_field('status').default
+    rows = []
+    for series in due:
+        length = datetime.timedelta(minutes=series.duration)
+        starts = [moment for moment in unstored(series, start, end) if start is None or moment >= start]
+        if not starts:
+            continue
+        busy = list(
+            bookings(series.provider_id, starts[0], starts[-1] + length).values_list('scheduled_for', 'ends_at', 'pk')
+        )
+        conflicts = overlapping(starts, length, busy)
+        for moment in starts:
+            if moment in conflicts:
+                continue
+            # In UTC, as stored encounters are read back
+            scheduled_for = moment.astimezone(datetime.timezone.utc)
+            own = {'id': None, 'scheduled_for': scheduled_for, 'ends_at': scheduled_for + length, 'status': status,
+                   'series': series.pk, 'created_at': None}
+            rows.append(tuple(
+                own[column] if column in OCCURRENCE_COLUMNS else getattr(series, f'column_{index}')
+                for index, column in enumerate(columns)
+            ) + (moment, -series.pk))
+    return sorted(rows, key=lambda row: row[-2:])
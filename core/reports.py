@@ -0,0 +1,304 @@
+import datetime
+from io import BytesIO
+
+from django.db import models
+from django.db.models import Count, DateField, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.http import HttpResponse
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .models import User, Enrollment, Prescription, Metric, Encounter, Payment, MonthlyRevenue
+from .permissions import can_view_all
+
+
+class Period:
+    """
+    The inclusive date window a report covers. Either end may be open.
+    Datetime columns are compared against the local midnights bounding the
+    window so the database can use plain range scans on them.
+    """
+
+    def __init__(self, start=None, end=None):
+        if start and end and start > end:
+            raise ValueError('start_date must not be after end_date')
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, start_date=None, end_date=None):
+        """Build a Period from YYYY-MM-DD strings, raising ValueError if invalid."""
+        return cls(
+            datetime.date.fromisoformat(start_date) if start_date else None,
+            datetime.date.fromisoformat(end_date) if end_date else None,
+        )
+
+    def q(self, model, field_name, prefix=''):
+        """
+        Q object restricting a date or datetime field of model to the window.
+        prefix is the relation path to model, e.g. 'encounters__'.
+        """
+        is_datetime = isinstance(model._meta.get_field(field_name), models.DateTimeField)
+        conditions = {}
+        if self.start:
+            conditions[f'{prefix}{field_name}__gte'] = self._midnight(self.start) if is_datetime else self.start
+        if self.end:
+            end = self.end + datetime.timedelta(days=1)
+            conditions[f'{prefix}{field_name}__lt'] = self._midnight(end) if is_datetime else end
+        return Q(**conditions)
+
+    @property
+    def days(self):
+        """The dates in the window; both ends must be set."""
+        return [self.start + datetime.timedelta(days=n) for n in range((self.end - self.start).days + 1)]
+
+    def whole_months(self):
+        """True if the window starts and ends on month boundaries (or is open)."""
+        return (
+            (self.start is None or self.start.day == 1)
+            and (self.end is None or (self.end + datetime.timedelta(days=1)).day == 1)
+        )
+
+    @staticmethod
+    def _midnight(date):
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def related_count(model, field, date_field):
+    """
+    Measure counting the model rows pointing at each report row through
+    field, within the report period. It is a correlated subquery, so counts
+    over several tables never multiply each other the way joins would.
+    """
+    def measure(user, period):
+        rows = model.objects.visible_to(user).filter(period.q(model, date_field), **{field: OuterRef('pk')})
+        counts = rows.order_by().values(field).annotate(count=Count('pk')).values('count')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    return measure
+
+
+def active_prescription_count(user, period):
+    today = timezone.localdate()
+    return Count('pk', filter=Prescription.valid_q(today, today))
+
+
+class ReportSpec:
+    """
+    A report declared as the measures (aggregates) to compute over a model,
+    optionally broken down by group_by ({output key: ORM lookup}).
+
+    run() compiles the spec into a single query: a GROUP BY over the
+    breakdown with every measure as a conditional aggregate, or one
+    aggregate() when there is no breakdown. The summary totals are summed
+    from the breakdown rows, so the number of queries never depends on how
+    many programs, medications or staff members there are.
+
+    Measures are aggregate expressions, or callables taking (user, period)
+    for those that depend on the request.
+    """
+
+    def __init__(self, title, model, measures, date_field=None, group_by=None, breakdown=None, filter=None):
+        self.title = title
+        self.model = model
+        self.measures = measures
+        self.date_field = date_field
+        self.group_by = group_by or {}
+        self.breakdown = breakdown
+        self.filter = filter
+
+    def queryset(self, user, period):
+        queryset = self.model.objects.visible_to(user)
+        if self.filter is not None:
+            queryset = queryset.filter(self.filter)
+        if self.date_field:
+            queryset = queryset.filter(period.q(self.model, self.date_field))
+        return queryset
+
+    def aggregates(self, user, period):
+        # Aliased so measure names never clash with model fields or relations
+        return {
+            f'measure_{name}': measure(user, period) if callable(measure) else measure
+            for name, measure in self.measures.items()
+        }
+
+    def run(self, user, period):
+        queryset = self.queryset(user, period)
+        aggregates = self.aggregates(user, period)
+        data = {
+            'title': self.title,
+            'start_date': period.start,
+            'end_date': period.end,
+        }
+        if not self.group_by:
+            totals = queryset.aggregate(**aggregates)
+            data['summary'] = {name: totals[f'measure_{name}'] or 0 for name in self.measures}
+            return data
+
+        lookups = list(self.group_by.values())
+        rows = queryset.values(*lookups).annotate(**aggregates).order_by(*lookups)
+        breakdown = [
+            dict(
+                {key: row[lookup] for key, lookup in self.group_by.items()},
+                **{name: row[f'measure_{name}'] for name in self.measures}
+            )
+            for row in rows
+        ]
+        data['summary'] = {name: sum(row[name] for row in breakdown) for name in self.measures}
+        data[self.breakdown] = breakdown
+        return data
+
+
+class RevenueReport:
+    """
+    Revenue by program and month.
+
+    Windows made of whole months, requested by users who may see every
+    payment, are read from the MonthlyRevenue rollup: a year costs at most
+    12 rows per program, however many payments there are. Other requests
+    group the visible payments with Sum and TruncMonth in the database.
+    Both paths are one query, and the by-program and by-month breakdowns
+    are folded from its rows.
+    """
+    title = 'Revenue Analysis Report'
+    breakdown = 'revenue_by_program'
+
+    def rows(self, user, period):
+        if can_view_all(user) and period.whole_months():
+            return MonthlyRevenue.objects.filter(period.q(MonthlyRevenue, 'month')).values_list(
+                'program__name', 'month', 'total', 'payment_count'
+            ).order_by('month', 'program__name')
+        return (
+            Payment.objects.visible_to(user).filter(period.q(Payment, 'paid_at'))
+            .annotate(month=TruncMonth('paid_at', output_field=DateField()))
+            .values_list('program__name', 'month')
+            .annotate(total=Sum('amount'), payment_count=Count('pk'))
+            .order_by('month', 'program__name')
+        )
+
+    def run(self, user, period):
+        by_program, by_month = {}, {}
+        for program, month, total, payment_count in self.rows(user, period):
+            for breakdown, key in ((by_program, program), (by_month, month.strftime('%Y-%m'))):
+                revenue, payments = breakdown.get(key, (0, 0))
+                breakdown[key] = (revenue + total, payments + payment_count)
+        return {
+            'title': self.title,
+            'start_date': period.start,
+            'end_date': period.end,
+            'summary': {
+                'total_revenue': sum(revenue for revenue, _ in by_program.values()),
+                'payments': sum(payments for _, payments in by_program.values()),
+            },
+            'revenue_by_program': [
+                {'program': program, 'revenue': revenue, 'payments': payments}
+                for program, (revenue, payments) in sorted(by_program.items())
+            ],
+            'revenue_by_month': [
+                {'month': month, 'revenue': revenue, 'payments': payments}
+                for month, (revenue, payments) in by_month.items()
+            ],
+        }
+
+
+def status_count(value):
+    return Count('pk', filter=Q(status=value))
+
+
+REPORTS = {
+    'client_attendance': ReportSpec(
+        'Client Attendance Report',
+        Encounter,
+        date_field='scheduled_for',
+        group_by={'encounter_type': 'encounter_type'},
+        breakdown='type_breakdown',
+        measures={
+            'total_encounters': Count('pk'),
+            'completed_encounters': status_count('Completed'),
+            'cancelled_encounters': status_count('Cancelled'),
+            'no_shows': status_count('No Show'),
+        },
+    ),
+    'program_enrollment': ReportSpec(
+        'Program Enrollment Report',
+        Enrollment,
+        date_field='enrollment_date',
+        group_by={'program': 'program__name'},
+        breakdown='program_breakdown',
+        measures={
+            'total_enrollments': Count('pk'),
+            'active_enrollments': Count('pk', filter=Q(is_active=True)),
+            'completed_enrollments': Count('pk', filter=Q(is_active=False)),
+        },
+    ),
+    'prescription_usage': ReportSpec(
+        'Prescription Usage Report',
+        Prescription,
+        date_field='start_date',
+        group_by={'medication': 'medication_name'},
+        breakdown='medication_breakdown',
+        measures={
+            'total_prescriptions': Count('pk'),
+            'active_prescriptions': active_prescription_count,
+        },
+    ),
+    'staff_performance': ReportSpec(
+        'Staff Performance Report',
+        User,
+        filter=Q(is_doctor=True) | Q(is_nurse=True),
+        group_by={'staff_member': 'username'},
+        breakdown='staff_metrics',
+        measures={
+            'encounters': related_count(Encounter, 'provider', 'scheduled_for'),
+            'prescriptions': related_count(Prescription, 'prescribed_by', 'start_date'),
+            'metrics_recorded': related_count(Metric, 'recorded_by', 'recorded_at'),
+        },
+    ),
+    'revenue_analysis': RevenueReport(),
+}
+
+
+def label(name):
+    return name.replace('_', ' ').capitalize()
+
+
+def render_pdf(spec, data, filename):
+    """Lay out the data spec.run() produced as a PDF download."""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, 750, data['title'])
+    p.setFont("Helvetica", 12)
+    p.drawString(50, 730, f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    p.drawString(50, 710, f"Period: {data['start_date'] or 'start'} to {data['end_date'] or 'today'}")
+
+    y = 670
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, y, "Summary")
+    p.setFont("Helvetica", 12)
+    for name, value in data['summary'].items():
+        y -= 20
+        p.drawString(70, y, f"{label(name)}: {value}")
+
+    if spec.breakdown:
+        y -= 40
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(50, y, label(spec.breakdown))
+        p.setFont("Helvetica", 10)
+        for row in data[spec.breakdown]:
+            y -= 20
+            if y < 50:
+                p.showPage()
+                p.setFont("Helvetica", 10)
+                y = 750
+            p.drawString(70, y, ',  '.join(f"{label(key)}: {value}" for key, value in row.items()))
+
+    p.showPage()
+    p.save()
+
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.write(buffer.getvalue())
+    buffer.close()
+    return response
@@ -0,0 +1,100 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import Payment, MonthlyRevenue
+
+
+def month_of(moment):
+    """First day of the local calendar month containing the aware datetime moment."""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def month_bounds(month):
+    """The aware [start, end) datetimes of the local calendar month starting on month."""
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return tuple(
+        timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        for day in (month, next_month)
+    )
+
+
+def refresh_bucket(program_id, month):
+    """
+    Recompute one (program, month) rollup row from its payments.
+
+    The row is locked first, so concurrent refreshes of the same bucket run
+    one after the other and the last one always sees every committed payment.
+    The aggregate only reads one program's payments for one month through
+    the (program, paid_at) index.
+    """
+    start, end = month_bounds(month)
+    with transaction.atomic():
+        MonthlyRevenue.objects.get_or_create(program_id=program_id, month=month)
+        row = MonthlyRevenue.objects.select_for_update().get(program_id=program_id, month=month)
+        totals = Payment.objects.filter(program_id=program_id, paid_at__gte=start, paid_at__lt=end).aggregate(
+            total=Sum('amount'), payment_count=Count('pk')
+        )
+        if not totals['payment_count']:
+            row.delete()
+            return
+        row.total = totals['total']
+        row.payment_count = totals['payment_count']
+        row.save(update_fields=['total', 'payment_count'])
+
+
+def rebuild_rollup():
+    """
+    Rebuild the whole rollup with one grouped Sum over payments, e.g. after
+    payments were imported with bulk_create() or queryset.update(), which
+    send no signals. Returns the number of rollup rows written.
+    """
+    rows = (
+        Payment.objects.order_by()
+        .annotate(month=TruncMonth('paid_at', output_field=DateField()))
+        .values('program_id', 'month')
+        .annotate(total=Sum('amount'), payment_count=Count('pk'))
+    )
+    with transaction.atomic():
+        MonthlyRevenue.objects.all().delete()
+        created = MonthlyRevenue.objects.bulk_create(MonthlyRevenue(**row) for row in rows)
+    return len(created)
+
+
+def _bucket(payment):
+    if payment.program_id is None or payment.paid_at is None:
+        return None
+    return payment.program_id, month_of(payment.paid_at)
+
+
+def _remember_bucket(sender, instance, **kwargs):
+    # The bucket a loaded payment was counted in, so moving it to another
+    # program or month also refreshes the one it left
+    instance._revenue_bucket = _bucket(instance) if instance.pk else None
+
+
+def _refresh_after_commit(buckets):
+    for bucket in buckets:
+        if bucket is not None:
+            transaction.on_commit(lambda bucket=bucket: refresh_bucket(*bucket))
+
+
+def _on_save(sender, instance, **kwargs):
+    new_bucket = _bucket(instance)
+    _refresh_after_commit({getattr(instance, '_revenue_bucket', None), new_bucket})
+    instance._revenue_bucket = new_bucket
+
+
+def _on_delete(sender, instance, **kwargs):
+    _refresh_after_commit({getattr(instance, '_revenue_bucket', None), _bucket(instance)})
+
+
+def connect_signals():
+    """Keep MonthlyRevenue in step with Payment writes made through the ORM."""
+    post_init.connect(_remember_bucket, sender=Payment, dispatch_uid='revenue-init')
+    post_save.connect(_on_save, sender=Payment, dispatch_uid='revenue-save')
+    post_delete.connect(_on_delete, sender=Payment, dispatch_uid='revenue-delete')
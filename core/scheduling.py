@@ -0,0 +1,132 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import User, Encounter
+
+# Cancelled encounters free their slot again
+NON_BLOCKING_STATUSES = ('Cancelled',)
+
+
+class ScheduleConflict(Exception):
+    """The provider already has encounters overlapping the requested time."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__('Provider is already booked at this time')
+
+
+def validate_duration(duration):
+    """Return duration (minutes) as an int, raising ValueError if it cannot be booked."""
+    duration = int(duration)
+    if not 1 <= duration <= settings.MAX_ENCOUNTER_MINUTES:
+        raise ValueError(f'duration must be between 1 and {settings.MAX_ENCOUNTER_MINUTES} minutes')
+    return duration
+
+
+def bookings(provider_id, start, end):
+    """
+    The provider's blocking encounters overlapping [start, end), by start.
+
+    No encounter is longer than MAX_ENCOUNTER_MINUTES, so one that starts
+    more than that before start cannot reach it. The lower bound turns the
+    overlap test into a bounded range scan of encounter_schedule_idx:
+    O(log n + k) rather than a walk over every earlier booking.
+    """
+    earliest = start - datetime.timedelta(minutes=settings.MAX_ENCOUNTER_MINUTES)
+    return Encounter.objects.filter(
+        provider_id=provider_id,
+        scheduled_for__gt=earliest,
+        scheduled_for__lt=end,
+        ends_at__gt=start,
+    ).exclude(status__in=NON_BLOCKING_STATUSES).order_by('scheduled_for')
+
+
+def lock_provider(provider_id):
+    """Serialise bookings for one provider until the transaction ends."""
+    User.objects.select_for_update().only('pk').get(pk=provider_id)
+
+
+@transaction.atomic
+def book(encounter):
+    """
+    Save encounter, raising ScheduleConflict if it overlaps another booking
+    of its provider. The provider row stays locked until commit, so two
+    concurrent requests cannot both take the same slot.
+    """
+    if encounter.status not in NON_BLOCKING_STATUSES:
+        lock_provider(encounter.provider_id)
+        end = encounter.scheduled_for + datetime.timedelta(minutes=encounter.duration)
+        conflicts = bookings(encounter.provider_id, encounter.scheduled_for, end)
+        if encounter.pk:
+            conflicts = conflicts.exclude(pk=encounter.pk)
+        conflicts = list(conflicts.values_list('pk', flat=True))
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+    encounter.save()
+    return encounter
+
+
+def at_hour(day, hour):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+
+def opening_hours(period):
+    """(opens, closes) for each working day of period, in order."""
+    return [
+        (at_hour(day, settings.CLINIC_OPENS_AT), at_hour(day, settings.CLINIC_CLOSES_AT))
+        for day in period.days
+        if day.weekday() in settings.CLINIC_WORKING_DAYS
+    ]
+
+
+def free_intervals(provider_id, period, now=None, pending=()):
+    """
+    The provider's free (start, end) intervals within opening hours over
+    period, from now on. pending are further (start, end) spans to treat as
+    booked, e.g. recurring occurrences not stored yet.
+
+    The bookings are read once, sorted by start, and swept alongside the
+    opening hours: each booking is visited a constant number of times,
+    whatever the length of the window.
+    """
+    hours = opening_hours(period)
+    if not hours:
+        return []
+    now = now or timezone.now()
+    busy = list(bookings(provider_id, hours[0][0], hours[-1][1]).values_list('scheduled_for', 'ends_at'))
+    if pending:
+        busy = sorted(busy + list(pending))
+
+    free = []
+    first = 0
+    for opens, closes in hours:
+        cursor = max(opens, now)
+        if cursor >= closes:
+            continue
+        # Bookings over before this day starts are never looked at again
+        while first < len(busy) and busy[first][1] <= cursor:
+            first += 1
+        index = first
+        while index < len(busy) and busy[index][0] < closes:
+            start, end = busy[index]
+            if start > cursor:
+                free.append((cursor, start))
+            cursor = max(cursor, end)
+            index += 1
+        if cursor < closes:
+            free.append((cursor, closes))
+    return free
+
+
+def free_slots(intervals, minutes):
+    """Start times of the slots of the given length fitting in intervals."""
+    length = datetime.timedelta(minutes=minutes)
+    slots = []
+    for start, end in intervals:
+        while start + length <= end:
+            slots.append(start)
+            start += length
+    return slots
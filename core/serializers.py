@@ -1,6 +1,159 @@
 from rest_framework import serializers
-from django.contrib.auth.models import User
-from .models import Client, UserProfile, HealthProgram, Enrollment, Prescription, Metric, Appointment
+from rest_framework.exceptions import ParseError
+from .models import User, Client, UserProfile, HealthProgram, Enrollment, Prescription, Metric, Encounter
+from .encoders import Nested, RowEncoder, full_name
+from .lookup import LRUCache
+
+GENDER_DISPLAY = dict(Client.GENDER_CHOICES)
+# Field selections whose compiled RowEncoder is kept; ?fields= and ?expand=
+# come from the client, so the combinations are unbounded
+ROW_ENCODER_CACHE_SIZE = 256
+
+
+def staff_role(is_doctor):
+    return 'Doctor' if is_doctor else 'Nurse'
+
+
+def split_param(value):
+    """Split a comma separated query parameter such as ?fields=id,name"""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def source_parts(field, parts):
+    """The relation path of field, as a tuple of names, below parts."""
+    if field.source == '*':
+        return parts
+    return parts + tuple(field.source.split('.'))
+
+
+class TransformField(serializers.ReadOnlyField):
+    """
+    Read-only field passing the source value through a function, e.g. a
+    choices display lookup. Row encoders apply the same function to the value
+    read by values_list().
+    """
+
+    def __init__(self, function, **kwargs):
+        self.function = function
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.function(value)
+
+    def row_spec(self, parts):
+        return ('__'.join(parts), self.function)
+
+    def orm_paths(self, parts):
+        return ['__'.join(parts)]
+
+
+class FullNameField(serializers.ReadOnlyField):
+    """A client's "First Last" name, computed in SQL by row encoders."""
+
+    def to_representation(self, value):
+        return f"{value.first_name} {value.last_name}"
+
+    def row_spec(self, parts):
+        return full_name(''.join(f'{part}__' for part in parts))
+
+    def orm_paths(self, parts):
+        prefix = ''.join(f'{part}__' for part in parts)
+        return [f'{prefix}first_name', f'{prefix}last_name']
+
+
+class SelectableFieldsMixin:
+    """
+    Sparse fieldsets and relation expansion for read serializers.
+
+    ?fields=id,name keeps only the listed fields and ?expand=client replaces a
+    relation's compact form (a name or username) with the nested serializer
+    declared in expandable_fields. The selected fields also decide which
+    columns are read: narrow() applies select_related() and only() to a
+    queryset for instance serialization, and encode() reads just those columns
+    with values_list() through a RowEncoder built once per field selection
+    (the ROW_ENCODER_CACHE_SIZE most recently used selections are kept).
+    """
+    expandable_fields = {}
+    _row_encoders = LRUCache(ROW_ENCODER_CACHE_SIZE)
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand or ())
+        unknown = expand - set(self.expandable_fields)
+        if unknown:
+            raise ParseError({'error': f"Cannot expand: {', '.join(sorted(unknown))}"})
+        for name in expand:
+            serializer_class, options = self.expandable_fields[name]
+            self.fields[name] = serializer_class(read_only=True, **options)
+        if fields:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ParseError({'error': f"Unknown fields: {', '.join(sorted(unknown))}"})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def from_request(cls, request, *args, default_fields=None, default_expand=None, **kwargs):
+        """Build the serializer from the request's ?fields= and ?expand= parameters."""
+        params = request.query_params
+        fields = split_param(params.get('fields')) or default_fields
+        expand = split_param(params.get('expand')) if 'expand' in params else default_expand
+        kwargs.setdefault('context', {'request': request})
+        return cls(*args, fields=fields, expand=expand, **kwargs)
+
+    def _row_layout(self, parts=()):
+        layout = {}
+        for name, field in self.fields.items():
+            path = source_parts(field, parts)
+            if isinstance(field, SelectableFieldsMixin):
+                layout[name] = field._row_layout(path)
+                if path != parts:
+                    # A null relation is None, as when serializing an instance
+                    layout[name] = Nested('__'.join(path), layout[name])
+            elif hasattr(field, 'row_spec'):
+                layout[name] = field.row_spec(path)
+            else:
+                layout[name] = '__'.join(path)
+        return layout
+
+    def _orm_paths(self, parts=()):
+        paths = []
+        for field in self.fields.values():
+            path = source_parts(field, parts)
+            if isinstance(field, SelectableFieldsMixin):
+                paths.extend(field._orm_paths(path))
+            elif hasattr(field, 'orm_paths'):
+                paths.extend(field.orm_paths(path))
+            else:
+                paths.append('__'.join(path))
+        return paths
+
+    def row_encoder(self):
+        key = (type(self),) + tuple((name, type(field)) for name, field in self.fields.items())
+        encoder = self._row_encoders.get(key)
+        if encoder is None:
+            encoder = RowEncoder(self._row_layout())
+            self._row_encoders.set(key, encoder)
+        return encoder
+
+    def encode(self, queryset):
+        """Encode queryset as a list of dicts without instantiating models."""
+        return self.row_encoder().encode(queryset)
+
+    def narrow(self, queryset):
+        """Restrict queryset to the relations and columns the fields read."""
+        model_fields = {field.name for field in queryset.model._meta.get_fields()}
+        columns, relations = {queryset.model._meta.pk.name}, set()
+        for path in self._orm_paths():
+            parts = path.split('__')
+            if parts[0] not in model_fields:
+                # An annotation, not a column
+                continue
+            columns.add(path)
+            for depth in range(1, len(parts)):
+                relations.add('__'.join(parts[:depth]))
+        return queryset.select_related(*relations).only(*(columns | relations))
+
 
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -8,36 +161,101 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
-        fields = ['id', 'username', 'work_email', 'employer_id', 
+        fields = ['id', 'username', 'work_email', 'employer_id',
                  'is_doctor', 'is_nurse', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
-class ClientSerializer(serializers.ModelSerializer):
+class StaffSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    role = TransformField(staff_role, source='is_doctor')
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'role']
+
+class ClientSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    gender = TransformField(GENDER_DISPLAY.get)
+
+    class Meta:
+        model = Client
+        fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'email', 'phone_number', 'address', 'created_at']
+
+class ClientSummarySerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    name = FullNameField(source='*')
+
     class Meta:
         model = Client
-        fields = ['id', 'first_name', 'last_name', 'email', 'phone', 'address', 'date_of_birth', 'emergency_contact']
+        fields = ['id', 'first_name', 'last_name', 'name']
+
+class HealthProgramSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    created_by = serializers.CharField(source='created_by.username', read_only=True, allow_null=True)
+
+    expandable_fields = {
+        'created_by': (StaffSerializer, {}),
+    }
 
-class HealthProgramSerializer(serializers.ModelSerializer):
     class Meta:
         model = HealthProgram
         fields = ['id', 'name', 'description', 'created_by', 'created_at']
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class ProgramListSerializer(HealthProgramSerializer):
+    # Annotated by the view
+    total_enrollments = serializers.IntegerField(read_only=True)
+    active_enrollments = serializers.IntegerField(read_only=True)
+
+    class Meta(HealthProgramSerializer.Meta):
+        fields = HealthProgramSerializer.Meta.fields + ['total_enrollments', 'active_enrollments']
+
+class EnrollmentSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    client = FullNameField()
+    program = serializers.CharField(source='program.name', read_only=True)
+    enrolled_by = serializers.CharField(source='enrolled_by.username', read_only=True, allow_null=True)
+
+    expandable_fields = {
+        'client': (ClientSerializer, {}),
+        'program': (HealthProgramSerializer, {}),
+        'enrolled_by': (StaffSerializer, {}),
+    }
+
     class Meta:
         model = Enrollment
         fields = ['id', 'client', 'program', 'enrolled_by', 'enrollment_date', 'is_active']
 
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    client = ClientSummarySerializer(read_only=True)
+    prescribed_by = serializers.CharField(source='prescribed_by.username', read_only=True, allow_null=True)
+
+    expandable_fields = {
+        'client': (ClientSerializer, {}),
+        'prescribed_by': (StaffSerializer, {}),
+    }
+
     class Meta:
         model = Prescription
-        fields = ['id', 'client', 'prescribed_by', 'medication_name', 'dosage', 'frequency', 'start_date', 'end_date', 'notes']
+        fields = ['id', 'client', 'prescribed_by', 'medication_name', 'dosage', 'frequency', 'duration',
+                  'start_date', 'end_date', 'notes', 'prescribed_date', 'created_at']
+
+class MetricSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    client = FullNameField()
+    recorded_by = serializers.CharField(source='recorded_by.username', read_only=True, allow_null=True)
+
+    expandable_fields = {
+        'client': (ClientSerializer, {}),
+        'recorded_by': (StaffSerializer, {}),
+    }
 
-class MetricSerializer(serializers.ModelSerializer):
     class Meta:
         model = Metric
         fields = ['id', 'client', 'recorded_by', 'name', 'value', 'unit', 'recorded_at']
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class EncounterSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    client = FullNameField()
+    provider = serializers.CharField(source='provider.username', read_only=True)
+
+    expandable_fields = {
+        'client': (ClientSerializer, {}),
+        'provider': (StaffSerializer, {}),
+    }
+
     class Meta:
-        model = Appointment
-        fields = ['id', 'client', 'scheduled_with', 'scheduled_for', 'reason', 'status', 'notes'] 
\ No newline at end of file
+        model = Encounter
+        fields = ['id', 'client', 'provider', 'encounter_type', 'scheduled_for', 'duration', 'ends_at', 'series', 'status', 'notes', 'created_at']
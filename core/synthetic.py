@@ -0,0 +1,172 @@
+"""
+Synthetic clinic data for load tests and benchmarks (manage.py seed_scale).
+
+The generators are plain functions of (seed, chunk) returning value tuples,
+so they can run in worker processes without touching Django or the
+database, and the same seed always produces the same rows.
+"""
+import csv
+import datetime
+import io
+import random
+
+FIRST_NAMES = [
+    'Amina', 'Brian', 'Caroline', 'David', 'Esther', 'Faith', 'George', 'Grace', 'Hassan', 'Irene',
+    'James', 'Joy', 'Kevin', 'Lucy', 'Mary', 'Michael', 'Naomi', 'Otieno', 'Peter', 'Purity',
+    'Rose', 'Samuel', 'Sarah', 'Stephen', 'Susan', 'Wanjiru', 'Anne', 'Daniel', 'Elizabeth', 'John',
+]
+LAST_NAMES = [
+    'Achieng', 'Barasa', 'Chebet', 'Gitau', 'Kamau', 'Kariuki', 'Kiprop', 'Koech', 'Mutua', 'Mwangi',
+    'Njoroge', 'Nyambura', 'Ochieng', 'Odhiambo', 'Omondi', 'Onyango', 'Otieno', 'Wafula', 'Wambui', 'Wanjiku',
+    'Smith', 'Johnson', 'Brown', 'Taylor', 'Wilson', 'Ali', 'Hussein', 'Patel', 'Shah', 'Mohamed',
+]
+TOWNS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Machakos', 'Nyeri', 'Meru', 'Kakamega']
+PROGRAMS = [
+    'HIV Care', 'TB Treatment', 'Malaria Prevention', 'Diabetes Management', 'Hypertension Clinic',
+    'Maternal Health', 'Child Immunisation', 'Mental Health Support', 'Nutrition', 'Family Planning',
+    'Cancer Screening', 'Physiotherapy',
+]
+# (name, dosage, frequency)
+MEDICATIONS = [
+    ('Metformin', '500mg', 'Twice daily'), ('Amlodipine', '5mg', 'Once daily'),
+    ('Lisinopril', '10mg', 'Once daily'), ('Atorvastatin', '20mg', 'At night'),
+    ('Amoxicillin', '500mg', 'Three times daily'), ('Paracetamol', '1g', 'Four times daily'),
+    ('Ibuprofen', '400mg', 'Three times daily'), ('Omeprazole', '20mg', 'Once daily'),
+    ('Salbutamol', '100mcg', 'As needed'), ('Artemether/Lumefantrine', '80/480mg', 'Twice daily'),
+    ('Isoniazid', '300mg', 'Once daily'), ('Tenofovir/Lamivudine/Dolutegravir', '300/300/50mg', 'Once daily'),
+    ('Ferrous sulphate', '200mg', 'Once daily'), ('Folic acid', '5mg', 'Once daily'),
+    ('Warfarin', '5mg', 'Once daily'), ('Sertraline', '50mg', 'Once daily'),
+]
+# (name, unit, typical value, spread)
+METRICS = [
+    ('Weight', 'kg', 70, 15), ('Systolic BP', 'mmHg', 125, 15), ('Diastolic BP', 'mmHg', 80, 10),
+    ('Heart Rate', 'bpm', 75, 12), ('Temperature', 'C', 36.8, 0.5), ('Blood Glucose', 'mmol/L', 6.0, 1.8),
+    ('Oxygen Saturation', '%', 97, 1.5),
+]
+ENCOUNTER_TYPES = ['Consultation', 'Follow-up', 'Emergency', 'Routine']
+DURATIONS = [15, 30, 30, 30, 45, 60]
+
+CLIENT_COLUMNS = ('first_name', 'last_name', 'date_of_birth', 'gender', 'address', 'phone_number', 'email', 'created_at')
+ENROLLMENT_COLUMNS = ('client_id', 'program_id', 'enrolled_by_id', 'enrollment_date', 'is_active')
+PRESCRIPTION_COLUMNS = (
+    'client_id', 'prescribed_by_id', 'medication_name', 'dosage', 'frequency', 'duration',
+    'start_date', 'end_date', 'notes', 'prescribed_date', 'created_at',
+)
+METRIC_COLUMNS = ('client_id', 'recorded_by_id', 'name', 'value', 'unit', 'recorded_at')
+ENCOUNTER_COLUMNS = (
+    'client_id', 'provider_id', 'encounter_type', 'scheduled_for', 'duration', 'ends_at', 'status', 'notes', 'created_at',
+)
+
+
+def staff_username(seed, n):
+    """Username of the n-th staff account seeded with seed; every third one is a doctor."""
+    return f'seed{seed}-{"doctor" if n % 3 == 0 else "nurse"}-{n}'
+
+
+def to_csv(rows):
+    r"""rows as the text of a PostgreSQL COPY ... (FORMAT csv, NULL '\N')."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(tuple(r'\N' if value is None else value for value in row) for row in rows)
+    return buffer.getvalue()
+
+
+def generate(job):
+    """
+    Pool entry point: run generator on task and return {table: (row count,
+    rows)}, the rows already rendered by to_csv() when as_csv is set so that
+    the formatting happens in the workers too.
+    """
+    generator, task, as_csv = job
+    return {
+        table: (len(rows), to_csv(rows) if as_csv else rows)
+        for table, rows in generator(task).items()
+    }
+
+
+def rng(seed, table, chunk):
+    # Seeding with a str is stable across runs and processes
+    return random.Random(f'{seed}:{table}:{chunk}')
+
+
+def moment_between(r, start, end):
+    """A random aware datetime in [start, end), on a minute boundary."""
+    minutes = int((end - start).total_seconds() // 60)
+    return start + datetime.timedelta(minutes=r.randrange(max(minutes, 1)))
+
+
+def client_rows(task):
+    """{'client': rows} for clients number first .. first + count - 1."""
+    seed, chunk, first, count, anchor = task
+    r = rng(seed, 'client', chunk)
+    rows = []
+    for number in range(first, first + count):
+        first_name, last_name = r.choice(FIRST_NAMES), r.choice(LAST_NAMES)
+        born = anchor.date() - datetime.timedelta(days=r.randrange(365, 90 * 365))
+        rows.append((
+            first_name,
+            last_name,
+            born,
+            r.choices('MFO', [48, 50, 2])[0],
+            f'{r.randrange(1, 999)} {r.choice(LAST_NAMES)} Road, {r.choice(TOWNS)}',
+            f'+2547{r.randrange(10000000, 99999999)}',
+            f'{first_name}.{last_name}.{number}@example.com'.lower(),
+            moment_between(r, anchor - datetime.timedelta(days=3 * 365), anchor),
+        ))
+    return {'client': rows}
+
+
+def activity_rows(task):
+    """
+    Enrollments, prescriptions, metrics and encounters for one chunk of
+    clients, as {table: rows}. Per-client counts vary around the requested
+    averages; each client's measurements stay near a personal baseline.
+    """
+    seed, chunk, client_ids, doctors, nurses, programs, options, anchor = task
+    r = rng(seed, 'activity', chunk)
+    staff = doctors + nurses
+    year_ago = anchor - datetime.timedelta(days=365)
+    soon = anchor + datetime.timedelta(days=90)
+    today = anchor.date()
+    rows = {'enrollment': [], 'prescription': [], 'metric': [], 'encounter': []}
+
+    def around(mean):
+        # 0 .. 2 * mean, averaging mean
+        return r.randint(0, 2 * mean) if mean else 0
+
+    for client_id in client_ids:
+        for program_id in r.sample(programs, min(len(programs), r.randint(0, 3))):
+            rows['enrollment'].append((
+                client_id, program_id, r.choice(staff), moment_between(r, year_ago, anchor), r.random() < 0.8,
+            ))
+
+        for _ in range(around(options['prescriptions'])):
+            name, dosage, frequency = r.choice(MEDICATIONS)
+            start = today - datetime.timedelta(days=r.randrange(365))
+            days = r.choice([5, 7, 14, 30, 90, None])
+            written = datetime.datetime.combine(start, datetime.time(r.randrange(8, 17)), tzinfo=anchor.tzinfo)
+            rows['prescription'].append((
+                client_id, r.choice(doctors), name, dosage, frequency, f'{days} days' if days else None,
+                start, start + datetime.timedelta(days=days) if days else None, '', start, written,
+            ))
+
+        baselines = [(name, unit, r.gauss(typical, spread / 2), spread) for name, unit, typical, spread in METRICS]
+        for _ in range(around(options['metrics'])):
+            name, unit, baseline, spread = r.choice(baselines)
+            rows['metric'].append((
+                client_id, r.choice(staff), name, round(r.gauss(baseline, spread / 4), 1), unit,
+                moment_between(r, year_ago, anchor),
+            ))
+
+        for _ in range(around(options['encounters'])):
+            scheduled = moment_between(r, year_ago, soon)
+            duration = r.choice(DURATIONS)
+            if scheduled >= anchor:
+                status = 'Cancelled' if r.random() < 0.05 else 'Scheduled'
+            else:
+                status = r.choices(['Completed', 'No Show', 'Cancelled'], [85, 10, 5])[0]
+            rows['encounter'].append((
+                client_id, r.choice(staff), r.choice(ENCOUNTER_TYPES), scheduled, duration,
+                scheduled + datetime.timedelta(minutes=duration), status, '',
+                scheduled - datetime.timedelta(days=r.randrange(1, 30)),
+            ))
+    return rows
@@ -1,3 +1,1797 @@
-from django.test import TestCase
+import datetime
+import decimal
+import gzip
+import hashlib
+import hmac
+import http.server
+import json
+import logging
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.http import HttpResponse
+from django.db import connection
+from django.test import TestCase, SimpleTestCase, LiveServerTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from .models import User, HealthProgram, Client, Enrollment, Prescription, Metric, Encounter, EncounterSeries, Payment, MonthlyRevenue
+from .models import WebhookSubscription, OutboxMessage, ChangeLogEntry, AccessLog, ArchivedRecord
+from .apps import start_threads
+from .conditional import bump_table_version
+from .dashboard import compute_kpis, refresh_snapshot
+from .encoders import RowEncoder, full_name
+from .interactions import get_table, normalise
+from . import archive, audit, benchmark, changelog, errors, loadgen, logs, partitioning, synthetic, utilization, webhooks
+from .lookup import LRUCache, recent_lookups
+from .middleware import CompressionMiddleware, RequestIdMiddleware, choose_coding, parse_accept_encoding
+from .permissions import OwnershipRule, get_user_role, ownership_q
+from .renderers import ORJSONRenderer
+from .reports import REPORTS, Period
+from .revenue import rebuild_rollup
+from .serializers import ClientSerializer, EncounterSerializer, PrescriptionSerializer, ROW_ENCODER_CACHE_SIZE
+from .throttling import AtomicRateThrottle
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username,
+        password='testpass123',
+        employer_id=f'EMP-{username}',
+        work_email=f'{username}@hospital.test',
+        **extra
+    )
+
+
+def make_client(first_name='John', last_name='Doe'):
+    return Client.objects.create(
+        first_name=first_name,
+        last_name=last_name,
+        date_of_birth='1990-01-01',
+        gender='M'
+    )
+
+
+class PermissionTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.clerk = make_user('clerk')
+        self.other = make_user('other')
+        self.patient = make_client()
+        Prescription.objects.create(
+            client=self.patient, prescribed_by=self.doctor, medication_name='Aspirin',
+            dosage='100mg', frequency='daily', start_date='2024-01-01'
+        )
+        Prescription.objects.create(
+            client=self.patient, prescribed_by=self.clerk, medication_name='Ibuprofen',
+            dosage='200mg', frequency='daily', start_date='2024-01-01'
+        )
+
+    def test_staff_sees_all_prescriptions(self):
+        self.api.force_authenticate(user=self.doctor)
+        response = self.api.get(reverse('prescription-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_regular_user_sees_only_own_prescriptions(self):
+        self.api.force_authenticate(user=self.clerk)
+        response = self.api.get(reverse('prescription-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['medication_name'] for p in response.data], ['Ibuprofen'])
+
+    def test_program_list_for_regular_user(self):
+        created = HealthProgram.objects.create(name='Created', created_by=self.clerk)
+        enrolled = HealthProgram.objects.create(name='Enrolled', created_by=self.doctor)
+        HealthProgram.objects.create(name='Hidden', created_by=self.other)
+        Enrollment.objects.create(client=self.patient, program=enrolled, enrolled_by=self.clerk)
+        Enrollment.objects.create(client=make_client('Jane'), program=enrolled, enrolled_by=self.clerk)
+
+        self.api.force_authenticate(user=self.clerk)
+        response = self.api.get(reverse('program-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(p['id'] for p in response.data), [created.id, enrolled.id])
+
+    def test_list_encounters_for_regular_user(self):
+        Encounter.objects.create(client=self.patient, provider=self.clerk, scheduled_for=timezone.now())
+        Encounter.objects.create(client=self.patient, provider=self.other, scheduled_for=timezone.now())
+
+        self.api.force_authenticate(user=self.clerk)
+        response = self.api.get(reverse('list_encounters'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([e['provider'] for e in response.data['results']], ['clerk'])
+
+    def test_detail_views_hide_other_providers_rows(self):
+        mine = Encounter.objects.create(client=self.patient, provider=self.clerk, scheduled_for=timezone.now())
+        elsewhere = make_client('Jane')
+        theirs = Encounter.objects.create(client=elsewhere, provider=self.other, scheduled_for=timezone.now())
+        prescription = Prescription.objects.create(
+            client=elsewhere, prescribed_by=self.other, medication_name='Aspirin',
+            dosage='100mg', frequency='daily', start_date='2024-01-01'
+        )
+        self.api.force_authenticate(user=self.clerk)
+        for name, pk in (
+            ('client-detail', elsewhere.id),
+            ('client_comprehensive_info', elsewhere.id),
+            ('prescription-detail', prescription.id),
+            ('get_encounter', theirs.id),
+        ):
+            self.assertEqual(self.api.get(reverse(name, args=[pk])).status_code, status.HTTP_404_NOT_FOUND, name)
+        self.assertEqual(self.api.get(reverse('get_encounter', args=[mine.id])).status_code, status.HTTP_200_OK)
+        # Only the prescriptions the clerk may see are listed with a client they can see
+        response = self.api.get(reverse('client_comprehensive_info', args=[self.patient.id]))
+        self.assertEqual([p['medication_name'] for p in response.data['prescriptions']], ['Ibuprofen'])
+
+    def test_client_visible_through_related_records(self):
+        self.assertEqual(list(Client.objects.visible_to(self.clerk)), [self.patient])
+        self.assertEqual(list(Client.objects.visible_to(self.other)), [])
+
+    def test_role_and_conditions_are_memoised(self):
+        user = User.objects.get(pk=self.clerk.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_role(user), 'user')
+            first = ownership_q(Client, user)
+            self.assertIs(ownership_q(Client, user), first)
+
+    def test_invalid_ownership_path_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            OwnershipRule(Encounter, ('client__user',))
+        with self.assertRaises(ImproperlyConfigured):
+            OwnershipRule(Prescription, ('client',))
+
+
+class FixedRateThrottle(AtomicRateThrottle):
+    scope = 'test'
+
+    def __init__(self, rate, backend):
+        self.rate = rate
+        self.cache = backend
+
+    def get_rate(self, scope):
+        return self.rate
+
+
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = LocMemCache('throttle-tests', {})
+        self.request = SimpleNamespace(user=SimpleNamespace(pk=1, is_authenticated=True))
+
+    def test_concurrent_workers_never_exceed_limit(self):
+        throttle = FixedRateThrottle('500/hour', self.backend)
+        allowed = []
+        start = threading.Barrier(16)
+
+        def worker():
+            start.wait()
+            allowed.append(sum(throttle.allow_request(self.request, None) for _ in range(100)))
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 500)
+
+    def test_previous_window_is_weighted(self):
+        throttle = FixedRateThrottle('10/minute', self.backend)
+        with mock.patch('core.throttling.time.time', return_value=60 * 1000 + 59):
+            self.assertEqual(sum(throttle.allow_request(self.request, None) for _ in range(12)), 10)
+        # Half way through the next window half of the previous window still counts
+        with mock.patch('core.throttling.time.time', return_value=60 * 1001 + 30):
+            self.assertEqual(sum(throttle.allow_request(self.request, None) for _ in range(10)), 5)
+            self.assertEqual(throttle.wait(), 6)
+
+
+class EndpointThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(user=make_user('doctor', is_doctor=True))
+
+    def test_endpoint_limit_returns_retry_after(self):
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework['DEFAULT_THROTTLE_RATES'] = {'user': '1000/hour', 'client-list': '2/hour'}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for _ in range(2):
+                self.assertEqual(self.api.get(reverse('client-list')).status_code, status.HTTP_200_OK)
+            response = self.api.get(reverse('client-list'))
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertIn('Retry-After', response)
+            # Other endpoints are unaffected
+            self.assertEqual(self.api.get(reverse('program-list')).status_code, status.HTTP_200_OK)
+
+    def test_rejected_requests_do_not_count_against_other_limits(self):
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework['DEFAULT_THROTTLE_RATES'] = {'user': '3/hour', 'client-list': '1/hour'}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            self.assertEqual(self.api.get(reverse('client-list')).status_code, status.HTTP_200_OK)
+            for _ in range(3):
+                self.assertEqual(self.api.get(reverse('client-list')).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            # Only the allowed request used up the per-user limit
+            for _ in range(2):
+                self.assertEqual(self.api.get(reverse('program-list')).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.api.get(reverse('program-list')).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class RenderingTests(TestCase):
+    def test_orjson_matches_drf_json_renderer(self):
+        data = {
+            'date': datetime.date(2024, 1, 2),
+            'datetime': datetime.datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone.utc),
+            'decimal': decimal.Decimal('1.5'),
+            'nested': [{'name': 'Zoë', 'value': None}],
+            'separators': 'line\u2028paragraph\u2029',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_orjson_matches_drf_for_serialized_records(self):
+        doctor = make_user('doctor', is_doctor=True)
+        patient = make_client(first_name='Zoë')
+        program = HealthProgram.objects.create(name='Clinic', created_by=doctor)
+        # Microseconds and a non-UTC offset, stored and returned as UTC
+        scheduled_for = datetime.datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone(datetime.timedelta(hours=3)))
+        encounter = Encounter.objects.create(client=patient, provider=doctor, scheduled_for=scheduled_for)
+        prescription = Prescription.objects.create(
+            client=patient, prescribed_by=doctor, medication_name='Warfarin 5mg', dosage='5mg',
+            frequency='daily', start_date=datetime.date(2024, 1, 2), notes='With food\u2028twice daily',
+        )
+        api = APIClient()
+        api.force_authenticate(user=doctor)
+        responses = [
+            api.get(reverse('get_encounter', args=[encounter.id])),
+            api.get(reverse('prescription-detail', args=[prescription.id])),
+            api.post(reverse('record_payment'), {
+                'client_id': patient.id, 'program_id': program.id, 'amount': '12.50',
+                'paid_at': '2024-01-02T03:04:05.000678',
+            }, format='json'),
+        ]
+        for response in responses:
+            self.assertLess(response.status_code, 300)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+        # List rows come from value tuples and render as the serialized instances do
+        for serializer, queryset in ((EncounterSerializer, Encounter.objects.all()), (PrescriptionSerializer, Prescription.objects.all())):
+            self.assertEqual(
+                ORJSONRenderer().render(serializer().encode(queryset)),
+                JSONRenderer().render(serializer(queryset, many=True).data),
+            )
+
+    def test_row_encoder_builds_nested_rows(self):
+        doctor = make_user('doctor', is_doctor=True)
+        client = make_client()
+        metric = Metric.objects.create(client=client, recorded_by=doctor, name='Weight', value=70, unit='kg')
+        encoder = RowEncoder({
+            'id': 'id',
+            'client': {'id': 'client_id', 'name': full_name('client__')},
+            'name': ('name', str.upper),
+            'recorded_by': 'recorded_by__username',
+        })
+        with self.assertNumQueries(1):
+            rows = encoder.encode(Metric.objects.all())
+        self.assertEqual(rows, [{
+            'id': metric.id,
+            'client': {'id': client.id, 'name': 'John Doe'},
+            'name': 'WEIGHT',
+            'recorded_by': 'doctor',
+        }])
+
+    def test_metric_list_uses_single_query(self):
+        doctor = make_user('doctor', is_doctor=True)
+        for first_name in ('John', 'Jane', 'Jim'):
+            Metric.objects.create(client=make_client(first_name), recorded_by=doctor, name='Weight', value=70, unit='kg')
+        api = APIClient()
+        api.force_authenticate(user=doctor)
+        with self.assertNumQueries(1):
+            response = api.get(reverse('metric-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(sorted(m['client'] for m in response.json()), ['Jane Doe', 'Jim Doe', 'John Doe'])
+
+
+class SelectableFieldsTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True, first_name='Greg')
+        self.patient = make_client()
+        self.prescription = Prescription.objects.create(
+            client=self.patient, prescribed_by=self.doctor, medication_name='Amoxicillin',
+            dosage='500mg', frequency='3x daily', duration='7 days',
+            start_date='2024-01-01', end_date='2024-01-08'
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def test_sparse_fieldset(self):
+        response = self.api.get(reverse('prescription-list'), {'fields': 'id,medication_name'})
+        self.assertEqual(response.json(), [{'id': self.prescription.id, 'medication_name': 'Amoxicillin'}])
+
+    def test_expand_relation(self):
+        response = self.api.get(reverse('prescription-list'), {'fields': 'id,prescribed_by', 'expand': 'prescribed_by'})
+        self.assertEqual(response.json()[0]['prescribed_by'], {
+            'id': self.doctor.id, 'username': 'doctor', 'first_name': 'Greg', 'last_name': '', 'role': 'Doctor',
+        })
+
+    def test_unknown_field_is_rejected(self):
+        response = self.api.get(reverse('client-list'), {'fields': 'id,ssn'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+        response = self.api.get(reverse('client-list'), {'expand': 'program'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Views that answer their own errors still leave these to DRF
+        for url, params in (
+            (reverse('prescription-list'), {}),
+            (reverse('prescription-detail', args=[self.prescription.id]), {}),
+            (reverse('program-list'), {}),
+            (reverse('client-search'), {'q': 'Doe'}),
+        ):
+            response = self.api.get(url, {'fields': 'bogus', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+
+    def test_list_and_detail_agree(self):
+        listed = self.api.get(reverse('prescription-list'), {'expand': 'prescribed_by'}).json()[0]
+        with self.assertNumQueries(1):
+            detail = self.api.get(reverse('prescription-detail', args=[self.prescription.id])).json()
+        self.assertEqual(listed, detail)
+
+    def test_null_relation_is_none_in_list_and_detail(self):
+        Prescription.objects.filter(pk=self.prescription.pk).update(prescribed_by=None)
+        listed = self.api.get(reverse('prescription-list'), {'expand': 'prescribed_by'}).json()[0]
+        detail = self.api.get(reverse('prescription-detail', args=[self.prescription.id])).json()
+        self.assertIsNone(listed['prescribed_by'])
+        self.assertEqual(listed, detail)
+
+    def test_row_encoders_are_bounded(self):
+        names = ['id', 'medication_name', 'dosage', 'frequency', 'duration', 'start_date', 'end_date', 'notes', 'prescribed_date']
+        for i in range(1, 2 ** len(names)):
+            fields = [name for bit, name in enumerate(names) if i >> bit & 1]
+            PrescriptionSerializer(fields=fields).row_encoder()
+        self.assertEqual(len(PrescriptionSerializer._row_encoders), ROW_ENCODER_CACHE_SIZE)
+
+    def test_detail_reads_only_selected_columns(self):
+        serializer = ClientSerializer(fields=['id', 'gender'])
+        client = serializer.narrow(Client.objects.all()).get(pk=self.patient.pk)
+        self.assertEqual(client.get_deferred_fields() & {'id', 'gender'}, set())
+        self.assertIn('address', client.get_deferred_fields())
+
+
+class ClientLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        recent_lookups.clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.smith = make_client('John', 'Smith')
+        self.smithers = make_client('Anna', 'Smithers')
+        self.jones = make_client('Smita', 'Jones')
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def lookup(self, **params):
+        return self.api.get(reverse('client-lookup'), params)
+
+    def test_prefix_match_on_either_name(self):
+        response = self.lookup(q='smi')
+        self.assertEqual(response.json(), [
+            [self.jones.id, 'Smita Jones', '1990-01-01'],
+            [self.smith.id, 'John Smith', '1990-01-01'],
+            [self.smithers.id, 'Anna Smithers', '1990-01-01'],
+        ])
+        self.assertEqual([row[0] for row in self.lookup(q='smith j').json()], [self.smith.id])
+        self.assertEqual(self.lookup(q='mith').json(), [])
+
+    def test_limit(self):
+        self.assertEqual(len(self.lookup(limit=2).json()), 2)
+        self.assertEqual(self.lookup(limit=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.lookup(limit='all').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_repeated_lookup_is_served_from_memory(self):
+        self.lookup(q='smi')
+        with self.assertNumQueries(0):
+            self.lookup(q='smi')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_client('Smitty', 'Brown')
+        self.assertEqual(len(self.lookup(q='smi').json()), 4)
+
+    def test_restricted_user_only_sees_own_clients(self):
+        clerk = make_user('clerk')
+        Metric.objects.create(client=self.smith, recorded_by=clerk, name='Weight', value=70, unit='kg')
+        self.api.force_authenticate(user=clerk)
+        self.assertEqual([row[0] for row in self.lookup(q='smi').json()], [self.smith.id])
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+
+    def test_comprehensive_info_by_name(self):
+        Encounter.objects.create(client=self.smith, provider=self.doctor, scheduled_for=timezone.now())
+        url = reverse('client_comprehensive_info_by_name', args=['john', 'smith'])
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['client']['id'], self.smith.id)
+        self.assertEqual([row['scheduled_with'] for row in response.data['appointments']], ['doctor'])
+        namesake = make_client('John', 'Smith')
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['client_ids'], [self.smith.id, namesake.id])
+        missing = self.api.get(reverse('client_comprehensive_info_by_name', args=['jane', 'smith']))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def seed(self, size):
+        """Create size staff members, programs and medications, with activity for each."""
+        for i in range(size):
+            staff = make_user(f'staff{size}-{i}', is_nurse=True)
+            client = make_client(f'Client{size}-{i}')
+            program = HealthProgram.objects.create(name=f'Program {size}-{i}', description='', created_by=staff)
+            Enrollment.objects.create(client=client, program=program, enrolled_by=staff, is_active=i % 2 == 0)
+            Prescription.objects.create(
+                client=client, prescribed_by=staff, medication_name=f'Drug {size}-{i}',
+                dosage='1', frequency='daily', start_date=timezone.localdate()
+            )
+            Metric.objects.create(client=client, recorded_by=staff, name='Weight', value=70, unit='kg')
+            Encounter.objects.create(client=client, provider=staff, scheduled_for=timezone.now(), status='Completed')
+
+    def report(self, report_type, **params):
+        return self.api.get(reverse('generate-report'), dict(type=report_type, output='json', **params))
+
+    def test_query_count_is_constant(self):
+        for size in (1, 8):
+            self.seed(size)
+            for report_type in REPORTS:
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.report(report_type).status_code, status.HTTP_200_OK)
+
+    def test_program_enrollment(self):
+        self.seed(3)
+        data = self.report('program_enrollment').json()
+        self.assertEqual(data['summary'], {'total_enrollments': 3, 'active_enrollments': 2, 'completed_enrollments': 1})
+        self.assertEqual(data['program_breakdown'][0], {
+            'program': 'Program 3-0', 'total_enrollments': 1, 'active_enrollments': 1, 'completed_enrollments': 0,
+        })
+
+    def test_program_metrics_take_the_same_queries_for_any_number_of_programs(self):
+        counts = []
+        for size in (1, 4):
+            self.seed(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api.get(reverse('program-metrics'))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        Enrollment.objects.filter(program__name='Program 4-0').update(deleted_at=timezone.now())
+        rows = {row['program']: row for row in self.api.get(reverse('program-metrics')).json()}
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows['Program 4-1'], {
+            'program': 'Program 4-1', 'total_enrollments': 1, 'active_enrollments': 0,
+            'completed_enrollments': 1, 'completion_rate': 100.0,
+        })
+        self.assertEqual(rows['Program 4-0']['total_enrollments'], 0)
+
+    def test_staff_performance_counts_each_table_separately(self):
+        self.seed(2)
+        staff = User.objects.get(username='staff2-0')
+        for _ in range(2):
+            Metric.objects.create(client=Client.objects.first(), recorded_by=staff, name='Pulse', value=60, unit='bpm')
+        rows = {row['staff_member']: row for row in self.report('staff_performance').json()['staff_metrics']}
+        self.assertEqual(rows['staff2-0'], {'staff_member': 'staff2-0', 'encounters': 1, 'prescriptions': 1, 'metrics_recorded': 3})
+        self.assertEqual(rows['doctor']['encounters'], 0)
+
+    def test_date_window(self):
+        self.seed(1)
+        tomorrow = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        data = self.report('client_attendance', start_date=tomorrow).json()
+        self.assertEqual(data['summary']['total_encounters'], 0)
+        today = timezone.localdate().isoformat()
+        data = self.report('client_attendance', start_date=today, end_date=today).json()
+        self.assertEqual(data['summary']['completed_encounters'], 1)
+        response = self.report('client_attendance', start_date=tomorrow, end_date=today)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pdf_download(self):
+        self.seed(1)
+        response = self.api.get(reverse('generate-report'), {'type': 'prescription_usage'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(self.report('revenue').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RevenueTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.hiv = HealthProgram.objects.create(name='HIV', description='')
+        self.tb = HealthProgram.objects.create(name='TB', description='')
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def pay(self, program, amount, year, month, day=15):
+        paid_at = timezone.make_aware(datetime.datetime(year, month, day, 12))
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                client=self.patient, program=program, amount=decimal.Decimal(amount), recorded_by=self.doctor, paid_at=paid_at
+            )
+
+    def rollup(self):
+        return sorted(MonthlyRevenue.objects.values_list('program__name', 'month', 'total', 'payment_count'))
+
+    def report(self, **params):
+        return self.api.get(reverse('generate-report'), dict(type='revenue_analysis', output='json', **params)).json()
+
+    def test_rollup_follows_payment_writes(self):
+        payment = self.pay(self.hiv, '10.00', 2023, 12)
+        self.pay(self.hiv, '5.50', 2023, 12)
+        self.pay(self.tb, '7.00', 2024, 1)
+        self.assertEqual(self.rollup(), [
+            ('HIV', datetime.date(2023, 12, 1), decimal.Decimal('15.50'), 2),
+            ('TB', datetime.date(2024, 1, 1), decimal.Decimal('7.00'), 1),
+        ])
+        # Moving a payment refreshes the bucket it left as well as the new one
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.program = self.tb
+        payment.paid_at = timezone.make_aware(datetime.datetime(2024, 1, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+        self.assertEqual(self.rollup(), [
+            ('HIV', datetime.date(2023, 12, 1), decimal.Decimal('5.50'), 1),
+            ('TB', datetime.date(2024, 1, 1), decimal.Decimal('17.00'), 2),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.filter(program=self.hiv).delete()
+        self.assertEqual([row[0] for row in self.rollup()], ['TB'])
+        incremental = self.rollup()
+        self.assertEqual(rebuild_rollup(), 1)
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_report_reads_rollup_for_whole_months(self):
+        self.pay(self.hiv, '10.00', 2024, 1)
+        self.pay(self.tb, '20.00', 2024, 1)
+        self.pay(self.hiv, '30.00', 2024, 2)
+        self.pay(self.hiv, '99.00', 2024, 3)
+        with self.assertNumQueries(1):
+            data = self.report(start_date='2024-01-01', end_date='2024-02-29')
+        self.assertEqual(data['summary'], {'total_revenue': 60.0, 'payments': 3})
+        self.assertEqual(data['revenue_by_program'], [
+            {'program': 'HIV', 'revenue': 40.0, 'payments': 2},
+            {'program': 'TB', 'revenue': 20.0, 'payments': 1},
+        ])
+        self.assertEqual([row['month'] for row in data['revenue_by_month']], ['2024-01', '2024-02'])
+        # A partial month is summed from the payments themselves
+        self.assertEqual(self.report(start_date='2024-01-01', end_date='2024-02-14')['summary']['total_revenue'], 30.0)
+        self.assertEqual(self.report()['summary']['total_revenue'], 159.0)
+
+    def test_record_payment(self):
+        response = self.api.post(reverse('record_payment'), {
+            'client_id': self.patient.id, 'program_id': self.hiv.id, 'amount': '12.50',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Payment.objects.get().amount, decimal.Decimal('12.50'))
+        response = self.api.post(reverse('record_payment'), {
+            'client_id': self.patient.id, 'program_id': self.hiv.id, 'amount': '-1',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.api.delete(reverse('delete-program', args=[self.hiv.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @override_settings(TIME_ZONE='Africa/Nairobi')
+    def test_naive_paid_at_is_local_time(self):
+        for paid_at in ('2024-01-31T23:30:00', '2024-01-31T20:30:00Z'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.api.post(reverse('record_payment'), {
+                    'client_id': self.patient.id, 'program_id': self.hiv.id, 'amount': '1.00', 'paid_at': paid_at,
+                }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        late_evening = datetime.datetime(2024, 1, 31, 20, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(list(Payment.objects.values_list('paid_at', flat=True)), [late_evening, late_evening])
+        self.assertEqual(self.rollup(), [('HIV', datetime.date(2024, 1, 1), decimal.Decimal('2.00'), 2)])
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def test_snapshot_is_served_from_cache_until_refreshed(self):
+        response = self.api.get(reverse('dashboard-snapshot'))
+        data = response.json()
+        self.assertEqual(data['clients']['total'], 1)
+        self.assertEqual(data['staff'], {'doctors': 1, 'nurses': 0})
+        self.assertIn('generated_at', data)
+
+        make_client('Jane')
+        with self.assertNumQueries(0):
+            cached = self.api.get(reverse('dashboard-snapshot'))
+        self.assertEqual(cached.content, response.content)
+        with self.assertNumQueries(0):
+            response = self.api.get(reverse('dashboard-snapshot'), HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        call_command('refresh_dashboard_snapshot', stdout=StringIO())
+        self.assertEqual(self.api.get(reverse('dashboard-snapshot')).json()['clients']['total'], 2)
+
+    def test_stale_snapshot_is_recomputed_without_a_refresher(self):
+        self.api.get(reverse('dashboard-snapshot'))
+        make_client('Jane')
+        later = timezone.now() + datetime.timedelta(seconds=settings.DASHBOARD_SNAPSHOT_INTERVAL)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.api.get(reverse('dashboard-snapshot')).json()['clients']['total'], 2)
+
+    def test_threads_start_with_the_first_request(self):
+        with override_settings(DASHBOARD_SNAPSHOT_THREAD=True), \
+                mock.patch('core.dashboard.start_refresher') as start_refresher:
+            request_started.connect(start_threads, dispatch_uid='core-start-threads')
+            self.api.get(reverse('dashboard-snapshot'))
+            self.api.get(reverse('dashboard-snapshot'))
+        start_refresher.assert_called_once_with()
+
+    def test_kpis_use_one_query_per_table(self):
+        with self.assertNumQueries(8):
+            refresh_snapshot()
+
+    def test_restricted_to_medical_staff(self):
+        self.api.force_authenticate(user=make_user('clerk'))
+        response = self.api.get(reverse('dashboard-snapshot'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ResourceUtilizationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.nurse = make_user('nurse', is_nurse=True)
+        patient = make_client()
+        for day, encounter_status in ((1, 'Completed'), (2, 'Completed'), (3, 'Cancelled'), (5, 'Scheduled'), (9, 'Completed')):
+            Encounter.objects.create(
+                client=patient, provider=self.doctor, status=encounter_status,
+                scheduled_for=timezone.make_aware(datetime.datetime(2024, 1, day, 10)),
+            )
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    @override_settings(CLINIC_WORKING_DAYS=[0, 1, 2, 3, 4], CLINIC_OPENS_AT=8, CLINIC_CLOSES_AT=16)
+    def test_per_provider_slot_hours(self):
+        # Monday 1st to Sunday 7th: five working days of eight hours
+        with self.assertNumQueries(3):
+            response = self.api.get(reverse('resource-utilization'), {'start_date': '2024-01-01', 'end_date': '2024-01-07'})
+        data = response.json()
+        self.assertEqual(data['window']['available_hours_per_provider'], 40)
+        self.assertEqual(data['appointment_utilization'], {
+            'total_slots': 4, 'booked_slots': 3, 'utilized_slots': 2, 'no_shows': 0, 'utilization_rate': 66.67,
+        })
+        self.assertEqual(data['staff_utilization'], {'total_staff': 2, 'active_staff': 2, 'utilization_rate': 100.0})
+        self.assertEqual(data['providers'], [
+            {'provider_id': self.doctor.id, 'provider': 'doctor', 'role': 'Doctor', 'booked_hours': 1.5,
+             'completed_hours': 1.0, 'available_hours': 40, 'utilization_rate': 3.75},
+            {'provider_id': self.nurse.id, 'provider': 'nurse', 'role': 'Nurse', 'booked_hours': 0.0,
+             'completed_hours': 0.0, 'available_hours': 40, 'utilization_rate': 0.0},
+        ])
+
+    def test_conditional_get_follows_writes_and_the_date(self):
+        url = reverse('resource-utilization')
+        etag = self.api.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # The default window ends today
+        with mock.patch('django.utils.timezone.localdate', return_value=timezone.localdate() + datetime.timedelta(days=1)):
+            self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            Encounter.objects.update(status='Completed')
+            bump_table_version('core.Encounter')
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_window_validation(self):
+        self.assertEqual(self.api.get(reverse('resource-utilization')).status_code, status.HTTP_200_OK)
+        response = self.api.get(reverse('resource-utilization'), {'start_date': '2024-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CLINIC_WORKING_DAYS=[0, 1, 2, 3, 4], CLINIC_OPENS_AT=8, CLINIC_CLOSES_AT=16, MAX_ENCOUNTER_MINUTES=480)
+class SchedulingTests(TestCase):
+    # 2030-01-07 is a Monday
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def at(self, hour, minute=0, day=7):
+        return timezone.make_aware(datetime.datetime(2030, 1, day, hour, minute))
+
+    def create(self, hour, minute=0, **extra):
+        return self.api.post(reverse('create_encounter'), dict(
+            client_id=self.patient.id, scheduled_for=self.at(hour, minute).isoformat(), **extra
+        ), format='json')
+
+    def test_overlapping_booking_is_refused(self):
+        first = self.create(9, duration=60)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        response = self.create(9, 30)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['conflicts'], [first.json()['id']])
+        # Back to back is fine, and cancelled encounters free their slot
+        self.assertEqual(self.create(10).status_code, status.HTTP_201_CREATED)
+        Encounter.objects.filter(pk=first.json()['id']).update(status='Cancelled')
+        self.assertEqual(self.create(9, 15).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.create(11, duration=0).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_long_encounter_blocks_later_start(self):
+        self.assertEqual(self.create(8, duration=480).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.create(15, 30).status_code, status.HTTP_409_CONFLICT)
+
+    def test_availability_sweeps_bookings(self):
+        for hour, minute, duration in ((9, 0, 30), (9, 15, 45), (12, 0, 30)):
+            Encounter.objects.create(client=self.patient, provider=self.doctor, scheduled_for=self.at(hour, minute), duration=duration)
+        Encounter.objects.create(client=self.patient, provider=self.doctor, scheduled_for=self.at(14), status='Cancelled')
+        # Provider, bookings and the recurring encounters not stored yet
+        with self.assertNumQueries(3):
+            response = self.api.get(reverse('provider-availability', args=[self.doctor.id]), {
+                'start_date': '2030-01-07', 'end_date': '2030-01-08', 'slot_minutes': 60,
+            })
+        data = response.json()
+        self.assertEqual(data['free'][:3], [
+            {'start': '2030-01-07T08:00:00Z', 'end': '2030-01-07T09:00:00Z'},
+            {'start': '2030-01-07T10:00:00Z', 'end': '2030-01-07T12:00:00Z'},
+            {'start': '2030-01-07T12:30:00Z', 'end': '2030-01-07T16:00:00Z'},
+        ])
+        self.assertEqual(data['free'][3], {'start': '2030-01-08T08:00:00Z', 'end': '2030-01-08T16:00:00Z'})
+        # 1 + 2 + 3 one-hour slots on Monday, 8 on Tuesday
+        self.assertEqual(len(data['slots']), 14)
+
+    def test_weekend_has_no_availability(self):
+        response = self.api.get(reverse('provider-availability', args=[self.doctor.id]), {
+            'start_date': '2030-01-05', 'end_date': '2030-01-06',
+        })
+        self.assertEqual(response.json()['free'], [])
+        response = self.api.get(reverse('provider-availability', args=[self.doctor.id]), {
+            'start_date': '2030-01-01', 'end_date': '2030-03-01',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EncounterListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.nurse = make_user('nurse', is_nurse=True)
+        self.patient = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+        # Within the series horizon, so reads never need to materialise
+        self.day = timezone.localdate() + datetime.timedelta(days=1)
+        self.next_day = (self.day + datetime.timedelta(days=1)).isoformat()
+        start = timezone.make_aware(datetime.datetime.combine(self.day, datetime.time(9)))
+        # Pairs at the same time, so pages must break ties on id
+        self.encounters = [
+            Encounter.objects.create(
+                client=self.patient, provider=provider, scheduled_for=start + datetime.timedelta(days=n // 2),
+                status='Completed' if n % 3 == 0 else 'Scheduled',
+            )
+            for n, provider in enumerate([self.doctor, self.nurse] * 3)
+        ]
+
+    def test_keyset_pages_cover_every_encounter_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 4, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(1):
+                data = self.api.get(reverse('list_encounters'), params).json()
+            seen += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [e.id for e in self.encounters])
+
+    def test_filters(self):
+        def ids(**params):
+            return [row['id'] for row in self.api.get(reverse('list_encounters'), params).json()['results']]
+        self.assertEqual(ids(provider=self.nurse.id), [e.id for e in self.encounters[1::2]])
+        self.assertEqual(ids(status='Completed'), [self.encounters[0].id, self.encounters[3].id])
+        self.assertEqual(ids(start_date=self.next_day, end_date=self.next_day), [e.id for e in self.encounters[2:4]])
+        self.assertEqual(ids(encounter_type='Emergency'), [])
+        for params in ({'status': 'Lost'}, {'start_date': 'soon'}, {'limit': 1000}, {'cursor': 'nonsense'}):
+            response = self.api.get(reverse('list_encounters'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_todays_clinic_is_cached_per_provider_day(self):
+        url = reverse('todays-clinic')
+        params = {'provider': self.nurse.id, 'date': self.day.isoformat()}
+        self.assertEqual([row['id'] for row in self.api.get(url, params).json()['encounters']], [self.encounters[1].id])
+        with self.assertNumQueries(0):
+            self.api.get(url, params)
+        # Moving an encounter onto the day clears it, and the day it left
+        moved = self.encounters[3]
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.scheduled_for = self.encounters[1].scheduled_for + datetime.timedelta(hours=1)
+            moved.save()
+        self.assertEqual([row['id'] for row in self.api.get(url, params).json()['encounters']], [
+            self.encounters[1].id, moved.id,
+        ])
+        self.assertEqual(self.api.get(url, {**params, 'date': self.next_day}).json()['encounters'], [])
+
+    def test_todays_clinic_of_another_provider_needs_staff(self):
+        clerk = make_user('clerk')
+        self.api.force_authenticate(user=clerk)
+        response = self.api.get(reverse('todays-clinic'), {'provider': self.nurse.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.api.get(reverse('todays-clinic')).json()['encounters'], [])
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+        self.monday = timezone.localdate() - datetime.timedelta(days=timezone.localdate().weekday()) + datetime.timedelta(days=7)
+
+    def at(self, day, hour=9):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+    def create(self, **rule):
+        return self.api.post(reverse('create-encounter-series'), dict(
+            client_id=self.patient.id, scheduled_for=self.at(self.monday).isoformat(), **rule
+        ), format='json')
+
+    @override_settings(SERIES_HORIZON_DAYS=28)
+    def test_series_is_booked_up_to_horizon_in_bulk(self):
+        # Client, lock, series insert, bookings range, bulk insert, webhook subscriptions, change log,
+        # series update, plus savepoints
+        with self.assertNumQueries(10):
+            response = self.create(frequency='Weekly', count=10)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        booked = Encounter.objects.filter(series_id=response.json()['id']).order_by('scheduled_for')
+        horizon = timezone.now() + datetime.timedelta(days=28)
+        weekly = [self.at(self.monday + datetime.timedelta(weeks=n)) for n in range(10)]
+        self.assertEqual([e.scheduled_for for e in booked], [moment for moment in weekly if moment < horizon])
+        self.assertEqual(booked[0].ends_at, self.at(self.monday) + datetime.timedelta(minutes=30))
+
+        # Reading past the horizon lists the rest, up to the count, without storing them
+        stored = Encounter.objects.count()
+        end = (self.monday + datetime.timedelta(weeks=20)).isoformat()
+        seen, cursor = [], None
+        while True:
+            params = {'end_date': end, 'limit': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.api.get(reverse('list_encounters'), params).json()
+            seen += data['results']
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual([datetime.datetime.fromisoformat(row['scheduled_for']) for row in seen], weekly)
+        self.assertEqual([row['id'] for row in seen[stored:]], [None] * (10 - stored))
+        self.assertEqual({row['series'] for row in seen}, {response.json()['id']})
+        self.assertEqual(Encounter.objects.count(), stored)
+        self.assertIsNotNone(EncounterSeries.objects.get().next_occurrence)
+
+        # The calendar shows them too
+        far = self.monday + datetime.timedelta(weeks=9)
+        day = self.api.get(reverse('todays-clinic'), {'date': far.isoformat()}).json()['encounters']
+        self.assertEqual([(row['id'], row['scheduled_for']) for row in day], [(None, f'{far.isoformat()}T09:00:00Z')])
+        self.assertEqual(Encounter.objects.count(), stored)
+
+    def test_conflicting_series_is_refused(self):
+        taken = Encounter.objects.create(
+            client=self.patient, provider=self.doctor, scheduled_for=self.at(self.monday + datetime.timedelta(days=14))
+        )
+        response = self.create(frequency='Daily', interval=7, until=(self.monday + datetime.timedelta(days=21)).isoformat())
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['conflicts'], [taken.id])
+        self.assertFalse(EncounterSeries.objects.exists())
+        self.assertEqual(Encounter.objects.count(), 1)
+        self.assertEqual(self.create(interval=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.create(frequency='Monthly').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SERIES_HORIZON_DAYS=7)
+    def test_extension_skips_slots_booked_meanwhile(self):
+        self.create(count=4)
+        taken = Encounter.objects.create(
+            client=self.patient, provider=self.doctor, scheduled_for=self.at(self.monday + datetime.timedelta(weeks=2))
+        )
+        out = StringIO()
+        with override_settings(SERIES_HORIZON_DAYS=60):
+            call_command('extend_encounter_series', stdout=out)
+        self.assertIn('recurring encounters', out.getvalue())
+        self.assertEqual(
+            list(Encounter.objects.exclude(pk=taken.pk).order_by('scheduled_for').values_list('scheduled_for', flat=True)),
+            [self.at(self.monday + datetime.timedelta(weeks=n)) for n in (0, 1, 3)],
+        )
+
+    @override_settings(SERIES_HORIZON_DAYS=7, SERIES_READ_LIMIT=1, CLINIC_WORKING_DAYS=[0, 1, 2, 3, 4],
+                       CLINIC_OPENS_AT=8, CLINIC_CLOSES_AT=16)
+    def test_reads_past_the_horizon_only_store_what_the_user_may_list(self):
+        self.assertEqual(self.create(count=10).status_code, status.HTTP_201_CREATED)
+        nurse = make_user('nurse', is_nurse=True)
+        self.api.force_authenticate(user=nurse)
+        self.assertEqual(self.create(count=10).status_code, status.HTTP_201_CREATED)
+        stored = Encounter.objects.count()
+        far = self.monday + datetime.timedelta(weeks=5)
+        params = {'start_date': far.isoformat(), 'end_date': far.isoformat()}
+
+        # Availability counts the later occurrences as booked without storing them
+        free = self.api.get(reverse('provider-availability', args=[self.doctor.id]), params).json()['free']
+        self.assertEqual(
+            [datetime.datetime.fromisoformat(span['start']) for span in free],
+            [self.at(far, 8), self.at(far) + datetime.timedelta(minutes=30)],
+        )
+        self.assertEqual(Encounter.objects.count(), stored)
+
+        # Nor does anyone listing series they cannot see
+        self.api.force_authenticate(user=make_user('clerk'))
+        self.assertEqual(self.api.get(reverse('list_encounters'), params).json()['results'], [])
+        self.assertEqual(Encounter.objects.count(), stored)
+
+        # More series than a request may extend
+        self.api.force_authenticate(user=self.doctor)
+        self.assertEqual(self.api.get(reverse('list_encounters'), params).status_code, status.HTTP_400_BAD_REQUEST)
+        listed = self.api.get(reverse('list_encounters'), {**params, 'provider': self.doctor.id}).json()['results']
+        self.assertEqual([row['provider'] for row in listed], ['doctor'])
+
+
+class ActiveMedicationTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.other = make_client('Jane')
+        self.ward = HealthProgram.objects.create(name='Ward 3', description='', created_by=self.doctor)
+        Enrollment.objects.create(client=self.patient, program=self.ward, enrolled_by=self.doctor)
+        self.today = timezone.localdate()
+        day = datetime.timedelta(days=1)
+        self.open_ended, self.current, self.ended, self.future, self.elsewhere = [
+            Prescription.objects.create(
+                client=client, prescribed_by=self.doctor, medication_name=name, dosage='1', frequency='daily',
+                start_date=start, end_date=end,
+            )
+            for client, name, start, end in (
+                (self.patient, 'Metformin', self.today - 30 * day, None),
+                (self.patient, 'Amoxicillin', self.today - 2 * day, self.today + 5 * day),
+                (self.patient, 'Ibuprofen', self.today - 10 * day, self.today - day),
+                (self.patient, 'Statin', self.today + 3 * day, None),
+                (self.other, 'Insulin', self.today - day, None),
+            )
+        ]
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def test_client_medication_list(self):
+        with self.assertNumQueries(2):
+            response = self.api.get(reverse('client-active-medications', args=[self.patient.id]))
+        medications = response.json()['medications']
+        self.assertEqual([m['medication_name'] for m in medications], ['Metformin', 'Amoxicillin'])
+        self.assertNotIn('client', medications[0])
+        on = (self.today + datetime.timedelta(days=4)).isoformat()
+        response = self.api.get(reverse('client-active-medications', args=[self.patient.id]), {'on': on})
+        self.assertEqual([m['id'] for m in response.json()['medications']], [self.open_ended.id, self.current.id, self.future.id])
+        self.assertEqual(self.api.get(reverse('client-active-medications', args=[999])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_etag_expires_at_midnight(self):
+        url = reverse('client-active-medications', args=[self.patient.id])
+        etag = self.api.get(url)['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        tomorrow = self.today + datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=tomorrow):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['on'], tomorrow.isoformat())
+            etag = self.api.get(reverse('active-prescriptions'))['ETag']
+        self.assertEqual(self.api.get(reverse('active-prescriptions'), HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+    def test_ward_window(self):
+        with self.assertNumQueries(1):
+            response = self.api.get(reverse('active-prescriptions'), {'program': self.ward.id})
+        self.assertEqual({p['id'] for p in response.json()['prescriptions']}, {self.open_ended.id, self.current.id})
+        yesterday = (self.today - datetime.timedelta(days=1)).isoformat()
+        response = self.api.get(reverse('active-prescriptions'), {'start_date': yesterday})
+        self.assertEqual(
+            {p['id'] for p in response.json()['prescriptions']},
+            {self.open_ended.id, self.current.id, self.ended.id, self.elsewhere.id},
+        )
+        self.assertEqual(self.api.get(reverse('active-prescriptions'), {'program': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class InteractionTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.warfarin = Prescription.objects.create(
+            client=self.patient, prescribed_by=self.doctor, medication_name='Warfarin 5mg', dosage='5mg',
+            frequency='daily', start_date=timezone.localdate(),
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def prescribe(self, name, **extra):
+        return self.api.post(reverse('create_prescription'), dict(
+            client_id=self.patient.id, medication_name=name, dosage='1', frequency='daily',
+            start_date=timezone.localdate().isoformat(), **extra
+        ), format='json')
+
+    def test_major_interaction_needs_acknowledgement(self):
+        response = self.prescribe('ASPIRIN 75 mg')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['interactions'][0]['other'], 'Warfarin 5mg')
+        self.assertEqual(response.json()['interactions'][0]['severity'], 'major')
+        response = self.prescribe('Aspirin 75 mg', acknowledge_interactions=True)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()['interactions']), 1)
+        # Minor interactions are reported without blocking
+        response = self.prescribe('Paracetamol')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['interactions'][0]['severity'], 'minor')
+
+    def test_ended_prescriptions_and_renames(self):
+        self.warfarin.end_date = timezone.localdate() - datetime.timedelta(days=1)
+        self.warfarin.start_date = self.warfarin.end_date
+        self.warfarin.save()
+        self.assertEqual(self.prescribe('Ibuprofen').status_code, status.HTTP_201_CREATED)
+        ibuprofen = Prescription.objects.get(medication_name='Ibuprofen')
+        Prescription.objects.filter(pk=self.warfarin.pk).update(end_date=None)
+        response = self.api.put(reverse('update-prescription', args=[ibuprofen.id]), {'medication_name': 'Naproxen'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # The prescription never interacts with itself
+        response = self.api.put(reverse('update-prescription', args=[self.warfarin.id]), {'medication_name': 'Warfarin'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_normalise_keeps_names_that_start_with_a_number(self):
+        self.assertEqual(normalise('Warfarin 5mg tablets'), 'warfarin')
+        self.assertEqual(normalise('ASPIRIN 75 mg'), 'aspirin')
+        self.assertEqual(normalise('Co-amoxiclav 500/125mg'), 'co-amoxiclav')
+        self.assertEqual(normalise('5-FU'), '5-fu')
+        self.assertEqual(normalise('6-Mercaptopurine 50mg tablets'), '6-mercaptopurine')
+        self.assertEqual(normalise('Vitamin B12'), 'vitamin b12')
+
+    def test_reference_file_is_reloaded(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'interactions.csv'
+        path.write_text('drug_a,drug_b,severity,description\nalpha,beta,moderate,Test\n')
+        with override_settings(DRUG_INTERACTIONS_FILE=path):
+            self.assertEqual(len(get_table().check('Alpha 1mg', ['beta'])), 1)
+            path.write_text('drug_a,drug_b,severity,description\nalpha,gamma,major,Test\n')
+            self.assertEqual(get_table().check('Alpha', ['beta']), [])
+            # A broken file keeps the previous table
+            path.write_text('drug_a,drug_b,severity,description\nalpha,delta,deadly,Test\n')
+            with self.assertLogs('core.interactions', 'ERROR'):
+                self.assertEqual(len(get_table().check('alpha', ['gamma'])), 1)
+
+
+class SeedScaleTests(TestCase):
+    def test_generates_related_rows_in_bulk(self):
+        out = StringIO()
+        call_command(
+            'seed_scale', clients=30, metrics_per_client=5, workers=2, anchor=datetime.date(2030, 1, 1), stdout=out
+        )
+        self.assertEqual(Client.objects.count(), 30)
+        self.assertIn(f'{Metric.objects.count():,} metrics', out.getvalue())
+        # Generated timestamps are kept rather than stamped with the insert time
+        times = Metric.objects.values_list('recorded_at', flat=True)
+        self.assertLess(min(times), max(times) - datetime.timedelta(days=30))
+        encounter = Encounter.objects.first()
+        self.assertEqual(encounter.ends_at, encounter.scheduled_for + datetime.timedelta(minutes=encounter.duration))
+        doctor = User.objects.filter(is_doctor=True).first()
+        self.assertTrue(doctor.check_password('testpass123'))
+        self.assertTrue(Prescription.objects.filter(prescribed_by__is_doctor=True).exists())
+
+    def test_rows_depend_only_on_the_seed(self):
+        anchor = timezone.make_aware(datetime.datetime(2030, 1, 1))
+        task = (7, 0, [1, 2, 3], [10], [11], [20, 21], {'metrics': 4, 'prescriptions': 2, 'encounters': 2}, anchor)
+        first = synthetic.generate((synthetic.activity_rows, task, False))
+        self.assertEqual(first, synthetic.generate((synthetic.activity_rows, task, False)))
+        count, text = synthetic.generate((synthetic.activity_rows, task, True))['prescription']
+        self.assertEqual(count, first['prescription'][0])
+        self.assertEqual(len(text.splitlines()), count)
+
+
+class BenchmarkTests(TestCase):
+    def test_every_route_has_a_case(self):
+        self.assertEqual(benchmark.uncovered(), [])
+
+    def test_runs_and_compares_against_a_baseline(self):
+        only = ['client-list', 'metric-detail', 'record_metric']
+        results = {'5': benchmark.run_scale(5, repeat=1, only=only)}
+        self.assertCountEqual(results['5'], only)
+        self.assertEqual(results['5']['record_metric']['status'], status.HTTP_201_CREATED)
+        self.assertEqual(benchmark.compare(results, results, tolerance=0), [])
+        # Nothing written by the run is kept
+        self.assertFalse(Client.objects.exists())
+
+        slower = {'5': {key: dict(figures) for key, figures in results['5'].items()}}
+        slower['5']['client-list']['queries'] += 1
+        slower['5']['metric-detail']['ms'] = results['5']['metric-detail']['ms'] * 2 + 10
+        regressions = benchmark.compare(results, slower, tolerance=0.5)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('client-list @ 5 clients', regressions[0])
+
+    def test_pinned_query_counts_are_checked_without_a_baseline(self):
+        results = {'5': benchmark.run_scale(5, repeat=1, only=['program-metrics'])}
+        self.assertEqual(results['5']['program-metrics']['queries'], results['5']['program-metrics']['pinned_queries'])
+        self.assertEqual(benchmark.compare({}, results, tolerance=0), [])
+        results['5']['program-metrics']['queries'] += 1
+        self.assertEqual(len(benchmark.compare({}, results, tolerance=0)), 1)
+
+
+class LoadGeneratorTests(SimpleTestCase):
+    def test_mix_and_percentiles(self):
+        self.assertEqual(loadgen.parse_mix('search=5,login=0')['search'], 5)
+        self.assertEqual(loadgen.parse_mix('')['open_chart'], loadgen.DEFAULT_MIX['open_chart'])
+        with self.assertRaises(ValueError):
+            loadgen.parse_mix('surgery=3')
+        ordered = list(range(1, 101))
+        self.assertEqual(loadgen.percentile(ordered, 0.5), 50)
+        self.assertEqual(loadgen.percentile(ordered, 0.99), 99)
+        self.assertEqual(loadgen.percentile([], 0.5), 0.0)
+
+    def test_saturation_search_brackets_the_limit(self):
+        tried = []
+
+        def probe(rps):
+            tried.append(rps)
+            return rps <= 130
+        best = loadgen.find_saturation(probe, 10, 1000)
+        self.assertLessEqual(best, 130)
+        self.assertGreater(best, 130 * 0.9)
+        self.assertEqual(tried[:5], [10, 20, 40, 80, 160])
+        self.assertEqual(loadgen.find_saturation(lambda rps: True, 10, 50), 50)
+        self.assertEqual(loadgen.find_saturation(lambda rps: False, 10, 50), 0)
+
+
+@override_settings(AUDIT_ASYNC=False)
+class LoadGeneratorServerTests(LiveServerTestCase):
+    def test_clinician_works_through_the_mix(self):
+        make_user(synthetic.staff_username(1, 0), is_doctor=True)
+        make_client(first_name='Grace')
+        stats = loadgen.Stats()
+        clinicians = loadgen.sign_in(f'{self.live_server_url}/api', 1, seed=1, staff=1, password='testpass123', stats=stats)
+        self.assertIsNotNone(clinicians[0].token)
+        try:
+            clinicians[0].client_ids = list(Client.objects.values_list('pk', flat=True))
+            summary = loadgen.run_users(clinicians, duration=1, mix=loadgen.DEFAULT_MIX, think=0)
+        finally:
+            clinicians[0].close()
+        self.assertGreater(summary['all']['requests'], 5)
+        self.assertEqual(summary['all']['error_rate'], 0)
+        self.assertEqual(Metric.objects.count(), summary.get('record_metric', {}).get('requests', 0))
+
+
+class StandInReceiver(http.server.BaseHTTPRequestHandler):
+    """Webhook receiver for the tests: records each POST and answers with the next queued status."""
+    received = []
+    statuses = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.received.append((self.path, dict(self.headers), body))
+        self.send_response(self.statuses.pop(0) if self.statuses else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInReceiver)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInReceiver.received = []
+        StandInReceiver.statuses = []
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+        self.patient = make_client()
+        self.pharmacy = WebhookSubscription.objects.create(
+            name='Pharmacy', url=f'{self.base_url}/pharmacy/', secret='s3cret', events=['prescription.created'],
+        )
+        self.dispatcher = webhooks.Dispatcher(concurrency=2)
+        self.addCleanup(self.dispatcher.close)
+
+    def prescribe(self, medication='Amoxicillin'):
+        return self.api.post(reverse('create_prescription'), {
+            'client_id': self.patient.id, 'medication_name': medication, 'dosage': '500mg',
+            'frequency': 'Three times daily', 'start_date': '2030-01-01',
+        }, format='json')
+
+    def test_events_are_queued_with_the_change_and_delivered_later(self):
+        response = self.prescribe()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.event, message.status), ('prescription.created', 'pending'))
+        self.assertEqual(message.payload['id'], response.data['id'])
+        # The request did not wait for delivery
+        self.assertEqual(StandInReceiver.received, [])
+
+        self.assertEqual(self.dispatcher.run_once(), 1)
+        path, headers, body = StandInReceiver.received[0]
+        self.assertEqual(path, '/pharmacy/')
+        self.assertEqual(headers['X-HealthHub-Delivery'], str(message.pk))
+        expected = hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-HealthHub-Signature'], f'sha256={expected}')
+        self.assertEqual(json.loads(body)['data']['medication_name'], 'Amoxicillin')
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'delivered')
+        self.assertEqual(self.dispatcher.run_once(), 0)
+
+    def test_only_subscribed_events_are_queued(self):
+        encounter = Encounter.objects.create(
+            client=self.patient, provider=self.doctor,
+            scheduled_for=timezone.make_aware(datetime.datetime(2030, 1, 7, 9)),
+        )
+        self.assertFalse(OutboxMessage.objects.exists())
+        WebhookSubscription.objects.create(name='Lab', url=f'{self.base_url}/lab/')
+        encounter.save()
+        self.assertEqual(list(OutboxMessage.objects.values_list('event', flat=True)), ['encounter.updated'])
+
+    def test_failure_holds_back_later_events_until_retried(self):
+        self.prescribe('Amoxicillin')
+        self.prescribe('Paracetamol')
+        StandInReceiver.statuses = [503]
+        self.assertEqual(self.dispatcher.run_once(), 0)
+        first, second = OutboxMessage.objects.order_by('id')
+        self.assertEqual((first.status, first.attempts, first.last_error), ('pending', 1, 'HTTP 503'))
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        # Not due yet: nothing is sent, and the second event waits its turn
+        self.assertEqual(self.dispatcher.run_once(), 0)
+        self.assertEqual(len(StandInReceiver.received), 1)
+
+        OutboxMessage.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.dispatcher.run_once(), 2)
+        medications = [json.loads(body)['data']['medication_name'] for _, _, body in StandInReceiver.received]
+        self.assertEqual(medications, ['Amoxicillin', 'Amoxicillin', 'Paracetamol'])
+
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        self.prescribe('Amoxicillin')
+        self.prescribe('Paracetamol')
+        StandInReceiver.statuses = [500]
+        self.assertEqual(self.dispatcher.run_once(), 0)
+        self.assertEqual(self.dispatcher.run_once(), 1)
+        self.assertEqual(
+            list(OutboxMessage.objects.order_by('id').values_list('status', flat=True)), ['failed', 'delivered']
+        )
+
+    def test_leased_subscriptions_are_left_to_their_dispatcher(self):
+        self.prescribe()
+        leased = WebhookSubscription.objects.filter(pk=self.pharmacy.pk)
+        leased.update(leased_until=timezone.now() + datetime.timedelta(minutes=1))
+        self.assertEqual(self.dispatcher.run_once(), 0)
+        self.assertEqual(StandInReceiver.received, [])
+        # A lease left by a dispatcher that died runs out and is taken over
+        leased.update(leased_until=timezone.now())
+        self.assertEqual(self.dispatcher.run_once(), 1)
+        self.assertIsNone(leased.get().leased_until)
+
+    def test_subscriptions_are_delivered_in_one_round(self):
+        WebhookSubscription.objects.create(name='Lab', url=f'{self.base_url}/lab/', events=['prescription.created'])
+        WebhookSubscription.objects.create(name='Old', url=f'{self.base_url}/old/', is_active=False)
+        with self.assertNumQueries(8):
+            self.prescribe()
+        self.assertEqual(self.dispatcher.run_once(), 2)
+        self.assertEqual(sorted(path for path, _, _ in StandInReceiver.received), ['/lab/', '/pharmacy/'])
+
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def feed(self, **params):
+        response = self.api.get(reverse('change-feed'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def sync(self, **params):
+        """Replay the whole feed into {(table, id): row} like a consumer would."""
+        rows, cursor = {}, 0
+        while True:
+            page = self.feed(since=cursor, **params)
+            for change in page['changes']:
+                if change['action'] == 'delete':
+                    rows.pop((change['table'], change['id']), None)
+                else:
+                    rows[change['table'], change['id']] = change['data']
+            cursor = page['next_cursor']
+            if not page['has_more']:
+                return rows, cursor
+
+    def test_pages_through_inserts_updates_and_deletes(self):
+        patient = make_client()
+        metric = Metric.objects.create(client=patient, recorded_by=self.doctor, name='Weight', value=70, unit='kg')
+        patient.first_name = 'Jon'
+        patient.save()
+        metric.delete()
+        page = self.feed(limit=2)
+        self.assertEqual([c['action'] for c in page['changes']], ['insert', 'insert'])
+        self.assertTrue(page['has_more'])
+        rest = self.feed(since=page['next_cursor'])
+        self.assertEqual([(c['table'], c['action']) for c in rest['changes']], [('client', 'update'), ('metric', 'delete')])
+        self.assertFalse(rest['has_more'])
+
+        rows, cursor = self.sync(limit=1)
+        self.assertEqual(list(rows), [('client', patient.id)])
+        self.assertEqual(rows['client', patient.id]['first_name'], 'Jon')
+        self.assertEqual(self.feed(since=cursor)['changes'], [])
+        self.assertEqual(len(self.feed(tables='metric')['changes']), 2)
+        self.assertEqual(self.api.get(reverse('change-feed'), {'tables': 'payment'}).status_code, 400)
+
+    def test_stops_at_unsettled_changes(self):
+        make_client()
+        ChangeLogEntry.objects.filter(table='client').update(changed_at=timezone.now() + datetime.timedelta(minutes=1))
+        make_client('Jane')
+        ChangeLogEntry.objects.filter(table='client', changed_at__lte=timezone.now()).update(
+            changed_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        # The second entry is settled, but must not be served before the first
+        page = self.feed()
+        self.assertEqual((page['changes'], page['next_cursor'], page['has_more']), ([], 0, False))
+
+    def test_compaction_keeps_the_latest_state(self):
+        kept = make_client()
+        for name in ('A', 'B', 'C'):
+            kept.first_name = name
+            kept.save()
+        gone, recent = make_client('Gone'), make_client('Recent')
+        recent_id = recent.id
+        gone.delete()
+        recent.delete()
+        ChangeLogEntry.objects.exclude(object_id=recent_id).update(changed_at=timezone.now() - datetime.timedelta(days=30))
+        before, _ = self.sync()
+        self.assertEqual(changelog.compact(batch_size=2), 5)
+        self.assertEqual(self.sync(), (before, ChangeLogEntry.objects.order_by('pk').last().pk))
+        self.assertEqual(ChangeLogEntry.objects.filter(object_id=kept.id).get().data['first_name'], 'C')
+        self.assertEqual(ChangeLogEntry.objects.filter(object_id=recent_id).count(), 2)
+
+    def test_cascade_is_logged_with_one_insert(self):
+        program = HealthProgram.objects.create(name='HIV', created_by=self.doctor)
+        enrollments = [Enrollment.objects.create(client=make_client(str(n)), program=program) for n in range(5)]
+        _, cursor = self.sync()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.api.delete(reverse('delete-program', args=[program.id])).status_code, 200)
+        self.assertEqual(sum('INSERT INTO "core_changelogentry"' in q['sql'] for q in queries.captured_queries), 1)
+        changes = self.feed(since=cursor)['changes']
+        self.assertEqual(sorted((c['table'], c['action'], c['id']) for c in changes),
+                         [('enrollment', 'delete', e.id) for e in enrollments])
+
+    def test_bulk_loaded_rows_are_backfilled(self):
+        Client.objects.bulk_create([Client(first_name='Bulk', last_name=str(n), date_of_birth='1990-01-01', gender='F')
+                                    for n in range(3)])
+        make_client()
+        self.assertEqual(changelog.backfill(batch_size=2), 3)
+        self.assertEqual(changelog.backfill(), 0)
+        self.assertEqual(len(self.sync()[0]), 4)
+
+    def test_restricted_to_medical_staff(self):
+        self.api.force_authenticate(user=make_user('clerk'))
+        self.assertEqual(self.api.get(reverse('change-feed')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.patient = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def open_chart(self):
+        self.assertEqual(self.api.get(reverse('client-detail', args=[self.patient.id])).status_code, 200)
+        self.assertEqual(self.api.get(reverse('client_comprehensive_info', args=[self.patient.id])).status_code, 200)
+
+    def test_reads_are_buffered_and_written_in_batches(self):
+        with audit.using(audit.AuditLog(batch_size=2, autostart=False)) as log:
+            self.open_chart()
+            # Every read counts, repeats included; a missing client is not a read
+            self.api.get(reverse('client-detail', args=[self.patient.id]))
+            self.api.get(reverse('client_comprehensive_info', args=[self.patient.id + 1]))
+            self.assertFalse(AccessLog.objects.exists())
+            with self.assertNumQueries(1):
+                log.write(log.take())
+            self.assertEqual(AccessLog.objects.count(), 2)
+            log.stop()
+        self.assertEqual(
+            list(AccessLog.objects.order_by('id').values_list('username', 'client_id', 'view')),
+            [('doctor', self.patient.id, 'client-detail'),
+             ('doctor', self.patient.id, 'client_comprehensive_info'),
+             ('doctor', self.patient.id, 'client-detail')],
+        )
+
+    def test_lookup_by_name_is_recorded(self):
+        with audit.using(audit.AuditLog(autostart=False)) as log:
+            url = reverse('client_comprehensive_info_by_name', args=[self.patient.first_name, self.patient.last_name])
+            self.assertEqual(self.api.get(url).status_code, 200)
+            make_client()
+            # Ambiguous, so no client's record was read
+            self.assertEqual(self.api.get(url).status_code, status.HTTP_409_CONFLICT)
+            log.stop()
+        self.assertEqual(
+            list(AccessLog.objects.values_list('client_id', 'view')),
+            [(self.patient.id, 'client_comprehensive_info_by_name')],
+        )
+
+    def test_full_queue_is_written_by_the_request(self):
+        with audit.using(audit.AuditLog(maxsize=1, autostart=False)) as log:
+            self.open_chart()
+            self.assertEqual(AccessLog.objects.count(), 2)
+            self.assertTrue(log.queue.empty())
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_synchronous_mode(self):
+        self.open_chart()
+        self.assertEqual(AccessLog.objects.filter(user=self.doctor).count(), 2)
+
+    def test_query_by_client_and_user(self):
+        nurse = make_user('nurse', is_nurse=True)
+        other = make_client('Jane')
+        now = timezone.now()
+        AccessLog.objects.bulk_create(
+            AccessLog(user=user, username=user.username, client=client, view='client-detail',
+                      accessed_at=now - datetime.timedelta(days=n))
+            for n, (user, client) in enumerate([(self.doctor, self.patient), (nurse, self.patient), (self.doctor, other)])
+        )
+        url = reverse('access-log')
+        self.assertEqual(self.api.get(url, {'client': self.patient.id}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.api.force_authenticate(user=make_user('admin', is_superuser=True))
+        first = self.api.get(url, {'client': self.patient.id, 'limit': 1}).json()
+        self.assertEqual([row['user']['username'] for row in first['results']], ['nurse'])
+        rest = self.api.get(url, {'client': self.patient.id, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(([row['user']['username'] for row in rest['results']], rest['next_cursor']), (['doctor'], None))
+        mine = self.api.get(url, {'user': self.doctor.id, 'start_date': (now - datetime.timedelta(days=1)).date()}).json()
+        self.assertEqual([row['client_id'] for row in mine['results']], [self.patient.id])
+        self.assertEqual(self.api.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.api.get(url, {'user': 'me'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.program = HealthProgram.objects.create(name='Diabetes', created_by=self.doctor)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def make_patient(self, first_name='John', metrics=1):
+        patient = make_client(first_name)
+        Enrollment.objects.create(client=patient, program=self.program, enrolled_by=self.doctor)
+        Prescription.objects.create(client=patient, prescribed_by=self.doctor, medication_name='Metformin',
+                                    dosage='500mg', frequency='Daily', start_date=timezone.localdate())
+        Metric.objects.bulk_create(Metric(client=patient, recorded_by=self.doctor, name='Weight', value=70, unit='kg')
+                                   for _ in range(metrics))
+        start = timezone.now() + datetime.timedelta(days=1)
+        series = EncounterSeries.objects.create(client=patient, provider=self.doctor, starts_at=start, next_occurrence=start)
+        Encounter.objects.create(client=patient, provider=self.doctor, scheduled_for=start, series=series)
+        return patient
+
+    def delete(self, patient):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.delete(reverse('delete-client', args=[patient.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_deleting_a_client_hides_its_records(self):
+        patient, other = self.make_patient(), self.make_patient('Jane', metrics=25)
+        # One statement per table, however many rows the client has
+        self.assertEqual(self.delete(patient), self.delete(other))
+        for model in (Client, Enrollment, Prescription, Metric, Encounter):
+            self.assertFalse(model.objects.exists())
+            self.assertFalse(model.all_objects.filter(deleted_at__isnull=True).exists())
+        self.assertEqual(Metric.all_objects.count(), 26)
+        self.assertFalse(EncounterSeries.objects.filter(next_occurrence__isnull=False).exists())
+        self.assertEqual(self.api.get(reverse('client-detail', args=[patient.id])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(object_id=patient.id, table='client').latest('pk').action, 'delete'
+        )
+        self.assertEqual(ChangeLogEntry.objects.filter(table='metric', action='delete').count(), 26)
+
+    def test_deleting_a_record_or_program_keeps_its_rows(self):
+        patient = self.make_patient()
+        deleted = Enrollment.objects.get(client=patient)
+        for name, model in (('delete-enrollment', Enrollment), ('delete-metric', Metric), ('delete_encounter', Encounter)):
+            record = model.objects.get(client=patient)
+            self.assertEqual(self.api.delete(reverse(name, args=[record.id])).status_code, status.HTTP_200_OK)
+            self.assertFalse(model.objects.filter(pk=record.id).exists())
+            self.assertTrue(model.all_objects.filter(pk=record.id, deleted_at__isnull=False).exists())
+            self.assertEqual(ChangeLogEntry.objects.filter(table=model._meta.model_name).latest('pk').action, 'delete')
+
+        enrollment = Enrollment.objects.create(client=patient, program=self.program, enrolled_by=self.doctor)
+        self.assertEqual(self.api.delete(reverse('delete-program', args=[self.program.id])).status_code, status.HTTP_200_OK)
+        self.assertFalse(Enrollment.all_objects.exists())
+        # Both the soft-deleted and the live enrollment are archived
+        self.assertEqual(
+            sorted(ArchivedRecord.objects.filter(table='enrollment').values_list('object_id', flat=True)),
+            [deleted.id, enrollment.id],
+        )
+
+    def test_figures_across_relations_leave_deleted_rows_out(self):
+        patient = self.make_patient()
+        volunteer = make_user('volunteer')
+        Enrollment.objects.filter(client=patient).update(enrolled_by=volunteer)
+        archive.delete_client(patient)
+
+        kpis = compute_kpis()
+        self.assertEqual(kpis['enrollments']['total'], 0)
+        self.assertEqual([(p['total_enrollments'], p['active_enrollments']) for p in kpis['programs']['breakdown']], [(0, 0)])
+        self.assertEqual([p['total_enrollments'] for p in self.api.get(reverse('program-list')).json()], [0])
+        today = timezone.localdate()
+        figures = utilization.resource_utilization(Period(today, today + datetime.timedelta(days=2)))
+        self.assertEqual(figures['appointment_utilization']['booked_slots'], 0)
+        self.assertEqual([p['booked_hours'] for p in figures['providers']], [0])
+        # Enrolling a client who has since been deleted no longer shows the programme
+        self.assertFalse(HealthProgram.objects.visible_to(volunteer).exists())
+
+    def test_archive_moves_old_deleted_rows(self):
+        gone, paying, live = self.make_patient(), self.make_patient('Jane'), self.make_patient('Ann')
+        Payment.objects.create(client=paying, program=self.program, amount=10, recorded_by=self.doctor)
+        archive.delete_client(gone)
+        archive.delete_client(paying)
+        self.assertEqual(sum(archive.archive().values()), 0)
+
+        moved = archive.archive(before=timezone.now() + datetime.timedelta(seconds=1), batch_size=1)
+        self.assertEqual(moved, {'encounter': 2, 'metric': 2, 'prescription': 2, 'enrollment': 2,
+                                 'encounterseries': 1, 'client': 1})
+        self.assertFalse(Client.all_objects.filter(pk=gone.id).exists())
+        self.assertTrue(Client.all_objects.filter(pk=paying.id, deleted_at__isnull=False).exists())
+        self.assertEqual(Metric.all_objects.filter(client=live).count(), 1)
+        self.assertEqual(
+            sorted(ArchivedRecord.objects.filter(client_id=gone.id).values_list('table', flat=True)),
+            ['client', 'encounter', 'encounterseries', 'enrollment', 'metric', 'prescription'],
+        )
+        self.assertEqual(ArchivedRecord.objects.get(table='client', object_id=gone.id).data['first_name'], 'John')
+
+
+class PartitioningTests(TestCase):
+    def test_month_arithmetic(self):
+        self.assertEqual(partitioning.add_months(datetime.date(2026, 11, 1), 3), datetime.date(2027, 2, 1))
+        self.assertEqual(partitioning.add_months(datetime.date(2026, 1, 1), -1), datetime.date(2025, 12, 1))
+        self.assertEqual(partitioning.partition_name(Metric, datetime.date(2026, 3, 1)), 'core_metric_p2026_03')
+
+    def test_dashboard_bounds_the_partition_keys(self):
+        with CaptureQueriesContext(connection) as queries:
+            refresh_snapshot()
+        scans = {table: [q['sql'] for q in queries if f'FROM "{table}"' in q['sql']]
+                 for table in ('core_encounter', 'core_metric')}
+        self.assertIn('"core_encounter"."scheduled_for" >=', scans['core_encounter'][0].split('WHERE', 1)[1])
+        self.assertIn('"core_metric"."recorded_at" >=', scans['core_metric'][0].split('WHERE', 1)[1])
+
+    @skipIf(connection.vendor == 'postgresql', 'partitioning is available')
+    def test_does_nothing_without_postgresql(self):
+        self.assertIsNone(partitioning.convert(Metric))
+        self.assertEqual(partitioning.create_partitions(Metric), [])
+        out = StringIO()
+        call_command('partition_tables', '--convert', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_convert_and_maintain_metric_partitions(self):
+        doctor, patient = make_user('doctor', is_doctor=True), make_client()
+        old = Metric.objects.create(client=patient, recorded_by=doctor, name='Weight', value=70, unit='kg')
+        recent = Metric.objects.create(client=patient, recorded_by=doctor, name='Weight', value=71, unit='kg')
+        Metric.objects.filter(pk=old.pk).update(recorded_at=timezone.now() - datetime.timedelta(days=150))
+        self.assertEqual(partitioning.convert(Metric, months_ahead=1), 2)
+        self.assertTrue(partitioning.is_partitioned(Metric))
+        this_month = datetime.date.today().replace(day=1)
+        self.assertIn(partitioning.add_months(this_month, 1), partitioning.partitions(Metric))
+
+        added = Metric.objects.create(client=patient, recorded_by=doctor, name='Weight', value=72, unit='kg')
+        self.assertGreater(added.pk, recent.pk)
+        self.assertEqual(partitioning.create_partitions(Metric, months_ahead=2),
+                         [partitioning.partition_name(Metric, partitioning.add_months(this_month, 2))])
+        self.assertTrue(partitioning.drop_partitions(Metric, retain_months=2))
+        self.assertEqual(list(Metric.objects.order_by('pk').values_list('pk', flat=True)), [recent.pk, added.pk])
+
+
+class LoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        target = logging.StreamHandler(self.stream)
+        target.setFormatter(logs.JSONFormatter())
+        target.set_name('test-stream')
+        self.handler = logs.QueueHandler(['test-stream'])
+        self.handler.addFilter(logs.RequestIdFilter())
+        self.addCleanup(self.handler.stop)
+        self.logger = logging.getLogger('core.tests.logging')
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def lines(self):
+        self.handler.flush()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_written_as_json_by_the_listener(self):
+        seen = []
+        middleware = RequestIdMiddleware(lambda request: seen.append(request.id) or self.logger.warning(
+            'Looked up %s', 'client', extra={'client_id': 7}) or HttpResponse())
+        response = middleware(RequestFactory().get('/', HTTP_X_REQUEST_ID='abc-123'))
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('Failed')
+
+        logged, failed = self.lines()
+        self.assertEqual(seen, ['abc-123'])
+        self.assertEqual((logged['message'], logged['level'], logged['client_id'], logged['request_id']),
+                         ('Looked up client', 'WARNING', 7, 'abc-123'))
+        self.assertEqual(failed['request_id'], '-')
+        self.assertIn('ZeroDivisionError', failed['exc_info'])
+
+    def test_malformed_request_id_is_replaced(self):
+        middleware = RequestIdMiddleware(lambda request: HttpResponse())
+        response = middleware(RequestFactory().get('/', HTTP_X_REQUEST_ID='bad id\n' * 20))
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_full_queue_drops_records(self):
+        handler = logs.QueueHandler(maxsize=2)
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'Message %d', (1,), None)
+        for _ in range(3):
+            handler.enqueue(handler.prepare(record))
+        self.assertEqual((handler.queue.qsize(), handler.dropped), (2, 1))
+        self.assertEqual(handler.queue.get().msg, 'Message 1')
+
+    def test_debug_records_are_sampled(self):
+        sample = logs.SampleFilter(every=10)
+        records = [logging.LogRecord('test', level, __file__, 1, 'Message', (), None)
+                   for level in (logging.DEBUG, logging.INFO) for _ in range(100)]
+        passed = [record.levelno for record in records if sample.filter(record)]
+        self.assertEqual((passed.count(logging.DEBUG), passed.count(logging.INFO)), (10, 100))
+
+
+class ErrorAggregationTests(TestCase):
+    def setUp(self):
+        errors.get_aggregator().clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+
+    def record(self, aggregator, failing=lambda: int('x')):
+        try:
+            failing()
+        except ValueError as e:
+            return aggregator.record(e, '/test/')
+
+    def test_unhandled_errors_are_counted_and_logged_once(self):
+        with mock.patch('core.views.get_snapshot', side_effect=RuntimeError('snapshot store down')), \
+                self.assertLogs('core.errors', 'ERROR') as logged:
+            responses = [self.api.get(reverse('dashboard-snapshot')) for _ in range(3)]
+        self.assertEqual({response.status_code for response in responses}, {500})
+        self.assertEqual(len({response.json()['error_id'] for response in responses}), 1)
+        self.assertEqual(len(logged.records), 1)
+        self.assertIsNotNone(logged.records[0].exc_info)
+        # DRF's own errors are answered as before and not counted
+        self.assertEqual(self.api.get(reverse('client-detail', args=[999])).status_code, 404)
+        self.assertEqual([(e['type'], e['count']) for e in errors.get_aggregator().top()], [('RuntimeError', 3)])
+
+    def test_a_storm_logs_one_line_per_interval(self):
+        aggregator = errors.ErrorAggregator(interval=60)
+        with self.assertLogs('core.errors', 'ERROR') as logged:
+            for _ in range(10000):
+                stats = self.record(aggregator)
+            # Same type, different place: a separate fingerprint
+            other = self.record(aggregator, lambda: float('y'))
+        self.assertEqual((stats.count, len(logged.records)), (10000, 2))
+        self.assertNotEqual(other.fingerprint, stats.fingerprint)
+
+        stats.logged_at -= 60
+        with self.assertLogs('core.errors', 'ERROR') as logged:
+            self.record(aggregator)
+            self.record(aggregator)
+        self.assertEqual(len(logged.records), 1)
+        self.assertIn('(10000 times in the last 60s)', logged.output[0])
+
+    def test_least_recently_seen_fingerprints_are_dropped(self):
+        aggregator = errors.ErrorAggregator(max_fingerprints=2)
+        for exception in (ValueError, KeyError, TypeError):
+            try:
+                raise exception('x')
+            except exception as e:
+                with self.assertLogs('core.errors', 'ERROR'):
+                    aggregator.record(e)
+        self.assertEqual({e['type'] for e in aggregator.top()}, {'KeyError', 'TypeError'})
+
+    def test_only_administrators_list_errors(self):
+        with self.assertLogs('core.errors', 'ERROR'):
+            self.record(errors.get_aggregator())
+            self.record(errors.get_aggregator(), lambda: float('y'))
+            self.record(errors.get_aggregator())
+        self.assertEqual(self.api.get(reverse('error-list')).status_code, 403)
+        self.doctor.is_superuser = True
+        self.doctor.save()
+        results = self.api.get(reverse('error-list'), {'limit': 1}).json()['results']
+        self.assertEqual([(e['type'], e['count'], e['path']) for e in results], [('ValueError', 2, '/test/')])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', is_doctor=True)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.doctor)
+        self.patient = make_client()
+
+    def test_matching_etag_returns_304_without_running_view(self):
+        response = self.api.get(reverse('metric-list'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.api.get(reverse('metric-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_to_dependent_table_changes_etag(self):
+        etag = self.api.get(reverse('metric-list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Metric.objects.create(client=self.patient, recorded_by=self.doctor, name='Weight', value=70, unit='kg')
+        response = self.api.get(reverse('metric-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_etag_differs_per_user(self):
+        etag = self.api.get(reverse('metric-list'))['ETag']
+        other = APIClient()
+        other.force_authenticate(user=make_user('clerk'))
+        response = other.get(reverse('metric-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(SimpleTestCase):
+    def compress(self, body, accept_encoding, content_type='application/json'):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type=content_type))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    def test_gzip_above_threshold(self):
+        body = b'[' + b'{"name": "Weight"},' * 50 + b'{}]'
+        response = self.compress(body, 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_or_refused_bodies_are_not_compressed(self):
+        self.assertFalse(self.compress(b'{"ok": true}', 'gzip').has_header('Content-Encoding'))
+        body = b'x' * 1000
+        self.assertFalse(self.compress(body, 'gzip;q=0').has_header('Content-Encoding'))
+        self.assertFalse(self.compress(body, 'gzip', 'application/pdf').has_header('Content-Encoding'))
+
+    def test_q_values_are_honoured(self):
+        def choose(header):
+            return choose_coding(parse_accept_encoding(header), ('br', 'gzip'))
+        self.assertEqual(choose('br;q=0, gzip'), 'gzip')
+        self.assertEqual(choose('br; q=0.2, gzip;q=0.9'), 'gzip')
+        self.assertEqual(choose('gzip, br'), 'br')
+        self.assertEqual(choose('gzip;q=0, *'), 'br')
+        self.assertIsNone(choose('*;q=0, identity'))
+        self.assertIsNone(choose('BR;Q=0.000, gzip;q=nonsense'))
+        body = b'x' * 1000
+        self.assertFalse(self.compress(body, 'br;q=0, gzip; q=0.0').has_header('Content-Encoding'))
+        self.assertEqual(self.compress(body, 'deflate, gzip;q=0.5')['Content-Encoding'], 'gzip')
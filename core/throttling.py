@@ -0,0 +1,158 @@
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    Parse a rate string such as '100/hour' into (num_requests, duration).
+    Returns None for an empty rate, which disables the throttle.
+    """
+    if not rate:
+        return None
+    num, period = rate.split('/')
+    return int(num), RATE_PERIODS[period[0]]
+
+
+class AtomicRateThrottle(BaseThrottle):
+    """
+    Sliding window rate limiter built on atomic cache increments.
+
+    Requests are counted in fixed windows with cache.incr(), which is a single
+    INCR on Redis/memcached and runs under the backend lock on locmem, so
+    concurrent workers can never lose an update. The previous window's count
+    is weighted by how much of it still overlaps the sliding window, which
+    smooths out the burst allowed at window boundaries.
+
+    Rates are read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] using the
+    throttle's scope.
+    """
+    scope = None
+    cache = cache
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{self.get_ident(request)}'
+
+    def get_rate(self, scope):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        parsed = parse_rate(self.get_rate(scope)) if scope else None
+        if parsed is None:
+            return True
+        num_requests, duration = parsed
+        checks = self.checks(request)
+
+        now = time.time()
+        window = int(now // duration)
+        prefix = f'throttle:{scope}:{self.get_ident_key(request)}:'
+        key = f'{prefix}{window}'
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Keep each window for two periods so it can be read as the
+            # previous window. add() is a no-op if another worker won the race.
+            self.cache.add(key, 0, duration * 2)
+            count = self.cache.incr(key)
+
+        if count <= num_requests:
+            previous = self.cache.get(f'{prefix}{window - 1}', 0)
+            if not previous:
+                return self.counted(checks, key)
+        else:
+            previous = 0
+
+        elapsed = now - window * duration
+        weight = 1 - elapsed / duration
+        if previous * weight + count <= num_requests:
+            return self.counted(checks, key)
+
+        # Rejected requests do not count against this limit or any other.
+        # DRF runs every throttle, so those before this one are taken back
+        # here and those after it see the request already rejected.
+        self.cache.decr(key)
+        for throttle, counted_key in checks.counted:
+            if throttle is not self:
+                throttle.cache.decr(counted_key)
+        checks.counted.clear()
+        checks.rejected = True
+        if count > num_requests:
+            self._wait = duration - elapsed
+        else:
+            # Wait until the previous window's weight has decayed enough
+            self._wait = duration * (1 - (num_requests - count) / previous) - elapsed
+        return False
+
+    def checks(self, request):
+        """
+        The state shared by the throttles checking request. DRF builds new
+        throttles for each check, so meeting this one again starts afresh.
+        """
+        checks = getattr(request, '_throttle_checks', None)
+        if checks is None or self in checks.seen:
+            checks = SimpleNamespace(seen=[], counted=[], rejected=False)
+            request._throttle_checks = checks
+        checks.seen.append(self)
+        return checks
+
+    def counted(self, checks, key):
+        """Keep the request's count, unless an earlier throttle rejected it."""
+        if checks.rejected:
+            self.cache.decr(key)
+        else:
+            checks.counted.append((self, key))
+        return True
+
+    def wait(self):
+        return max(getattr(self, '_wait', 0), 1)
+
+
+class AnonRateThrottle(AtomicRateThrottle):
+    """Limits unauthenticated requests per IP address."""
+    scope = 'anon'
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.scope
+
+
+class UserRateThrottle(AtomicRateThrottle):
+    """Limits authenticated requests per user across all endpoints."""
+    scope = 'user'
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return self.scope
+        return None
+
+
+class EndpointRateThrottle(AtomicRateThrottle):
+    """
+    Limits requests per user (or IP) to a single endpoint.
+
+    The scope is the view's throttle_scope attribute if set, otherwise the URL
+    name, so a view is limited by adding its name to DEFAULT_THROTTLE_RATES,
+    e.g. 'client_profile': '100/hour'. Endpoints without a rate are not
+    limited by this throttle.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        match = request.resolver_match
+        return match.url_name if match else None
@@ -13,8 +13,10 @@ urlpatterns = [
     path('clients/<int:pk>/', views.client_detail, name='client-detail'),
     path('clients/<int:pk>/delete/', views.delete_client, name='delete-client'),
     path('clients/search/', views.search_clients, name='client-search'),
+    path('clients/lookup/', views.client_lookup, name='client-lookup'),
     path('clients/register/', views.register_client, name='register_client'),
     path('clients/<int:client_id>/', views.client_profile, name='client_profile'),
+    path('clients/<int:client_id>/medications/active/', views.client_active_medications, name='client-active-medications'),
     path('clients/<int:client_id>/comprehensive/', views.get_client_comprehensive_info, name='client_comprehensive_info'),
     path('clients/by-name/<str:first_name>/<str:last_name>/comprehensive/', views.get_client_comprehensive_info_by_name, name='client_comprehensive_info_by_name'),
     
@@ -33,6 +35,7 @@ urlpatterns = [
     # Prescription endpoints
     path('prescriptions/create/', views.create_prescription, name='create_prescription'),
     path('prescriptions/', views.prescription_list, name='prescription-list'),
+    path('prescriptions/active/', views.active_prescriptions, name='active-prescriptions'),
     path('prescriptions/<int:pk>/', views.prescription_detail, name='prescription-detail'),
     path('prescriptions/<int:pk>/update/', views.update_prescription, name='update-prescription'),
     
@@ -42,11 +45,17 @@ urlpatterns = [
     path('metrics/<int:pk>/', views.metric_detail, name='metric-detail'),
     path('metrics/<int:pk>/delete/', views.delete_metric, name='delete-metric'),
     
+    # Payment endpoints
+    path('payments/record/', views.record_payment, name='record_payment'),
+    
     # Encounter endpoints
     path('encounters/create/', views.create_encounter, name='create_encounter'),
+    path('encounters/series/', views.create_encounter_series, name='create-encounter-series'),
     path('encounters/', views.list_encounters, name='list_encounters'),
+    path('encounters/today/', views.todays_clinic, name='todays-clinic'),
     path('encounters/<int:pk>/', views.get_encounter, name='get_encounter'),
     path('encounters/<int:pk>/delete/', views.delete_encounter, name='delete_encounter'),
+    path('providers/<int:provider_id>/availability/', views.provider_availability, name='provider-availability'),
     
     # Report endpoints
     path('reports/generate/', views.generate_report, name='generate-report'),
@@ -55,6 +64,10 @@ urlpatterns = [
     path('change-password/', views.change_password, name='change-password'),
     path('program-metrics/', views.program_metrics, name='program-metrics'),
     path('resource-utilization/', views.resource_utilization, name='resource-utilization'),
+    path('dashboard/snapshot/', views.dashboard_snapshot, name='dashboard-snapshot'),
     path('staff/', views.staff_list, name='staff-list'),
+    path('changes/', views.change_feed, name='change-feed'),
+    path('audit/access/', views.access_log, name='access-log'),
+    path('errors/', views.error_list, name='error-list'),
     path('webhook/', views.webhook_endpoint),
 ] 
\ No newline at end of file
@@ -0,0 +1,110 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import User, Encounter, live_q
+from .reports import Period
+from .serializers import staff_role
+
+STAFF = Q(is_doctor=True) | Q(is_nurse=True)
+# Encounters that take up a provider's time
+BOOKED = ~Q(status='Cancelled')
+
+
+def default_period():
+    """The four weeks ending today."""
+    today = timezone.localdate()
+    return Period(today - datetime.timedelta(days=27), today)
+
+
+def available_hours(period):
+    """Clinic hours a provider can be booked for over the period."""
+    working_days = sum(1 for day in period.days if day.weekday() in settings.CLINIC_WORKING_DAYS)
+    return working_days * (settings.CLINIC_CLOSES_AT - settings.CLINIC_OPENS_AT)
+
+
+def percentage(part, whole):
+    return round(part / whole * 100, 2) if whole else 0
+
+
+def resource_utilization(period):
+    """
+    Appointment, staff and per-provider utilisation over period, a Period
+    with both ends set.
+
+    Each table is read once with conditional aggregates. Per provider, the
+    booked hours (the durations of every encounter that was not cancelled)
+    and their share of the clinic hours available in the window are
+    computed by the database.
+    """
+    available = available_hours(period)
+    in_window = period.q(Encounter, 'scheduled_for')
+
+    encounters = Encounter.objects.filter(in_window).aggregate(
+        total=Count('pk'),
+        booked=Count('pk', filter=BOOKED),
+        completed=Count('pk', filter=Q(status='Completed')),
+        no_shows=Count('pk', filter=Q(status='No Show')),
+    )
+    staff = User.objects.aggregate(
+        total=Count('pk', filter=STAFF),
+        active=Count('pk', filter=STAFF & Q(is_active=True)),
+    )
+
+    provider_window = period.q(Encounter, 'scheduled_for', prefix='encounters__') & live_q(User, 'encounters')
+    providers = (
+        User.objects.filter(STAFF, is_active=True)
+        .annotate(
+            booked_minutes=Coalesce(Sum(
+                'encounters__duration', filter=provider_window & ~Q(encounters__status='Cancelled')
+            ), 0),
+            completed_minutes=Coalesce(Sum(
+                'encounters__duration', filter=provider_window & Q(encounters__status='Completed')
+            ), 0),
+        )
+        .annotate(
+            booked_hours=ExpressionWrapper(F('booked_minutes') / Value(60.0), output_field=FloatField()),
+            completed_hours=ExpressionWrapper(F('completed_minutes') / Value(60.0), output_field=FloatField()),
+            utilization_rate=ExpressionWrapper(
+                F('booked_minutes') * Value(100 / 60 / available if available else 0),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by('-utilization_rate', 'username')
+        .values_list('id', 'username', 'is_doctor', 'booked_hours', 'completed_hours', 'utilization_rate')
+    )
+
+    return {
+        'window': {
+            'start_date': period.start,
+            'end_date': period.end,
+            'available_hours_per_provider': available,
+        },
+        'appointment_utilization': {
+            'total_slots': encounters['total'],
+            'booked_slots': encounters['booked'],
+            'utilized_slots': encounters['completed'],
+            'no_shows': encounters['no_shows'],
+            'utilization_rate': percentage(encounters['completed'], encounters['booked']),
+        },
+        'staff_utilization': {
+            'total_staff': staff['total'],
+            'active_staff': staff['active'],
+            'utilization_rate': percentage(staff['active'], staff['total']),
+        },
+        'providers': [
+            {
+                'provider_id': provider_id,
+                'provider': username,
+                'role': staff_role(is_doctor),
+                'booked_hours': round(booked, 2),
+                'completed_hours': round(completed, 2),
+                'available_hours': available,
+                'utilization_rate': round(rate, 2),
+            }
+            for provider_id, username, is_doctor, booked, completed, rate in providers
+        ],
+    }
@@ -1,30 +1,18 @@
 from django.core.exceptions import PermissionDenied
 from rest_framework.permissions import BasePermission
+from .permissions import ownership_q
 
 def filter_by_permission(queryset, user):
     """
     Filter queryset based on user permissions.
     Only doctors and nurses can see all records.
-    Regular users can only see their own records.
+    Regular users can only see their own records, as declared in
+    core.permissions.OWNERSHIP_PATHS.
     """
-    if user.is_doctor or user.is_nurse:
-        return queryset
-    
-    # Get model name to determine filtering logic
-    model_name = queryset.model.__name__
-    
-    if model_name == 'HealthProgram':
-        return queryset.filter(created_by=user)
-    elif model_name == 'Enrollment':
-        return queryset.filter(enrolled_by=user)
-    elif model_name == 'Prescription':
-        return queryset.filter(prescribed_by=user)
-    elif model_name == 'Metric':
-        return queryset.filter(recorded_by=user)
-    elif model_name == 'Appointment':
-        return queryset.filter(scheduled_with=user)
-    else:
+    condition = ownership_q(queryset.model, user)
+    if condition is None:
         return queryset
+    return queryset.filter(condition)
 
 def check_permission(user, permission):
     """
@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
+from django.db.models import Q, Count, ProtectedError
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
@@ -10,22 +11,49 @@ from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
 from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_cookie
-from .models import User, HealthProgram, Client, Enrollment, Prescription, Metric, UserProfile, Encounter
+from django.views.decorators.vary import vary_on_headers
+from django.utils.cache import get_conditional_response
+from django.http import HttpResponse
+from .models import User, HealthProgram, Client, Enrollment, Prescription, Metric, UserProfile, Encounter, EncounterSeries, Payment, AccessLog
+from .models import ENCOUNTER_STATUS_CHOICES, ENCOUNTER_TYPE_CHOICES, live_q
+from .serializers import (
+    UserProfileSerializer, StaffSerializer, ClientSerializer, HealthProgramSerializer, ProgramListSerializer,
+    EnrollmentSerializer, PrescriptionSerializer, MetricSerializer, EncounterSerializer,
+)
+from .conditional import table_etag
+from .reports import REPORTS, Period, render_pdf
+from .dashboard import get_snapshot
+from .permissions import can_view_all
+from . import archive, changelog, errors, utilization
+from .audit import audited
+from .encoders import RowEncoder
+from .scheduling import ScheduleConflict, book, free_intervals, free_slots, validate_duration
+from .lookup import lookup_clients, LOOKUP_DEFAULT_LIMIT, LOOKUP_MAX_LIMIT
+from .pagination import keyset_page, page_size
+from .clinic import clinic_day, day_bounds
+from .interactions import blocking, check_prescription, lock_client, normalise
+from .recurrence import create_series, pending, pending_rows, validate_rule
 from django.contrib.auth import get_user_model
-from .utils import filter_by_permission
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from dateutil.parser import parse
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from io import BytesIO
+from django.conf import settings
+from django.utils import timezone
 import datetime
+import logging
+from decimal import Decimal, InvalidOperation
+
+logger = logging.getLogger(__name__)
 
 # Change the notification URL to localhost
 NOTIFICATION_URL = "http://localhost:8000/api/webhook/"  # Local endpoint for testing
 
+# Longest window /providers/<id>/availability/ will compute
+MAX_AVAILABILITY_DAYS = 31
+
+# Columns returned by the client list endpoints unless ?fields= is given
+CLIENT_LIST_FIELDS = ['id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'email', 'phone_number']
+
 class CustomAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data,
@@ -133,12 +161,10 @@ def user_profile(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     if request.method == 'GET':
-        from .serializers import UserProfileSerializer
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
 
     elif request.method == 'PUT':
-        from .serializers import UserProfileSerializer
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -156,12 +182,13 @@ def search_clients(request):
     if not search_query or len(search_query) < 2:
         return Response([], status=status.HTTP_200_OK)
     
+    serializer = ClientSerializer.from_request(request, default_fields=CLIENT_LIST_FIELDS)
     try:
         # Split search query into words for more flexible matching
         search_terms = search_query.split()
         
-        # Start with all clients
-        clients = Client.objects.all()
+        # Start with all clients visible to the user
+        clients = Client.objects.visible_to(request.user)
         
         # Filter by each search term
         for term in search_terms:
@@ -171,18 +198,7 @@ def search_clients(request):
                 Q(id__icontains=term)
             )
         
-        # Prepare the response data
-        client_data = [{
-            'id': client.id,
-            'first_name': client.first_name,
-            'last_name': client.last_name,
-            'date_of_birth': client.date_of_birth,
-            'gender': client.get_gender_display(),
-            'email': client.email,
-            'phone_number': client.phone_number
-        } for client in clients]
-        
-        return Response(client_data, status=status.HTTP_200_OK)
+        return Response(serializer.encode(clients), status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response(
@@ -192,33 +208,37 @@ def search_clients(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def client_lookup(request):
+    """
+    Typeahead for client pickers: [id, display_name, date_of_birth] rows for
+    clients whose first or last name starts with each word of ?q=
+    """
+    try:
+        limit = int(request.GET.get('limit', LOOKUP_DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= LOOKUP_MAX_LIMIT:
+        return Response(
+            {'error': f'limit must be between 1 and {LOOKUP_MAX_LIMIT}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(lookup_clients(request.user, request.GET.get('q', ''), limit))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@table_etag('core.Client', 'core.Enrollment', 'core.Prescription', 'core.Metric', 'core.Encounter', 'core.Payment')
 def client_list(request):
-    clients = Client.objects.all()
-    client_data = [{
-        'id': client.id,
-        'first_name': client.first_name,
-        'last_name': client.last_name,
-        'date_of_birth': client.date_of_birth,
-        'gender': client.get_gender_display(),
-        'email': client.email,
-        'phone_number': client.phone_number
-    } for client in clients]
-    return Response(client_data)
+    clients = Client.objects.visible_to(request.user)
+    serializer = ClientSerializer.from_request(request, default_fields=CLIENT_LIST_FIELDS)
+    return Response(serializer.encode(clients))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@audited('pk')
 def client_detail(request, pk):
-    client = get_object_or_404(Client, pk=pk)
-    return Response({
-        'id': client.id,
-        'first_name': client.first_name,
-        'last_name': client.last_name,
-        'date_of_birth': client.date_of_birth,
-        'gender': client.get_gender_display(),
-        'email': client.email,
-        'phone_number': client.phone_number,
-        'address': client.address
-    })
+    serializer = ClientSerializer.from_request(request)
+    serializer.instance = get_object_or_404(serializer.narrow(Client.objects.visible_to(request.user)), pk=pk)
+    return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -248,17 +268,18 @@ def register_client(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@audited()
 @cache_page(60 * 15)  # Cache for 15 minutes
-@vary_on_cookie
+@vary_on_headers('Cookie', 'Authorization')
 def client_profile(request, client_id):
-    cache_key = f'client_profile_{client_id}'
+    client = get_object_or_404(Client.objects.visible_to(request.user), id=client_id)
+    # What the profile lists depends on what the user may see
+    cache_key = f"client_profile_{client_id}_{'all' if can_view_all(request.user) else request.user.pk}"
     cached_data = cache.get(cache_key)
     
     if cached_data:
         return Response(cached_data)
     
-    client = get_object_or_404(Client, id=client_id)
-    
     response_data = {
         'client': {
             'id': client.id,
@@ -275,7 +296,7 @@ def client_profile(request, client_id):
             'enrolled_by': enrollment.enrolled_by.username if enrollment.enrolled_by else None,
             'enrollment_date': enrollment.enrollment_date,
             'is_active': enrollment.is_active
-        } for enrollment in client.enrollments.all()],
+        } for enrollment in Enrollment.objects.visible_to(request.user).filter(client=client)],
         'prescriptions': [{
             'medication_name': prescription.medication_name,
             'dosage': prescription.dosage,
@@ -284,14 +305,14 @@ def client_profile(request, client_id):
             'end_date': prescription.end_date,
             'prescribed_by': prescription.prescribed_by.username if prescription.prescribed_by else None,
             'notes': prescription.notes
-        } for prescription in client.prescriptions.all()],
+        } for prescription in Prescription.objects.visible_to(request.user).filter(client=client)],
         'metrics': [{
             'name': metric.name,
             'value': metric.value,
             'unit': metric.unit,
             'recorded_by': metric.recorded_by.username if metric.recorded_by else None,
             'recorded_at': metric.recorded_at
-        } for metric in client.metrics.all()]
+        } for metric in Metric.objects.visible_to(request.user).filter(client=client)]
     }
     
     cache.set(cache_key, response_data, 60 * 15)  # Cache for 15 minutes
@@ -339,14 +360,9 @@ def create_program(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def program_detail(request, pk):
-    program = get_object_or_404(HealthProgram, pk=pk)
-    return Response({
-        'id': program.id,
-        'name': program.name,
-        'description': program.description,
-        'created_by': program.created_by.username if program.created_by else None,
-        'created_at': program.created_at
-    })
+    serializer = HealthProgramSerializer.from_request(request)
+    serializer.instance = get_object_or_404(serializer.narrow(HealthProgram.objects.visible_to(request.user)), pk=pk)
+    return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -381,30 +397,18 @@ def enroll_client(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@table_etag('core.Enrollment', 'core.Client', 'core.HealthProgram', 'core.User')
 def enrollment_list(request):
-    enrollments = Enrollment.objects.all()
-    enrollment_data = [{
-        'id': enrollment.id,
-        'client': f"{enrollment.client.first_name} {enrollment.client.last_name}",
-        'program': enrollment.program.name,
-        'enrolled_by': enrollment.enrolled_by.username if enrollment.enrolled_by else None,
-        'enrollment_date': enrollment.enrollment_date,
-        'is_active': enrollment.is_active
-    } for enrollment in enrollments]
-    return Response(enrollment_data)
+    enrollments = Enrollment.objects.visible_to(request.user)
+    serializer = EnrollmentSerializer.from_request(request)
+    return Response(serializer.encode(enrollments))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def enrollment_detail(request, pk):
-    enrollment = get_object_or_404(Enrollment, pk=pk)
-    return Response({
-        'id': enrollment.id,
-        'client': f"{enrollment.client.first_name} {enrollment.client.last_name}",
-        'program': enrollment.program.name,
-        'enrolled_by': enrollment.enrolled_by.username if enrollment.enrolled_by else None,
-        'enrollment_date': enrollment.enrollment_date,
-        'is_active': enrollment.is_active
-    })
+    serializer = EnrollmentSerializer.from_request(request)
+    serializer.instance = get_object_or_404(serializer.narrow(Enrollment.objects.visible_to(request.user)), pk=pk)
+    return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -444,69 +448,35 @@ def generate_report(request):
             'error': 'Report type is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Base query for date range
-    date_filter = {}
-    if start_date and end_date:
-        date_filter = {
-            'enrollment_date__range': [start_date, end_date]
-        }
-    
-    if report_type == 'program_enrollment':
-        enrollments = Enrollment.objects.filter(**date_filter)
-        
-        # Create the PDF
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        
-        # Add title
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, 750, "Program Enrollment Report")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 730, f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        p.drawString(50, 710, f"Period: {start_date} to {end_date}")
-        
-        # Add summary
-        y = 670
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, y, "Summary")
-        p.setFont("Helvetica", 12)
-        y -= 25
-        p.drawString(70, y, f"Total Enrollments: {enrollments.count()}")
-        y -= 20
-        p.drawString(70, y, f"Active Enrollments: {enrollments.filter(is_active=True).count()}")
-        y -= 20
-        p.drawString(70, y, f"Completed Enrollments: {enrollments.filter(is_active=False).count()}")
-        
-        # Add program breakdown
-        y -= 40
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, y, "Program Breakdown")
-        p.setFont("Helvetica", 12)
-        
-        for program in HealthProgram.objects.all():
-            y -= 25
-            program_enrollments = enrollments.filter(program=program)
-            p.drawString(70, y, f"{program.name}:")
-            p.drawString(250, y, f"Total: {program_enrollments.count()}")
-            p.drawString(350, y, f"Active: {program_enrollments.filter(is_active=True).count()}")
-        
-        p.showPage()
-        p.save()
-        
-        # Get the value of the buffer
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        # Create the HTTP response
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="enrollment_report.pdf"'
-        response.write(pdf)
-        
-        return response
-    else:
+    spec = REPORTS.get(report_type)
+    if spec is None:
         return Response({
             'error': 'Invalid report type'
         }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        period = Period.parse(start_date, end_date)
+    except ValueError as e:
+        return Response({
+            'error': f'Invalid date range: {e}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = spec.run(request.user, period)
+    # PDF download by default, ?output=json for the raw figures
+    if request.GET.get('output') == 'json':
+        return Response(data)
+    return render_pdf(spec, data, f'{report_type}_report.pdf')
+
+def interactions_acknowledged(request):
+    """True if the prescriber confirmed the interactions reported earlier."""
+    return str(request.data.get('acknowledge_interactions', '')).lower() in ('1', 'true', 'yes')
+
+def interaction_conflict(interactions):
+    return Response({
+        'error': "The medication interacts with the client's current prescriptions. "
+                 "Resubmit with acknowledge_interactions to prescribe it anyway.",
+        'interactions': [interaction._asdict() for interaction in interactions]
+    }, status=status.HTTP_409_CONFLICT)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -517,30 +487,44 @@ def create_prescription(request):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        client = get_object_or_404(Client, id=request.data['client_id'])
-        
-        prescription = Prescription.objects.create(
-            client=client,
-            prescribed_by=request.user,
-            medication_name=request.data['medication_name'],
-            dosage=request.data['dosage'],
-            frequency=request.data['frequency'],
-            start_date=request.data['start_date'],
-            end_date=request.data.get('end_date'),
-            notes=request.data.get('notes', '')
-        )
+        start_date = datetime.date.fromisoformat(request.data['start_date'])
+        end_date = datetime.date.fromisoformat(request.data['end_date']) if request.data.get('end_date') else None
+
+        # Atomic with the webhook events it queues. The client's row is locked
+        # so that prescriptions written at the same time are checked against
+        # each other rather than both passing the check
+        with transaction.atomic():
+            client = get_object_or_404(Client.objects.select_for_update(), id=request.data['client_id'])
+            interactions = check_prescription(client.id, request.data['medication_name'], start_date, end_date)
+            if blocking(interactions) and not interactions_acknowledged(request):
+                return interaction_conflict(interactions)
+            prescription = Prescription.objects.create(
+                client=client,
+                prescribed_by=request.user,
+                medication_name=request.data['medication_name'],
+                dosage=request.data['dosage'],
+                frequency=request.data['frequency'],
+                start_date=start_date,
+                end_date=end_date,
+                notes=request.data.get('notes', '')
+            )
         
         return Response({
             'id': prescription.id,
             'client': f"{client.first_name} {client.last_name}",
             'medication_name': prescription.medication_name,
             'prescribed_by': request.user.username,
-            'start_date': prescription.start_date
+            'start_date': prescription.start_date,
+            'interactions': [interaction._asdict() for interaction in interactions]
         }, status=status.HTTP_201_CREATED)
     except KeyError as e:
         return Response({
             'error': f'Missing required field: {str(e)}'
         }, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as e:
+        return Response({
+            'error': f'Invalid date: {e}'
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': str(e)
@@ -548,42 +532,78 @@ def create_prescription(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@table_etag('core.Prescription', 'core.Client', 'core.User')
 def prescription_list(request):
     """
     Get a list of all prescriptions, filtered by user permissions.
     Doctors and nurses can see all prescriptions.
     Regular users can only see prescriptions they wrote.
     """
+    serializer = PrescriptionSerializer.from_request(request)
     try:
         # Get prescriptions based on user permissions
-        prescriptions = filter_by_permission(Prescription.objects.all(), request.user)
-        
-        # Prepare the response data
-        prescription_data = [{
-            'id': prescription.id,
-            'client': {
-                'id': prescription.client.id,
-                'first_name': prescription.client.first_name,
-                'last_name': prescription.client.last_name,
-                'name': f"{prescription.client.first_name} {prescription.client.last_name}"
-            },
-            'medication_name': prescription.medication_name,
-            'dosage': prescription.dosage,
-            'frequency': prescription.frequency,
-            'start_date': prescription.start_date,
-            'end_date': prescription.end_date,
-            'notes': prescription.notes,
-            'prescribed_by': prescription.prescribed_by.username if prescription.prescribed_by else None,
-            'created_at': prescription.created_at
-        } for prescription in prescriptions]
-        
-        return Response(prescription_data, status=status.HTTP_200_OK)
+        prescriptions = Prescription.objects.visible_to(request.user)
+        return Response(serializer.encode(prescriptions), status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+MEDICATION_FIELDS = ['id', 'prescribed_by', 'medication_name', 'dosage', 'frequency', 'start_date', 'end_date']
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@table_etag('core.Prescription', 'core.Client', 'core.User', dated=True)
+def client_active_medications(request, client_id):
+    """
+    A client's current medication list: the prescriptions in force on ?on=
+    (YYYY-MM-DD, default today), by start date.
+    """
+    try:
+        on = datetime.date.fromisoformat(request.GET['on']) if request.GET.get('on') else timezone.localdate()
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    client = get_object_or_404(Client.objects.visible_to(request.user).only('pk'), pk=client_id)
+    prescriptions = Prescription.objects.visible_to(request.user).filter(client=client).active(on)
+    serializer = PrescriptionSerializer.from_request(request, default_fields=MEDICATION_FIELDS)
+    return Response({
+        'client_id': client.pk,
+        'on': on,
+        'medications': serializer.encode(prescriptions.order_by('start_date', 'pk')),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@table_etag('core.Prescription', 'core.Client', 'core.User', 'core.Enrollment', dated=True)
+def active_prescriptions(request):
+    """
+    Prescriptions in force at any time between ?start_date= and ?end_date=
+    (inclusive, both default today), for the clients actively enrolled in
+    ?program= (a ward's patient list) or for one ?client=.
+    """
+    params = request.GET
+    today = timezone.localdate().isoformat()
+    try:
+        period = Period.parse(params.get('start_date') or today, params.get('end_date') or params.get('start_date') or today)
+        program_id = int(params['program']) if params.get('program') else None
+        client_id = int(params['client']) if params.get('client') else None
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    prescriptions = Prescription.objects.visible_to(request.user).valid_between(period.start, period.end)
+    if program_id is not None:
+        patients = Enrollment.objects.filter(program_id=program_id, is_active=True).values('client_id')
+        prescriptions = prescriptions.filter(client_id__in=patients)
+    if client_id is not None:
+        prescriptions = prescriptions.filter(client_id=client_id)
+    serializer = PrescriptionSerializer.from_request(request)
+    return Response({
+        'start_date': period.start,
+        'end_date': period.end,
+        'prescriptions': serializer.encode(prescriptions.order_by('client_id', 'start_date', 'pk')),
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def record_metric(request):
@@ -643,97 +663,146 @@ def record_metric(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def parse_local_datetime(value):
+    """Parse an ISO-like datetime, taking naive values as local time."""
+    moment = parse(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def record_payment(request):
+    if not request.user.is_doctor and not request.user.is_nurse:
+        return Response({
+            'error': 'Only medical staff can record payments'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        client = get_object_or_404(Client, id=request.data.get('client_id'))
+        program = get_object_or_404(HealthProgram, id=request.data.get('program_id'))
+        try:
+            amount = Decimal(str(request.data.get('amount')))
+        except InvalidOperation:
+            return Response({
+                'error': 'Amount must be a number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not amount.is_finite() or amount <= 0:
+            return Response({
+                'error': 'Amount must be positive'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        payment = Payment(client=client, program=program, amount=amount, recorded_by=request.user)
+        if request.data.get('paid_at'):
+            payment.paid_at = parse_local_datetime(request.data['paid_at'])
+        payment.save()
+        
+        return Response({
+            'id': payment.id,
+            'client': str(client),
+            'program': program.name,
+            'amount': payment.amount,
+            'paid_at': payment.paid_at,
+            'recorded_by': request.user.username
+        }, status=status.HTTP_201_CREATED)
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@table_etag('core.Metric', 'core.Client', 'core.User')
 def metric_list(request):
-    metrics = Metric.objects.all()
-    metric_data = [{
-        'id': metric.id,
-        'client': f"{metric.client.first_name} {metric.client.last_name}",
-        'name': metric.name,
-        'value': metric.value,
-        'unit': metric.unit,
-        'recorded_by': metric.recorded_by.username if metric.recorded_by else None,
-        'recorded_at': metric.recorded_at
-    } for metric in metrics]
-    return Response(metric_data)
+    metrics = Metric.objects.visible_to(request.user)
+    serializer = MetricSerializer.from_request(request)
+    return Response(serializer.encode(metrics))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def metric_detail(request, pk):
-    metric = get_object_or_404(Metric, pk=pk)
-    return Response({
-        'id': metric.id,
-        'client': f"{metric.client.first_name} {metric.client.last_name}",
-        'name': metric.name,
-        'value': metric.value,
-        'unit': metric.unit,
-        'recorded_by': metric.recorded_by.username if metric.recorded_by else None,
-        'recorded_at': metric.recorded_at
-    })
+    serializer = MetricSerializer.from_request(request)
+    serializer.instance = get_object_or_404(serializer.narrow(Metric.objects.visible_to(request.user)), pk=pk)
+    return Response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@table_etag('core.HealthProgram', 'core.Enrollment')
 def program_metrics(request):
-    programs = HealthProgram.objects.all()
+    """
+    Enrollment counts and completion rate per programme, counted in one
+    grouped query however many programmes there are
+    """
+    live_enrollments = live_q(HealthProgram, 'enrollments')
+    programs = HealthProgram.objects.annotate(
+        total_enrollments=Count('enrollments', filter=live_enrollments),
+        active_enrollments=Count('enrollments', filter=live_enrollments & Q(enrollments__is_active=True)),
+    ).order_by('pk').values_list('name', 'total_enrollments', 'active_enrollments')
     data = []
     
-    for program in programs:
-        enrollments = program.enrollment_set.all()
-        active_enrollments = enrollments.filter(is_active=True)
-        completed_enrollments = enrollments.filter(is_active=False)
-        
-        program_data = {
-            'program': program.name,
-            'total_enrollments': enrollments.count(),
-            'active_enrollments': active_enrollments.count(),
-            'completed_enrollments': completed_enrollments.count(),
-            'completion_rate': (completed_enrollments.count() / enrollments.count() * 100) if enrollments.exists() else 0
-        }
-        data.append(program_data)
+    for name, total, active in programs:
+        data.append({
+            'program': name,
+            'total_enrollments': total,
+            'active_enrollments': active,
+            'completed_enrollments': total - active,
+            'completion_rate': ((total - active) / total * 100) if total else 0
+        })
     
     return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def dashboard_snapshot(request):
+    """
+    All dashboard KPIs in one pre-rendered document, refreshed in the
+    background every DASHBOARD_SNAPSHOT_INTERVAL seconds (see core.dashboard)
+    """
+    if not can_view_all(request.user):
+        return Response({
+            'error': 'Only medical staff can view the dashboard'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    snapshot = get_snapshot()
+    response = HttpResponse(snapshot['body'], content_type='application/json')
+    response['ETag'] = snapshot['etag']
+    return get_conditional_response(request, etag=snapshot['etag'], response=response)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@table_etag('core.Encounter', 'core.User', dated=True)
 def resource_utilization(request):
+    """
+    Appointment, staff and per-provider utilisation between ?start_date= and
+    ?end_date= (inclusive), by default over the four weeks ending today
+    """
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     
-    date_filter = {}
-    if start_date and end_date:
-        date_filter = {
-            'created_at__range': [start_date, end_date]
-        }
-    
-    appointments = Appointment.objects.filter(**date_filter)
-    enrollments = Enrollment.objects.filter(**date_filter)
-    
-    data = {
-        'appointment_utilization': {
-            'total_slots': appointments.count(),
-            'utilized_slots': appointments.filter(status='Completed').count(),
-            'utilization_rate': (appointments.filter(status='Completed').count() / appointments.count() * 100) if appointments.exists() else 0
-        },
-        'staff_utilization': {
-            'total_staff': User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True)).count(),
-            'active_staff': User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True), is_active=True).count(),
-            'utilization_rate': (User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True), is_active=True).count() / User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True)).count() * 100) if User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True)).exists() else 0
-        }
-    }
+    if bool(start_date) != bool(end_date):
+        return Response({
+            'error': 'start_date and end_date must be given together'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        period = Period.parse(start_date, end_date) if start_date else utilization.default_period()
+    except ValueError as e:
+        return Response({
+            'error': f'Invalid date range: {e}'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response(data)
+    return Response(utilization.resource_utilization(period))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@audited()
 def get_client_comprehensive_info(request, client_id):
     try:
-        client = Client.objects.get(id=client_id)
+        client = Client.objects.visible_to(request.user).get(id=client_id)
     except Client.DoesNotExist:
         return Response({"error": "Client not found"}, status=404)
 
     # Get all enrollments for the client
-    enrollments = Enrollment.objects.filter(client=client, is_active=True)
+    enrollments = Enrollment.objects.visible_to(request.user).filter(client=client, is_active=True)
     enrollments_data = [{
         'id': enrollment.id,
         'program': {
@@ -747,7 +816,7 @@ def get_client_comprehensive_info(request, client_id):
     } for enrollment in enrollments]
 
     # Get all prescriptions for the client
-    prescriptions = Prescription.objects.filter(client=client)
+    prescriptions = Prescription.objects.visible_to(request.user).filter(client=client)
     prescriptions_data = [{
         'id': prescription.id,
         'medication_name': prescription.medication_name,
@@ -783,7 +852,8 @@ def get_client_comprehensive_info(request, client_id):
 @permission_classes([IsAuthenticated])
 def delete_client(request, pk):
     """
-    Delete a client. Only doctors can delete clients.
+    Delete a client. Only doctors can delete clients. The client and its
+    records are soft-deleted, and archived later (core.archive).
     """
     if not request.user.is_doctor:
         return Response({
@@ -791,8 +861,8 @@ def delete_client(request, pk):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        client = get_object_or_404(Client, pk=pk)
-        client.delete()
+        client = get_object_or_404(Client.objects.visible_to(request.user), pk=pk)
+        archive.delete_client(client)
         return Response({
             'message': 'Client deleted successfully'
         }, status=status.HTTP_200_OK)
@@ -803,30 +873,21 @@ def delete_client(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@table_etag('core.HealthProgram', 'core.Enrollment', 'core.User')
 def program_list(request):
     """
     List all health programs.
     """
+    serializer = ProgramListSerializer.from_request(request)
     try:
-        # Medical staff can see all programs
-        if request.user.is_doctor or request.user.is_nurse:
-            programs = HealthProgram.objects.all()
-        else:
-            # Regular users can only see programs they're enrolled in
-            programs = HealthProgram.objects.filter(
-                enrollments__client=request.user
-            ).distinct()
-
-        data = [{
-            'id': program.id,
-            'name': program.name,
-            'description': program.description,
-            'created_by': program.created_by.username if program.created_by else None,
-            'created_at': program.created_at,
-            'total_enrollments': program.enrollments.count(),
-            'active_enrollments': program.enrollments.filter(is_active=True).count()
-        } for program in programs]
-        return Response(data, status=status.HTTP_200_OK)
+        # Medical staff can see all programs, other users only the programs
+        # they created or enrolled clients in
+        live_enrollments = live_q(HealthProgram, 'enrollments')
+        programs = HealthProgram.objects.visible_to(request.user).annotate(
+            total_enrollments=Count('enrollments', filter=live_enrollments),
+            active_enrollments=Count('enrollments', filter=live_enrollments & Q(enrollments__is_active=True)),
+        )
+        return Response(serializer.encode(programs), status=status.HTTP_200_OK)
     except Exception as e:
         return Response({
             'error': str(e)
@@ -836,7 +897,8 @@ def program_list(request):
 @permission_classes([IsAuthenticated])
 def delete_program(request, pk):
     """
-    Delete a health program. Only doctors can delete programs.
+    Delete a health program. Only doctors can delete programs. Its
+    enrollments are moved to the archive (core.archive).
     """
     if not request.user.is_doctor:
         return Response({
@@ -844,11 +906,15 @@ def delete_program(request, pk):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        program = get_object_or_404(HealthProgram, pk=pk)
-        program.delete()
+        program = get_object_or_404(HealthProgram.objects.visible_to(request.user), pk=pk)
+        archive.delete_program(program)
         return Response({
             'message': 'Health program deleted successfully'
         }, status=status.HTTP_200_OK)
+    except ProtectedError:
+        return Response({
+            'error': 'Health programs with recorded payments cannot be deleted'
+        }, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         return Response({
             'error': str(e)
@@ -859,6 +925,7 @@ def delete_program(request, pk):
 def delete_enrollment(request, pk):
     """
     Delete an enrollment. Only doctors and nurses can delete enrollments.
+    The enrollment is soft-deleted, and archived later (core.archive).
     """
     if not (request.user.is_doctor or request.user.is_nurse):
         return Response({
@@ -866,8 +933,8 @@ def delete_enrollment(request, pk):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        enrollment = get_object_or_404(Enrollment, pk=pk)
-        enrollment.delete()
+        enrollment = get_object_or_404(Enrollment.objects.visible_to(request.user), pk=pk)
+        archive.delete_record(enrollment)
         return Response({
             'message': 'Enrollment deleted successfully'
         }, status=status.HTTP_200_OK)
@@ -880,7 +947,8 @@ def delete_enrollment(request, pk):
 @permission_classes([IsAuthenticated])
 def delete_metric(request, pk):
     """
-    Delete a metric. Only doctors and nurses can delete metrics.
+    Delete a metric. Only doctors and nurses can delete metrics. The
+    metric is soft-deleted, and archived later (core.archive).
     """
     if not (request.user.is_doctor or request.user.is_nurse):
         return Response({
@@ -888,8 +956,8 @@ def delete_metric(request, pk):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        metric = get_object_or_404(Metric, pk=pk)
-        metric.delete()
+        metric = get_object_or_404(Metric.objects.visible_to(request.user), pk=pk)
+        archive.delete_record(metric)
         return Response({
             'message': 'Metric deleted successfully'
         }, status=status.HTTP_200_OK)
@@ -900,20 +968,30 @@ def delete_metric(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@audited(resolve=lambda response: response.data['client']['id'])
 def get_client_comprehensive_info_by_name(request, first_name, last_name):
     """
     Get comprehensive information about a client by name, including:
     - Basic client information
     - All enrollments and their programs
     - All prescriptions
-    - All appointments
+    - All appointments (encounters)
+    Answers 409 with the candidates' ids when several clients share the name.
     """
-    try:
-        client = Client.objects.get(first_name__iexact=first_name, last_name__iexact=last_name)
-    except Client.DoesNotExist:
+    matches = list(
+        Client.objects.visible_to(request.user)
+        .filter(first_name__iexact=first_name, last_name__iexact=last_name).order_by('pk')
+    )
+    if not matches:
         return Response({"error": "Client not found"}, status=404)
+    if len(matches) > 1:
+        return Response({
+            'error': 'Several clients have this name; use their id',
+            'client_ids': [match.pk for match in matches],
+        }, status=status.HTTP_409_CONFLICT)
+    client = matches[0]
 
-    enrollments = Enrollment.objects.filter(client=client, is_active=True)
+    enrollments = Enrollment.objects.visible_to(request.user).filter(client=client, is_active=True)
     enrollments_data = [{
         'id': enrollment.id,
         'program': {
@@ -926,7 +1004,7 @@ def get_client_comprehensive_info_by_name(request, first_name, last_name):
         'is_active': enrollment.is_active
     } for enrollment in enrollments]
 
-    prescriptions = Prescription.objects.filter(client=client)
+    prescriptions = Prescription.objects.visible_to(request.user).filter(client=client)
     prescriptions_data = [{
         'id': prescription.id,
         'medication_name': prescription.medication_name,
@@ -939,12 +1017,12 @@ def get_client_comprehensive_info_by_name(request, first_name, last_name):
         'created_at': prescription.created_at
     } for prescription in prescriptions]
 
-    appointments = Appointment.objects.filter(client=client)
+    appointments = Encounter.objects.visible_to(request.user).filter(client=client).select_related('provider').order_by('scheduled_for', 'pk')
     appointments_data = [{
         'id': appointment.id,
-        'scheduled_with': appointment.scheduled_with.username if appointment.scheduled_with else None,
+        'scheduled_with': appointment.provider.username,
         'scheduled_for': appointment.scheduled_for,
-        'reason': appointment.reason,
+        'reason': appointment.encounter_type,
         'status': appointment.status,
         'notes': appointment.notes,
         'created_at': appointment.created_at
@@ -972,17 +1050,98 @@ def get_client_comprehensive_info_by_name(request, first_name, last_name):
 @permission_classes([IsAuthenticated])
 def staff_list(request):
     staff = User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True))
-    data = [
-        {
-            'id': user.id,
-            'first_name': getattr(user, 'first_name', ''),
-            'last_name': getattr(user, 'last_name', ''),
-            'username': user.username,
-            'role': 'Doctor' if getattr(user, 'is_doctor', False) else 'Nurse'
-        }
-        for user in staff
-    ]
-    return Response(data)
+    serializer = StaffSerializer.from_request(request)
+    return Response(serializer.encode(staff))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request):
+    """
+    Incremental sync of the clinical tables: the changes after ?since= (the
+    next_cursor of the previous page; 0 for the whole log), oldest first, up
+    to ?limit= at a time, optionally only those of ?tables=client,metric.
+    Poll again from next_cursor straight away while has_more is true.
+    """
+    if not can_view_all(request.user):
+        return Response({'error': 'Only medical staff can read the change feed'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', changelog.DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= changelog.MAX_LIMIT:
+        return Response(
+            {'error': f'limit must be between 1 and {changelog.MAX_LIMIT}'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    tables = [table for table in request.GET.get('tables', '').split(',') if table]
+    unknown = set(tables) - set(changelog.TRACKED)
+    if unknown:
+        return Response(
+            {'error': f'Unknown tables: {", ".join(sorted(unknown))}'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    rows, has_more = changelog.read(since, limit, tables)
+    return Response({
+        'changes': [
+            {'cursor': pk, 'table': table, 'id': object_id, 'action': action, 'data': data, 'changed_at': changed_at}
+            for pk, table, object_id, action, data, changed_at in rows
+        ],
+        'next_cursor': rows[-1][0] if rows else since,
+        'has_more': has_more,
+    })
+
+ACCESS_LOG_ENCODER = RowEncoder({
+    'id': 'id',
+    'user': {'id': 'user_id', 'username': 'username'},
+    'client_id': 'client_id',
+    'view': 'view',
+    'ip_address': 'ip_address',
+    'accessed_at': 'accessed_at',
+})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def access_log(request):
+    """
+    Who opened which client records, oldest first: ?client= and/or ?user=
+    (one is required), optionally within ?start_date=/?end_date=
+    (YYYY-MM-DD, inclusive), paged with ?cursor= and ?limit=. Only
+    administrators can read it. The newest few seconds of reads may not be
+    written yet.
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Only administrators can read the access log'}, status=status.HTTP_403_FORBIDDEN)
+    params = request.GET
+    entries = AccessLog.objects.all()
+    try:
+        for name in ('client', 'user'):
+            if params.get(name):
+                entries = entries.filter(**{f'{name}_id': int(params[name])})
+        period = Period.parse(params.get('start_date'), params.get('end_date'))
+    except ValueError as e:
+        return Response({'error': f'Invalid filter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    if not (params.get('client') or params.get('user')):
+        return Response({'error': 'Filter by client or user'}, status=status.HTTP_400_BAD_REQUEST)
+    entries = entries.filter(period.q(AccessLog, 'accessed_at'))
+    results, next_cursor = keyset_page(
+        entries, ACCESS_LOG_ENCODER, 'accessed_at', params.get('cursor'), page_size(request)
+    )
+    return Response({'results': results, 'next_cursor': next_cursor})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def error_list(request):
+    """
+    The most frequent unhandled errors this worker process has seen (up to
+    ?limit=, default 20), with their counts and when they were first and
+    last seen. Only administrators can read it.
+    """
+    if not request.user.is_superuser:
+        return Response({'error': 'Only administrators can list errors'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': errors.get_aggregator().top(max(limit, 1))})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1025,7 +1184,8 @@ def create_appointment_quick(request):
 @permission_classes([IsAuthenticated])
 def create_encounter(request):
     """
-    Create a new healthcare encounter (visit).
+    Create a new healthcare encounter (visit), refusing times at which the
+    provider is already booked.
     """
     if not (request.user.is_doctor or request.user.is_nurse):
         return Response({'error': 'Only medical staff can create encounters'}, status=403)
@@ -1036,74 +1196,216 @@ def create_encounter(request):
     status_ = request.data.get('status', 'Scheduled')
     if not client_id or not scheduled_for:
         return Response({'error': 'client_id and scheduled_for are required'}, status=400)
+    try:
+        scheduled_for = parse_local_datetime(scheduled_for)
+        duration = validate_duration(request.data.get('duration', settings.ENCOUNTER_SLOT_MINUTES))
+    except (ValueError, TypeError, OverflowError) as e:
+        return Response({'error': f'Invalid schedule: {e}'}, status=400)
     client = get_object_or_404(Client, id=client_id)
-    encounter = Encounter.objects.create(
+    encounter = Encounter(
         client=client,
         provider=request.user,
         encounter_type=encounter_type,
         scheduled_for=scheduled_for,
+        duration=duration,
         status=status_,
         notes=notes
     )
+    try:
+        book(encounter)
+    except ScheduleConflict as e:
+        return Response({'error': str(e), 'conflicts': e.conflicts}, status=409)
     return Response({
         'id': encounter.id,
         'client': str(client),
         'provider': request.user.username,
         'encounter_type': encounter.encounter_type,
         'scheduled_for': encounter.scheduled_for,
+        'duration': encounter.duration,
+        'ends_at': encounter.ends_at,
         'status': encounter.status,
         'notes': encounter.notes,
         'created_at': encounter.created_at
     }, status=201)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_encounter_series(request):
+    """
+    Book a recurring encounter: the first one at scheduled_for, then every
+    `interval` days or weeks (`frequency` Daily or Weekly) until the date
+    `until` or for `count` occurrences (or indefinitely if neither is given).
+    Occurrences within the series horizon are booked at once, all or none.
+    """
+    if not (request.user.is_doctor or request.user.is_nurse):
+        return Response({'error': 'Only medical staff can create encounters'}, status=403)
+    data = request.data
+    if not data.get('client_id') or not data.get('scheduled_for'):
+        return Response({'error': 'client_id and scheduled_for are required'}, status=400)
+    try:
+        series = EncounterSeries(
+            provider=request.user,
+            encounter_type=data.get('encounter_type', 'Consultation'),
+            starts_at=parse_local_datetime(data['scheduled_for']),
+            duration=validate_duration(data.get('duration', settings.ENCOUNTER_SLOT_MINUTES)),
+            frequency=data.get('frequency', 'Weekly'),
+            interval=int(data.get('interval', 1)),
+            until=datetime.date.fromisoformat(data['until']) if data.get('until') else None,
+            count=int(data['count']) if data.get('count') else None,
+            notes=data.get('notes', ''),
+        )
+        validate_rule(series.frequency, series.interval, series.until, series.count, series.starts_at)
+    except (ValueError, TypeError, OverflowError) as e:
+        return Response({'error': f'Invalid recurrence: {e}'}, status=400)
+    series.client = get_object_or_404(Client, id=data['client_id'])
+    try:
+        booked = create_series(series)
+    except ScheduleConflict as e:
+        return Response({'error': str(e), 'conflicts': e.conflicts}, status=409)
+    return Response({
+        'id': series.id,
+        'client': str(series.client),
+        'provider': request.user.username,
+        'encounter_type': series.encounter_type,
+        'starts_at': series.starts_at,
+        'duration': series.duration,
+        'frequency': series.frequency,
+        'interval': series.interval,
+        'until': series.until,
+        'count': series.count,
+        'booked': [{'id': encounter.id, 'scheduled_for': encounter.scheduled_for} for encounter in booked],
+        'next_occurrence': series.next_occurrence,
+        'created_at': series.created_at
+    }, status=201)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def provider_availability(request, provider_id):
+    """
+    Free time of a provider between ?start_date= and ?end_date= (inclusive,
+    default the next seven days), as free intervals and as slot start times
+    of ?slot_minutes= (default ENCOUNTER_SLOT_MINUTES)
+    """
+    provider = get_object_or_404(User.objects.filter(Q(is_doctor=True) | Q(is_nurse=True)), pk=provider_id)
+    today = timezone.localdate()
+    try:
+        period = Period.parse(request.GET.get('start_date') or today.isoformat(), request.GET.get('end_date'))
+        if period.end is None:
+            period.end = period.start + datetime.timedelta(days=6)
+        slot_minutes = validate_duration(request.GET.get('slot_minutes', settings.ENCOUNTER_SLOT_MINUTES))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if (period.end - period.start).days >= MAX_AVAILABILITY_DAYS:
+        return Response({
+            'error': f'The availability window is limited to {MAX_AVAILABILITY_DAYS} days'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Recurring bookings past the horizon count without being stored
+    recurring = pending(provider.pk, day_bounds(period.start)[0], day_bounds(period.end)[1])
+    intervals = free_intervals(provider.pk, period, pending=recurring)
+    return Response({
+        'provider_id': provider.pk,
+        'provider': provider.username,
+        'start_date': period.start,
+        'end_date': period.end,
+        'slot_minutes': slot_minutes,
+        'free': [{'start': start, 'end': end} for start, end in intervals],
+        'slots': free_slots(intervals, slot_minutes),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@table_etag('core.Encounter', 'core.Client', 'core.User')
 def list_encounters(request):
     """
-    List all encounters (filtered by user permissions).
+    List encounters (filtered by user permissions) by scheduled time, one page
+    of ?limit= rows at a time. Optional filters: ?provider=, ?status=,
+    ?encounter_type=, ?start_date= and ?end_date= (YYYY-MM-DD, inclusive).
+    Pass the returned next_cursor as ?cursor= to get the following page.
     """
-    if request.user.is_doctor or request.user.is_nurse:
-        encounters = Encounter.objects.all()
-    else:
-        encounters = Encounter.objects.filter(client__user=request.user)
-    data = [{
-        'id': e.id,
-        'client': str(e.client),
-        'provider': e.provider.username,
-        'encounter_type': e.encounter_type,
-        'scheduled_for': e.scheduled_for,
-        'status': e.status,
-        'notes': e.notes,
-        'created_at': e.created_at
-    } for e in encounters]
-    return Response(data)
+    params = request.GET
+    encounters = Encounter.objects.visible_to(request.user)
+    series_filter = {}
+    try:
+        if params.get('provider'):
+            series_filter['provider_id'] = int(params['provider'])
+            encounters = encounters.filter(**series_filter)
+        for name, choices in (('status', ENCOUNTER_STATUS_CHOICES), ('encounter_type', ENCOUNTER_TYPE_CHOICES)):
+            if params.get(name):
+                if params[name] not in dict(choices):
+                    raise ValueError(f'unknown {name} {params[name]!r}')
+                encounters = encounters.filter(**{name: params[name]})
+        period = Period.parse(params.get('start_date'), params.get('end_date'))
+    except ValueError as e:
+        return Response({'error': f'Invalid filter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    encounters = encounters.filter(period.q(Encounter, 'scheduled_for'))
+
+    serializer = EncounterSerializer.from_request(request)
+    encoder = serializer.row_encoder()
+    # Recurring occurrences past the horizon are listed without being stored
+    recurring = []
+    if period.end and params.get('status', 'Scheduled') == 'Scheduled':
+        if params.get('encounter_type'):
+            series_filter['encounter_type'] = params['encounter_type']
+        try:
+            recurring = pending_rows(
+                encoder.columns, period.start and day_bounds(period.start)[0], day_bounds(period.end)[1],
+                request.user, **series_filter
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results, next_cursor = keyset_page(
+        encounters, encoder, 'scheduled_for', params.get('cursor'), page_size(request), extra=recurring
+    )
+    return Response({'results': results, 'next_cursor': next_cursor})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def todays_clinic(request):
+    """
+    A provider's encounters on one day, for the calendar: ?provider=
+    (default the requesting user) and ?date= (YYYY-MM-DD, default today).
+    Only staff can look at another provider's day.
+    """
+    try:
+        provider_id = int(request.GET.get('provider') or request.user.pk)
+        day = datetime.date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if provider_id != request.user.pk and not can_view_all(request.user):
+        return Response({
+            'error': 'You do not have permission to view this schedule'
+        }, status=status.HTTP_403_FORBIDDEN)
+    encounters = clinic_day(provider_id, day)
+    # Recurring occurrences past the horizon are listed without being stored
+    encoder = EncounterSerializer().row_encoder()
+    try:
+        recurring = pending_rows(encoder.columns, *day_bounds(day), request.user, provider_id=provider_id)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if recurring:
+        encounters = sorted(encounters + [encoder.build_row(row) for row in recurring], key=lambda row: row['scheduled_for'])
+    return Response({'provider_id': provider_id, 'date': day, 'encounters': encounters})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_encounter(request, pk):
-    encounter = get_object_or_404(Encounter, pk=pk)
-    return Response({
-        'id': encounter.id,
-        'client': str(encounter.client),
-        'provider': encounter.provider.username,
-        'encounter_type': encounter.encounter_type,
-        'scheduled_for': encounter.scheduled_for,
-        'status': encounter.status,
-        'notes': encounter.notes,
-        'created_at': encounter.created_at
-    })
+    serializer = EncounterSerializer.from_request(request)
+    serializer.instance = get_object_or_404(serializer.narrow(Encounter.objects.visible_to(request.user)), pk=pk)
+    return Response(serializer.data)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_encounter(request, pk):
     """
     Delete an encounter. Only doctors and nurses can delete encounters.
+    The encounter is soft-deleted, and archived later (core.archive).
     """
     if not (request.user.is_doctor or request.user.is_nurse):
         return Response({'error': 'Only medical staff can delete encounters'}, status=403)
     try:
-        encounter = get_object_or_404(Encounter, pk=pk)
-        encounter.delete()
+        encounter = get_object_or_404(Encounter.objects.visible_to(request.user), pk=pk)
+        archive.delete_record(encounter)
         return Response({'message': 'Encounter deleted successfully'}, status=200)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
@@ -1111,7 +1413,7 @@ def delete_encounter(request, pk):
 @api_view(['POST'])
 def webhook_endpoint(request):
     """Test endpoint to receive notifications"""
-    print("Received webhook notification:", request.data)  # For testing in console
+    logger.debug('Received webhook notification', extra={'payload': request.data})
     return Response({
         'status': 'received',
         'data': request.data
@@ -1123,29 +1425,10 @@ def prescription_detail(request, pk):
     """
     Get details of a specific prescription
     """
+    serializer = PrescriptionSerializer.from_request(request, default_expand=['prescribed_by'])
+    serializer.instance = get_object_or_404(serializer.narrow(Prescription.objects.visible_to(request.user)), pk=pk)
     try:
-        prescription = get_object_or_404(Prescription, pk=pk)
-        
-        data = {
-            'id': prescription.id,
-            'client': {
-                'id': prescription.client.id,
-                'first_name': prescription.client.first_name,
-                'last_name': prescription.client.last_name
-            },
-            'medication_name': prescription.medication_name,
-            'dosage': prescription.dosage,
-            'frequency': prescription.frequency,
-            'duration': prescription.duration,
-            'notes': prescription.notes,
-            'prescribed_date': prescription.prescribed_date,
-            'prescribed_by': {
-                'id': prescription.prescribed_by.id,
-                'username': prescription.prescribed_by.username
-            }
-        }
-        
-        return Response(data)
+        return Response(serializer.data)
     except Exception as e:
         return Response(
             {'error': str(e)},
@@ -1159,7 +1442,7 @@ def update_prescription(request, pk):
     Update a prescription
     """
     try:
-        prescription = get_object_or_404(Prescription, pk=pk)
+        prescription = get_object_or_404(Prescription.objects.visible_to(request.user), pk=pk)
         
         # Only doctors can update prescriptions
         if not request.user.is_doctor:
@@ -1168,38 +1451,32 @@ def update_prescription(request, pk):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Update fields
-        if 'medication_name' in request.data:
-            prescription.medication_name = request.data['medication_name']
-        if 'dosage' in request.data:
-            prescription.dosage = request.data['dosage']
-        if 'frequency' in request.data:
-            prescription.frequency = request.data['frequency']
-        if 'duration' in request.data:
-            prescription.duration = request.data['duration']
-        if 'notes' in request.data:
-            prescription.notes = request.data['notes']
-            
-        prescription.save()
+        with transaction.atomic():
+            # Update fields
+            interactions = []
+            if 'medication_name' in request.data:
+                if normalise(request.data['medication_name']) != normalise(prescription.medication_name):
+                    # Checked under the client's lock, as in create_prescription
+                    lock_client(prescription.client_id)
+                    interactions = check_prescription(
+                        prescription.client_id, request.data['medication_name'],
+                        prescription.start_date, prescription.end_date, exclude=prescription.pk
+                    )
+                    if blocking(interactions) and not interactions_acknowledged(request):
+                        return interaction_conflict(interactions)
+                prescription.medication_name = request.data['medication_name']
+            if 'dosage' in request.data:
+                prescription.dosage = request.data['dosage']
+            if 'frequency' in request.data:
+                prescription.frequency = request.data['frequency']
+            if 'duration' in request.data:
+                prescription.duration = request.data['duration']
+            if 'notes' in request.data:
+                prescription.notes = request.data['notes']
+            prescription.save()
         
-        return Response({
-            'id': prescription.id,
-            'client': {
-                'id': prescription.client.id,
-                'first_name': prescription.client.first_name,
-                'last_name': prescription.client.last_name
-            },
-            'medication_name': prescription.medication_name,
-            'dosage': prescription.dosage,
-            'frequency': prescription.frequency,
-            'duration': prescription.duration,
-            'notes': prescription.notes,
-            'prescribed_date': prescription.prescribed_date,
-            'prescribed_by': {
-                'id': prescription.prescribed_by.id,
-                'username': prescription.prescribed_by.username
-            }
-        })
+        serializer = PrescriptionSerializer(prescription, expand=['prescribed_by'])
+        return Response({**serializer.data, 'interactions': [interaction._asdict() for interaction in interactions]})
         
     except Exception as e:
         return Response(
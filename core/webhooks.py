@@ -0,0 +1,299 @@
+"""
+Outbound webhooks through a transactional outbox.
+
+Saving a prescription or encounter writes one OutboxMessage per interested
+subscription in the same transaction (post_save, or publish() after
+bulk_create()), so an event is recorded exactly when its change commits and
+the request never waits on a subscriber. Dispatchers deliver them: each
+round one leases every subscription whose oldest pending message is due
+and no other dispatcher holds, takes a batch of its messages, and POSTs
+them concurrently across subscriptions but one after the other within
+each, so subscribers see their events in order however many dispatchers
+run. A failed delivery holds back that
+subscription's later messages and is retried with exponential backoff,
+until WEBHOOK_MAX_ATTEMPTS when it is marked failed and the queue moves on.
+"""
+import concurrent.futures
+import datetime
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import random
+import threading
+import urllib.parse
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import Min, Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Prescription, Encounter, WebhookSubscription, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Models whose saves are published, as '<model>.created' / '<model>.updated'
+PUBLISHED_MODELS = (Prescription, Encounter)
+USER_AGENT = 'health-hub-webhooks/1'
+
+# Set after a commit that published events, so a dispatcher in this process
+# does not wait for its next poll
+_wakeup = threading.Event()
+
+
+def payload(instance):
+    """The event data for instance: its concrete fields, foreign keys as ids."""
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def publish(event, instances):
+    """
+    Queue event for every instance and every active subscription wanting
+    it, in the caller's transaction. Costs one query when nobody subscribes.
+    """
+    if not instances:
+        return []
+    subscriptions = [
+        subscription for subscription in WebhookSubscription.objects.filter(is_active=True)
+        if subscription.wants(event)
+    ]
+    if not subscriptions:
+        return []
+    messages = OutboxMessage.objects.bulk_create(
+        OutboxMessage(subscription=subscription, event=event, payload=payload(instance))
+        for instance in instances
+        for subscription in subscriptions
+    )
+    transaction.on_commit(_wakeup.set)
+    return messages
+
+
+def _on_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        publish(f'{sender._meta.model_name}.{"created" if created else "updated"}', [instance])
+
+
+def connect_signals():
+    for model in PUBLISHED_MODELS:
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'webhooks-{model._meta.label}')
+
+
+def sign(secret, body):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff(attempts):
+    """Seconds before retry number attempts: doubling from WEBHOOK_RETRY_SECONDS, capped, with jitter."""
+    delay = min(settings.WEBHOOK_RETRY_SECONDS * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class ConnectionPool:
+    """Keep-alive connections per (scheme, host), one set per delivering thread."""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def post(self, url, body, headers):
+        """
+        POST body to url and return the status. A connection the server has
+        dropped (typically an idle keep-alive one) is retried once on a new
+        one; receivers should use X-HealthHub-Delivery to drop duplicates.
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += f'?{parts.query}'
+        for attempt in (1, 2):
+            connection = self.connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.will_close:
+                    connection.close()
+                return response.status
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if attempt == 2 or not isinstance(e, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)):
+                    raise
+
+    def connection(self, scheme, netloc):
+        connections = self.local.__dict__.setdefault('connections', {})
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+
+def deliver(pool, subscription, messages):
+    """
+    POST messages to subscription in order, stopping at the first failure.
+    Runs on a pool thread and touches no database. Returns (delivered
+    messages, (failed message, error) or None).
+    """
+    delivered = []
+    for message in messages:
+        body = json.dumps({
+            'id': message.pk,
+            'event': message.event,
+            'created_at': message.created_at,
+            'data': message.payload,
+        }, cls=DjangoJSONEncoder).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': USER_AGENT,
+            'X-HealthHub-Event': message.event,
+            'X-HealthHub-Delivery': str(message.pk),
+        }
+        if subscription.secret:
+            headers['X-HealthHub-Signature'] = f'sha256={sign(subscription.secret, body)}'
+        try:
+            status = pool.post(subscription.url, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            return delivered, (message, f'{type(e).__name__}: {e}')
+        if not 200 <= status < 300:
+            return delivered, (message, f'HTTP {status}')
+        delivered.append(message)
+    return delivered, None
+
+
+class Dispatcher:
+    """Delivers due outbox messages; see the module docstring."""
+
+    def __init__(self, concurrency=None, batch_size=None, timeout=None):
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.pool = ConnectionPool(timeout or settings.WEBHOOK_TIMEOUT)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            concurrency or settings.WEBHOOK_CONCURRENCY, thread_name_prefix='webhook'
+        )
+
+    def close(self):
+        self.executor.shutdown()
+
+    def due(self):
+        """{subscription: [messages]}: a batch from each subscription whose queue head is due."""
+        heads = (
+            OutboxMessage.objects.filter(status='pending')
+            .values('subscription_id').annotate(head=Min('id')).values('head')
+        )
+        subscription_ids = OutboxMessage.objects.filter(
+            pk__in=heads, next_attempt_at__lte=timezone.now(), subscription__is_active=True
+        ).values_list('subscription_id', flat=True)
+        return {
+            subscription: list(
+                subscription.messages.filter(status='pending').order_by('id')[:self.batch_size]
+            )
+            for subscription in self.claim(list(subscription_ids))
+        }
+
+    def claim(self, subscription_ids):
+        """
+        Lease the subscriptions among subscription_ids that no other
+        dispatcher holds. Rows another dispatcher is claiming are skipped
+        rather than waited for, and a lease left by a dispatcher that died
+        runs out after WEBHOOK_LEASE_SECONDS.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            subscriptions = list(
+                WebhookSubscription.objects.select_for_update(skip_locked=True)
+                .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now), pk__in=subscription_ids)
+            )
+            WebhookSubscription.objects.filter(pk__in=[subscription.pk for subscription in subscriptions]).update(
+                leased_until=now + datetime.timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+            )
+        return subscriptions
+
+    def release(self, subscription):
+        WebhookSubscription.objects.filter(pk=subscription.pk).update(leased_until=None)
+
+    def run_once(self):
+        """Deliver one round; returns the number of messages delivered."""
+        batches = self.due()
+        if not batches:
+            return 0
+        futures = {subscription: self.executor.submit(deliver, self.pool, subscription, messages)
+                   for subscription, messages in batches.items()}
+        delivered = 0
+        for subscription, future in futures.items():
+            sent, failure = future.result()
+            delivered += len(sent)
+            self.record(sent, failure, timezone.now())
+            self.release(subscription)
+        return delivered
+
+    def record(self, sent, failure, now):
+        if sent:
+            OutboxMessage.objects.filter(pk__in=[message.pk for message in sent]).update(
+                status='delivered', delivered_at=now, last_error=''
+            )
+        if failure:
+            message, error = failure
+            message.attempts += 1
+            message.last_error = error
+            if message.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                message.status = 'failed'
+                logger.error('Giving up on webhook %s to %s after %d attempts: %s',
+                             message.pk, message.subscription_id, message.attempts, error)
+            else:
+                message.next_attempt_at = now + datetime.timedelta(seconds=backoff(message.attempts))
+            message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    def run_forever(self, stopped, interval=None):
+        """Deliver rounds until stopped is set, waiting up to interval seconds while idle."""
+        interval = interval or settings.WEBHOOK_POLL_INTERVAL
+        while not stopped.is_set():
+            _wakeup.clear()
+            try:
+                busy = self.run_once()
+            except Exception:
+                logger.exception('Webhook dispatch failed')
+                busy = 0
+            finally:
+                close_old_connections()
+            if not busy:
+                _wakeup.wait(interval)
+
+
+class DispatcherThread(threading.Thread):
+    """
+    Daemon thread running a Dispatcher: in worker processes with
+    WEBHOOK_DISPATCHER_THREAD = True, or with `manage.py dispatch_webhooks
+    --loop`. Several can run; subscription leases keep them apart.
+    """
+
+    def __init__(self, interval=None):
+        super().__init__(name='webhook-dispatcher', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        dispatcher = Dispatcher()
+        try:
+            dispatcher.run_forever(self.stopped, self.interval)
+        finally:
+            dispatcher.close()
+
+    def stop(self):
+        self.stopped.set()
+        _wakeup.set()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher():
+    """Start the process-wide dispatcher thread, once."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _dispatcher = DispatcherThread()
+            _dispatcher.start()
+    return _dispatcher
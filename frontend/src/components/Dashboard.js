@@ -28,6 +28,7 @@ import {
   Assessment as AssessmentIcon
 } from '@mui/icons-material';
 import { useNavigate } from 'react-router-dom';
+import { dashboard } from '../services/api';
 
 const Dashboard = () => {
   const navigate = useNavigate();
@@ -39,13 +40,17 @@ const Dashboard = () => {
   });
 
   useEffect(() => {
-    // Simulated data for development
-    setStats({
-      totalClients: 150,
-      activePrograms: 12,
-      totalPrescriptions: 50,
-      metrics: []
-    });
+    // One pre-computed snapshot carries every dashboard figure
+    dashboard.getSnapshot()
+      .then(({ data }) => {
+        setStats({
+          totalClients: data.clients.total,
+          activePrograms: data.programs.active,
+          totalPrescriptions: data.prescriptions.total,
+          metrics: data.programs.breakdown
+        });
+      })
+      .catch((error) => console.error('Error fetching dashboard snapshot:', error));
   }, []);
 
   const StatCard = ({ title, value, icon, color, onClick }) => (
@@ -22,6 +22,8 @@ import axios from 'axios';
 const EncounterList = () => {
   const navigate = useNavigate();
   const [encounters, setEncounters] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -29,19 +31,22 @@ const EncounterList = () => {
     fetchEncounters();
   }, []);
 
-  const fetchEncounters = async () => {
+  const fetchEncounters = async (cursor = null) => {
+    const setBusy = cursor ? setLoadingMore : setLoading;
     try {
-      setLoading(true);
+      setBusy(true);
       setError(null);
       const token = localStorage.getItem('token');
       const response = await axios.get('http://localhost:8000/api/encounters/', {
-        headers: { Authorization: `Token ${token}` }
+        headers: { Authorization: `Token ${token}` },
+        params: cursor ? { cursor } : {}
       });
-      setEncounters(response.data);
+      setEncounters(prev => (cursor ? [...prev, ...response.data.results] : response.data.results));
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       setError('Failed to fetch encounters.');
     } finally {
-      setLoading(false);
+      setBusy(false);
     }
   };
 
@@ -107,6 +112,13 @@ const EncounterList = () => {
           </TableBody>
         </Table>
       </TableContainer>
+      {nextCursor && (
+        <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+          <Button variant="outlined" onClick={() => fetchEncounters(nextCursor)} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </Button>
+        </Box>
+      )}
     </Box>
   );
 };
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import {
+  Autocomplete,
   Box,
   Button,
   Card,
@@ -31,7 +32,10 @@ import axios from 'axios';
 
 function Appointments() {
   const [appointments, setAppointments] = useState([]);
-  const [clients, setClients] = useState([]);
+  // Prefix lookup results for the client picker, and the names of the
+  // clients the table shows, kept apart so typing never blanks the table
+  const [clientOptions, setClientOptions] = useState([]);
+  const [clientNames, setClientNames] = useState({});
   const [staff, setStaff] = useState([]);
   const [openDialog, setOpenDialog] = useState(false);
   const [formData, setFormData] = useState({
@@ -55,18 +59,45 @@ function Appointments() {
         headers: { Authorization: `Bearer ${token}` }
       });
       setAppointments(response.data);
+      fetchClientNames(response.data.map(appointment => appointment.client_id));
     } catch (error) {
       console.error('Error fetching appointments:', error);
     }
   };
 
-  const fetchClients = async () => {
+  // Names of the given clients, fetched by id once each
+  const fetchClientNames = async (clientIds) => {
+    const missing = [...new Set(clientIds)].filter(id => id && !(id in clientNames));
+    if (missing.length === 0) {
+      return;
+    }
+    const token = localStorage.getItem('token');
+    const results = await Promise.allSettled(missing.map(id =>
+      axios.get(`http://localhost:8000/api/clients/${id}/`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { fields: 'id,first_name,last_name' }
+      })
+    ));
+    const names = {};
+    results.forEach(result => {
+      if (result.status === 'fulfilled') {
+        const client = result.value.data;
+        names[client.id] = `${client.first_name} ${client.last_name}`;
+      }
+    });
+    setClientNames(previous => ({ ...previous, ...names }));
+  };
+
+  // Clients are looked up by name prefix as the user types, as
+  // [id, display_name, date_of_birth] rows, instead of loading the registry
+  const fetchClients = async (query = '') => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get('http://localhost:8000/api/clients/', {
-        headers: { Authorization: `Bearer ${token}` }
+      const response = await axios.get('http://localhost:8000/api/clients/lookup/', {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { q: query, limit: 20 }
       });
-      setClients(response.data);
+      setClientOptions(response.data);
     } catch (error) {
       console.error('Error fetching clients:', error);
     }
@@ -115,10 +146,7 @@ function Appointments() {
     }
   };
 
-  const getClientName = (clientId) => {
-    const client = clients.find(c => c.id === clientId);
-    return client ? `${client.first_name} ${client.last_name}` : '';
-  };
+  const getClientName = (clientId) => clientNames[clientId] || '';
 
   const getStaffName = (staffId) => {
     const staffMember = staff.find(s => s.id === staffId);
@@ -177,20 +205,25 @@ function Appointments() {
           <DialogContent>
             <Grid container spacing={2}>
               <Grid item xs={12}>
-                <FormControl fullWidth>
-                  <InputLabel>Client</InputLabel>
-                  <Select
-                    value={formData.client_id}
-                    onChange={(e) => setFormData({ ...formData, client_id: e.target.value })}
-                    required
-                  >
-                    {clients.map((client) => (
-                      <MenuItem key={client.id} value={client.id}>
-                        {`${client.first_name} ${client.last_name}`}
-                      </MenuItem>
-                    ))}
-                  </Select>
-                </FormControl>
+                <Autocomplete
+                  options={clientOptions}
+                  filterOptions={(options) => options}
+                  getOptionLabel={(client) => client[1]}
+                  isOptionEqualToValue={(option, value) => option[0] === value[0]}
+                  onInputChange={(e, value) => fetchClients(value)}
+                  onChange={(e, client) => {
+                    setFormData({ ...formData, client_id: client ? client[0] : '' });
+                    if (client) {
+                      setClientNames(previous => ({ ...previous, [client[0]]: client[1] }));
+                    }
+                  }}
+                  renderOption={(props, client) => (
+                    <li {...props} key={client[0]}>
+                      {`${client[1]} (${client[2]})`}
+                    </li>
+                  )}
+                  renderInput={(params) => <TextField {...params} label="Client" required />}
+                />
               </Grid>
               <Grid item xs={12}>
                 <FormControl fullWidth>
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import {
+  Autocomplete,
   Box,
   Button,
   Card,
@@ -18,10 +19,6 @@ import {
   DialogTitle,
   DialogContent,
   DialogActions,
-  FormControl,
-  InputLabel,
-  Select,
-  MenuItem,
 } from '@mui/material';
 import { Add as AddIcon } from '@mui/icons-material';
 import { DatePicker } from '@mui/x-date-pickers/DatePicker';
@@ -60,11 +57,14 @@ function Prescriptions() {
     }
   };
 
-  const fetchClients = async () => {
+  // Clients are looked up by name prefix as the user types, as
+  // [id, display_name, date_of_birth] rows, instead of loading the registry
+  const fetchClients = async (query = '') => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get('http://localhost:8000/api/clients/', {
-        headers: { Authorization: `Bearer ${token}` }
+      const response = await axios.get('http://localhost:8000/api/clients/lookup/', {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { q: query, limit: 20 }
       });
       setClients(response.data);
     } catch (error) {
@@ -105,11 +105,6 @@ function Prescriptions() {
     }
   };
 
-  const getClientName = (clientId) => {
-    const client = clients.find(c => c.id === clientId);
-    return client ? `${client.first_name} ${client.last_name}` : '';
-  };
-
   return (
     <Box>
       <Typography variant="h4" gutterBottom>
@@ -144,7 +139,7 @@ function Prescriptions() {
           <TableBody>
             {prescriptions.map((prescription) => (
               <TableRow key={prescription.id}>
-                <TableCell>{getClientName(prescription.client_id)}</TableCell>
+                <TableCell>{prescription.client.name}</TableCell>
                 <TableCell>{prescription.medication_name}</TableCell>
                 <TableCell>{prescription.dosage}</TableCell>
                 <TableCell>{prescription.frequency}</TableCell>
@@ -166,20 +161,20 @@ function Prescriptions() {
           <DialogContent>
             <Grid container spacing={2}>
               <Grid item xs={12}>
-                <FormControl fullWidth>
-                  <InputLabel>Client</InputLabel>
-                  <Select
-                    value={formData.client_id}
-                    onChange={(e) => setFormData({ ...formData, client_id: e.target.value })}
-                    required
-                  >
-                    {clients.map((client) => (
-                      <MenuItem key={client.id} value={client.id}>
-                        {`${client.first_name} ${client.last_name}`}
-                      </MenuItem>
-                    ))}
-                  </Select>
-                </FormControl>
+                <Autocomplete
+                  options={clients}
+                  filterOptions={(options) => options}
+                  getOptionLabel={(client) => client[1]}
+                  isOptionEqualToValue={(option, value) => option[0] === value[0]}
+                  onInputChange={(e, value) => fetchClients(value)}
+                  onChange={(e, client) => setFormData({ ...formData, client_id: client ? client[0] : '' })}
+                  renderOption={(props, client) => (
+                    <li {...props} key={client[0]}>
+                      {`${client[1]} (${client[2]})`}
+                    </li>
+                  )}
+                  renderInput={(params) => <TextField {...params} label="Client" required />}
+                />
               </Grid>
               <Grid item xs={12}>
                 <TextField
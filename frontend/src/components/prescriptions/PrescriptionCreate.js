@@ -69,7 +69,16 @@ const PrescriptionCreate = () => {
         end_date: formData.end_date || null
       };
 
-      await prescriptions.create(prescriptionData);
+      try {
+        await prescriptions.create(prescriptionData);
+      } catch (err) {
+        // 409: the medication interacts with the client's current prescriptions
+        const interactions = err.response?.status === 409 && err.response.data.interactions;
+        if (!interactions) throw err;
+        const summary = interactions.map((i) => `${i.other} (${i.severity}): ${i.description}`).join('\n');
+        if (!window.confirm(`This medication interacts with:\n${summary}\n\nPrescribe it anyway?`)) return;
+        await prescriptions.create({ ...prescriptionData, acknowledge_interactions: true });
+      }
       setSuccess(true);
       
       // Reset form after successful creation
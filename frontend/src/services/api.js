@@ -103,6 +103,11 @@ export const programMetrics = {
     get: () => api.get('/program-metrics/'),
 };
 
+// Dashboard snapshot endpoint
+export const dashboard = {
+    getSnapshot: () => api.get('/dashboard/snapshot/'),
+};
+
 // Resource utilization endpoint
 export const resources = {
     getUtilization: () => api.get('/resource-utilization/'),
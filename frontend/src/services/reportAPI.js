@@ -41,7 +41,8 @@ const reportAPI = {
         params: {
           type: params.type,
           start_date: params.start_date,
-          end_date: params.end_date
+          end_date: params.end_date,
+          output: 'json'
         }
       });
       return response.data;
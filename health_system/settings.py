@@ -28,6 +28,10 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
+# The client lookup indexes cover extra columns (Index(include=...)), which
+# PostgreSQL uses and SQLite, used in development, ignores harmlessly
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 
 # Application definition
 
@@ -46,7 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +62,153 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# The default cache holds what every worker must see alike: the table
+# versions behind ETags (core.conditional), throttle counters, cached clinic
+# days and the dashboard snapshot. Set CACHE_URL (redis://host:6379/0)
+# whenever more than one process serves requests; without it each process
+# keeps its own, which only suits development
+CACHE_URL = os.environ.get('CACHE_URL', '')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+    if CACHE_URL else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+# Responses smaller than this are not worth compressing
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Recent client lookup results kept in each worker's memory
+CLIENT_LOOKUP_CACHE_SIZE = int(os.environ.get('CLIENT_LOOKUP_CACHE_SIZE', 256))
+
+# Dashboard snapshot refresh period in seconds. Set DASHBOARD_SNAPSHOT_THREAD
+# in exactly one process, or run `manage.py refresh_dashboard_snapshot --loop`
+DASHBOARD_SNAPSHOT_INTERVAL = int(os.environ.get('DASHBOARD_SNAPSHOT_INTERVAL', 60))
+DASHBOARD_SNAPSHOT_THREAD = os.environ.get('DASHBOARD_SNAPSHOT_THREAD', 'False') == 'True'
+
+# Clinic schedule used for availability and utilisation: weekdays open
+# (Monday is 0), opening and closing hour (local time), the default length of
+# an encounter slot and the longest encounter that can be booked
+CLINIC_WORKING_DAYS = [0, 1, 2, 3, 4]
+CLINIC_OPENS_AT = int(os.environ.get('CLINIC_OPENS_AT', 8))
+CLINIC_CLOSES_AT = int(os.environ.get('CLINIC_CLOSES_AT', 16))
+ENCOUNTER_SLOT_MINUTES = int(os.environ.get('ENCOUNTER_SLOT_MINUTES', 30))
+MAX_ENCOUNTER_MINUTES = int(os.environ.get('MAX_ENCOUNTER_MINUTES', 480))
+# Seconds a cached provider-day of the calendar may be served (core.clinic)
+CLINIC_DAY_CACHE_TIMEOUT = int(os.environ.get('CLINIC_DAY_CACHE_TIMEOUT', 300))
+
+# Recurring encounters are stored SERIES_HORIZON_DAYS ahead (kept up by
+# `manage.py extend_encounter_series`); listings further out show the later
+# occurrences of the series the user can see without storing them, never
+# beyond SERIES_LOOKAHEAD_DAYS and at most SERIES_READ_LIMIT series per request
+SERIES_HORIZON_DAYS = int(os.environ.get('SERIES_HORIZON_DAYS', 56))
+SERIES_LOOKAHEAD_DAYS = int(os.environ.get('SERIES_LOOKAHEAD_DAYS', 730))
+SERIES_READ_LIMIT = int(os.environ.get('SERIES_READ_LIMIT', 50))
+
+# Drug interaction reference (drug_a,drug_b,severity,description), reloaded
+# when the file changes
+DRUG_INTERACTIONS_FILE = os.environ.get('DRUG_INTERACTIONS_FILE', BASE_DIR / 'core' / 'data' / 'drug_interactions.csv')
+
+# Outbound webhooks (core.webhooks). Set WEBHOOK_DISPATCHER_THREAD in the
+# worker processes, or run `manage.py dispatch_webhooks --loop`. Each round sends
+# up to WEBHOOK_BATCH_SIZE messages per subscription, WEBHOOK_CONCURRENCY
+# subscriptions at a time; failures are retried after WEBHOOK_RETRY_SECONDS,
+# doubling up to WEBHOOK_RETRY_MAX_SECONDS, WEBHOOK_MAX_ATTEMPTS times in all.
+# A dispatcher leases a subscription for WEBHOOK_LEASE_SECONDS while sending
+# to it, which must cover a whole batch timing out
+WEBHOOK_DISPATCHER_THREAD = os.environ.get('WEBHOOK_DISPATCHER_THREAD', 'False') == 'True'
+WEBHOOK_POLL_INTERVAL = float(os.environ.get('WEBHOOK_POLL_INTERVAL', 2))
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 50))
+WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', 8))
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 10))
+WEBHOOK_RETRY_SECONDS = float(os.environ.get('WEBHOOK_RETRY_SECONDS', 5))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.environ.get('WEBHOOK_RETRY_MAX_SECONDS', 3600))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 12))
+WEBHOOK_LEASE_SECONDS = float(os.environ.get('WEBHOOK_LEASE_SECONDS', 2 * WEBHOOK_BATCH_SIZE * WEBHOOK_TIMEOUT))
+
+# Change data capture log (core.changelog): entries are served once they are
+# CHANGELOG_SETTLE_SECONDS old, longer than any write transaction runs, and
+# `manage.py compact_changelog` keeps only the latest entry per row after
+# CHANGELOG_RETENTION_DAYS
+CHANGELOG_SETTLE_SECONDS = int(os.environ.get('CHANGELOG_SETTLE_SECONDS', 5))
+CHANGELOG_RETENTION_DAYS = int(os.environ.get('CHANGELOG_RETENTION_DAYS', 7))
+
+# Client record reads are audited (core.audit) from an in-process queue of up
+# to AUDIT_QUEUE_SIZE entries, written every AUDIT_BATCH_SIZE entries or
+# AUDIT_FLUSH_MS milliseconds; AUDIT_ASYNC = False writes each one at once
+AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'True') == 'True'
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_MS = int(os.environ.get('AUDIT_FLUSH_MS', 500))
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+
+# Deleted clients and their records are kept soft-deleted for
+# ARCHIVE_AFTER_DAYS, then moved to the archive by `manage.py archive_records`
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+
+# Monthly partitions kept ready ahead of time for the metric and encounter
+# tables, once `manage.py partition_tables --convert` has partitioned them
+# (PostgreSQL only); run the command monthly to keep the window moving
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+
+# Structured logging (core.logs): records are queued by the request thread
+# and written as JSON lines, to stderr and LOG_FILE if set, by a listener
+# thread. Up to LOG_QUEUE_SIZE records wait; beyond that they are dropped.
+# One in LOG_DEBUG_SAMPLE debug records is kept.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FILE = os.environ.get('LOG_FILE', '')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_DEBUG_SAMPLE = int(os.environ.get('LOG_DEBUG_SAMPLE', 100))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'core.logs.RequestIdFilter'},
+        'sample_debug': {'()': 'core.logs.SampleFilter', 'every': LOG_DEBUG_SAMPLE},
+    },
+    'formatters': {
+        'json': {'()': 'core.logs.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+        **({'file': {
+            'class': 'logging.FileHandler',
+            'filename': LOG_FILE,
+            'formatter': 'json',
+        }} if LOG_FILE else {}),
+        'queue': {
+            '()': 'core.logs.QueueHandler',
+            'handlers': ['console', 'file'] if LOG_FILE else ['console'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['request_id', 'sample_debug'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        # Through the queue like everything else, rather than Django's own handlers
+        'django': {
+            'handlers': [],
+            'level': LOG_LEVEL,
+        },
+        # A line per 4xx is noise under load; 5xx are still logged
+        'django.request': {
+            'level': os.environ.get('LOG_REQUEST_LEVEL', 'ERROR'),
+        },
+    },
+}
+
+# Unhandled API errors (core.errors) are grouped by exception type and the
+# innermost ERROR_FINGERPRINT_FRAMES frames; each group is logged on its
+# first occurrence and then at most every ERROR_LOG_INTERVAL seconds. Each
+# process tracks its ERROR_MAX_FINGERPRINTS most recent groups.
+ERROR_FINGERPRINT_FRAMES = int(os.environ.get('ERROR_FINGERPRINT_FRAMES', 3))
+ERROR_LOG_INTERVAL = int(os.environ.get('ERROR_LOG_INTERVAL', 60))
+ERROR_MAX_FINGERPRINTS = int(os.environ.get('ERROR_MAX_FINGERPRINTS', 1000))
+
 ROOT_URLCONF = 'health_system.urls'
 
 TEMPLATES = [
@@ -161,6 +314,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-request-id',
 ]
 
 # REST Framework settings
@@ -172,6 +326,26 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Unhandled errors are counted per fingerprint and logged at a bounded rate
+    'EXCEPTION_HANDLER': 'core.errors.exception_handler',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
+        'core.throttling.EndpointRateThrottle',
+    ],
+    # Per-user limits for 'anon' and 'user', per-endpoint limits keyed by URL name
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('RATE_LIMIT_ANON', '100/hour'),
+        'user': os.environ.get('RATE_LIMIT_USER', '5000/hour'),
+        'api-token-auth': os.environ.get('RATE_LIMIT_LOGIN', '10/minute'),
+        'api-token': os.environ.get('RATE_LIMIT_LOGIN', '10/minute'),
+        'client-detail': os.environ.get('RATE_LIMIT_CLIENT_PROFILE', '300/hour'),
+        'client_comprehensive_info': os.environ.get('RATE_LIMIT_CLIENT_PROFILE', '300/hour'),
+    },
 }
 
 # Custom user model